@@ -1,18 +1,17 @@
 """
 # Basic chat example demonstrating a simple customer service agent
 # Shows how to set up a basic agent with instructions and maintain chat history
-# Uses termcolor for better user experience
+# Uses colored terminal output for better user experience
 # Demonstrates basic error handling
 """
 
-from swarm import Swarm, Agent
-from termcolor import colored
-import os
-from openai import AsyncOpenAI
+from _shared import Agent, ChatSession, answer_turns, chat_loop, get_client
+from _shared import GREEN, YELLOW, RED, RESET
 import asyncio
 
 # Constants
 MODEL_NAME = "gpt-4o"
+MAX_TOKENS = 150
 AGENT_NAME = "Customer Service Rep"
 SYSTEM_INSTRUCTIONS = """You are a friendly and professional customer service representative.
 Your goal is to help customers with their inquiries in a polite and efficient manner.
@@ -20,48 +19,23 @@ Always maintain a positive tone and be solution-oriented."""
 
 try:
     # Initialize the client
-    client = Swarm()
+    client = get_client()
     
     # Create the basic customer service agent
     agent = Agent(
         name=AGENT_NAME,
         model=MODEL_NAME,
+        max_tokens=MAX_TOKENS,
         instructions=SYSTEM_INSTRUCTIONS
     )
     
-    # Initialize conversation history
-    conversation_history = []
+    # Initialize the conversation
+    session = ChatSession(agent)
     
-    print(colored("Customer Service Chat Initialized!", "green"))
-    print(colored("Type 'exit' to end the conversation\n", "yellow"))
+    print(f"{GREEN}Customer Service Chat Initialized!{RESET}")
+    print(f"{YELLOW}Type 'exit' to end the conversation\n{RESET}")
+    
+    asyncio.run(chat_loop(answer_turns(client, session), f"{GREEN}\nThank you for chatting! Goodbye!{RESET}"))
     
-    while True:
-        # Get user input
-        user_input = input(colored("You: ", "cyan"))
-        
-        if user_input.lower() == 'exit':
-            print(colored("\nThank you for chatting! Goodbye!", "green"))
-            break
-            
-        # Add user message to history
-        conversation_history.append({"role": "user", "content": user_input})
-        
-        try:
-            # Get response from agent
-            response = client.run(
-                agent=agent,
-                messages=conversation_history
-            )
-            
-            # Update conversation history with agent's response
-            conversation_history.extend(response.messages)
-            
-            # Print agent's response
-            print(colored(f"\n{AGENT_NAME}: {response.messages[-1]['content']}\n", "green"))
-            
-        except Exception as e:
-            print(colored(f"\nError: {str(e)}", "red"))
-            print(colored("Please try again.\n", "yellow"))
-            
 except Exception as e:
-    print(colored(f"Initialization Error: {str(e)}", "red")) 
\ No newline at end of file
+    print(f"{RED}Initialization Error: {str(e)}{RESET}") 
\ No newline at end of file
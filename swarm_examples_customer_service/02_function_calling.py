@@ -5,18 +5,14 @@
 # Includes error handling and informative status messages
 """
 
-from swarm import Swarm, Agent
-from swarm.types import Result
-from termcolor import colored
-import os
-from openai import AsyncOpenAI
+from _shared import Agent, ChatSession, answer_turns, chat_loop, freeze_tools, get_client, tool_log
+from _shared import GREEN, YELLOW, RED, RESET
 import asyncio
-from typing import Optional
-import random
-from datetime import datetime, timedelta
+import itertools
 
 # Constants
 MODEL_NAME = "gpt-4o"
+MAX_TOKENS = 256
 AGENT_NAME = "Order Support Agent"
 SYSTEM_INSTRUCTIONS = """You are an Order Support Agent who can help customers check their order status and track shipments.
 Use the available functions to assist customers with their inquiries.
@@ -35,83 +31,61 @@ def check_order_status(order_id: str) -> str:
     Args:
         order_id: The order ID to check
     """
-    print(colored(f"\n🔍 Checking order status for: {order_id}", "magenta"))
+    tool_log.info("🔍 Checking order status for: %s", order_id)
     try:
-        if order_id in ORDERS:
-            order = ORDERS[order_id]
-            return f"Order {order_id} is currently {order['status']}. Order date: {order['date']}"
-        return f"Order {order_id} not found in our system."
+        order = ORDERS.get(order_id)
+        if order is None:
+            return f"Order {order_id} not found in our system."
+        return f"Order {order_id} is currently {order['status']}. Order date: {order['date']}"
     except Exception as e:
         return f"Error checking order status: {str(e)}"
 
+# Mock tracking statuses, handed out in turn; next() on a cycle needs no lock or RNG state
+TRACKING_STATUSES = itertools.cycle(["warehouse", "in transit", "local facility", "out for delivery", "delivered"])
+
 def track_shipment(order_id: str) -> str:
     """Track a shipment for an order
     
     Args:
         order_id: The order ID to track
     """
-    print(colored(f"\n📦 Tracking shipment for order: {order_id}", "magenta"))
+    tool_log.info("📦 Tracking shipment for order: %s", order_id)
     try:
-        if order_id in ORDERS:
-            order = ORDERS[order_id]
-            if order['tracking']:
-                # Simulate different tracking statuses
-                locations = ["warehouse", "in transit", "local facility", "out for delivery", "delivered"]
-                current_status = random.choice(locations)
-                return f"Tracking number {order['tracking']} for order {order_id} - Status: {current_status}"
-            return f"Order {order_id} doesn't have tracking information yet."
-        return f"Order {order_id} not found in our system."
+        order = ORDERS.get(order_id)
+        if order is None:
+            return f"Order {order_id} not found in our system."
+        if order['tracking']:
+            # Simulate different tracking statuses
+            current_status = next(TRACKING_STATUSES)
+            return f"Tracking number {order['tracking']} for order {order_id} - Status: {current_status}"
+        return f"Order {order_id} doesn't have tracking information yet."
     except Exception as e:
         return f"Error tracking shipment: {str(e)}"
 
 try:
     # Initialize the client
-    client = Swarm()
+    client = get_client()
     
     # Create the order support agent with functions
     agent = Agent(
         name=AGENT_NAME,
         model=MODEL_NAME,
+        max_tokens=MAX_TOKENS,
         instructions=SYSTEM_INSTRUCTIONS,
         functions=[check_order_status, track_shipment]
     )
+    freeze_tools(agent)
+    
+    # Initialize the conversation
+    session = ChatSession(agent)
     
-    # Initialize conversation history
-    conversation_history = []
+    print(f"{GREEN}Order Support System Initialized!{RESET}")
+    print(f"{YELLOW}Available commands:{RESET}")
+    print(f"{YELLOW}- Check order status (e.g., 'What's the status of order ORD123?'){RESET}")
+    print(f"{YELLOW}- Track shipment (e.g., 'Track my order ORD123'){RESET}")
+    print(f"{YELLOW}- Type 'exit' to end the conversation\n{RESET}")
     
-    print(colored("Order Support System Initialized!", "green"))
-    print(colored("Available commands:", "yellow"))
-    print(colored("- Check order status (e.g., 'What's the status of order ORD123?')", "yellow"))
-    print(colored("- Track shipment (e.g., 'Track my order ORD123')", "yellow"))
-    print(colored("- Type 'exit' to end the conversation\n", "yellow"))
+    asyncio.run(chat_loop(answer_turns(client, session), f"{GREEN}\nThank you for using our Order Support! Goodbye!{RESET}"))
     
-    while True:
-        # Get user input
-        user_input = input(colored("You: ", "cyan"))
-        
-        if user_input.lower() == 'exit':
-            print(colored("\nThank you for using our Order Support! Goodbye!", "green"))
-            break
-            
-        # Add user message to history
-        conversation_history.append({"role": "user", "content": user_input})
-        
-        try:
-            # Get response from agent
-            response = client.run(
-                agent=agent,
-                messages=conversation_history
-            )
-            
-            # Update conversation history with agent's response
-            conversation_history.extend(response.messages)
-            
-            # Print agent's response
-            print(colored(f"\n{AGENT_NAME}: {response.messages[-1]['content']}\n", "green"))
-            
-        except Exception as e:
-            print(colored(f"\nError: {str(e)}", "red"))
-            print(colored("Please try again.\n", "yellow"))
-            
 except Exception as e:
-    print(colored(f"Initialization Error: {str(e)}", "red")) 
\ No newline at end of file
+    print(f"{RED}Initialization Error: {str(e)}{RESET}") 
\ No newline at end of file
@@ -5,23 +5,20 @@
 # Includes preference tracking and personalized responses
 """
 
-from swarm import Swarm, Agent, Result
-from termcolor import colored
-import os
-from openai import AsyncOpenAI
+from _shared import Agent, ChatSession, answer_turns, chat_loop, freeze_tools, get_client
+from _shared import GREEN, YELLOW, RED, RESET
 import asyncio
-from typing import Dict
+from typing import Dict, Tuple
+from functools import lru_cache
 
 # Constants
 MODEL_NAME = "gpt-4o"
+MAX_TOKENS = 256
 AGENT_NAME = "Personal Support Agent"
 
-def get_instructions(context_variables: Dict) -> str:
-    """Dynamic instructions based on context"""
-    customer_name = context_variables.get("customer_name", "valued customer")
-    preferred_language = context_variables.get("preferred_language", "English")
-    previous_issues = context_variables.get("previous_issues", [])
-    
+@lru_cache(maxsize=64)
+def build_instructions(customer_name: str, preferred_language: str, previous_issues: Tuple[str, ...]) -> str:
+    """Render the instructions once per distinct customer profile"""
     instructions = f"""You are a Personal Support Agent for {customer_name}.
 Preferred Language: {preferred_language}
 Previous Issues: {', '.join(previous_issues) if previous_issues else 'None'}
@@ -31,6 +28,15 @@ Be proactive in suggesting solutions based on previous interactions."""
     
     return instructions
 
+def get_instructions(context_variables: Dict) -> str:
+    """Dynamic instructions based on context"""
+    # Swarm calls this on every turn; the prompt only changes when the profile does
+    return build_instructions(
+        context_variables.get("customer_name", "valued customer"),
+        context_variables.get("preferred_language", "English"),
+        tuple(context_variables.get("previous_issues", ()))
+    )
+
 def update_preferences(context_variables: Dict, preference_type: str, value: str) -> str:
     """Update customer preferences
     
@@ -67,16 +73,17 @@ def get_customer_profile(context_variables: Dict) -> str:
         context_variables: Current context variables
     """
     try:
-        profile = [f"Customer Name: {context_variables.get('customer_name', 'Not set')}",
-                  f"Preferred Language: {context_variables.get('preferred_language', 'Not set')}",
-                  f"Previous Issues: {', '.join(context_variables.get('previous_issues', ['None']))}"]
-        return "\n".join(profile)
+        return (
+            f"Customer Name: {context_variables.get('customer_name', 'Not set')}\n"
+            f"Preferred Language: {context_variables.get('preferred_language', 'Not set')}\n"
+            f"Previous Issues: {', '.join(context_variables.get('previous_issues', ['None']))}"
+        )
     except Exception as e:
         return f"Error getting profile: {str(e)}"
 
 try:
     # Initialize the client
-    client = Swarm()
+    client = get_client()
     
     # Initialize context variables
     context = {
@@ -89,51 +96,23 @@ try:
     agent = Agent(
         name=AGENT_NAME,
         model=MODEL_NAME,
+        max_tokens=MAX_TOKENS,
         instructions=get_instructions,
         functions=[update_preferences, add_issue, get_customer_profile]
     )
+    freeze_tools(agent)
+    
+    # Initialize the conversation, carrying the context between turns
+    session = ChatSession(agent, context)
     
-    # Initialize conversation history
-    conversation_history = []
+    print(f"{GREEN}Personal Support System Initialized!{RESET}")
+    print(f"{YELLOW}Available commands:{RESET}")
+    print(f"{YELLOW}- Update preferences (e.g., 'I prefer Spanish'){RESET}")
+    print(f"{YELLOW}- Report issue (e.g., 'I had a problem with login'){RESET}")
+    print(f"{YELLOW}- View profile (e.g., 'Show my profile'){RESET}")
+    print(f"{YELLOW}- Type 'exit' to end the conversation\n{RESET}")
     
-    print(colored("Personal Support System Initialized!", "green"))
-    print(colored("Available commands:", "yellow"))
-    print(colored("- Update preferences (e.g., 'I prefer Spanish')", "yellow"))
-    print(colored("- Report issue (e.g., 'I had a problem with login')", "yellow"))
-    print(colored("- View profile (e.g., 'Show my profile')", "yellow"))
-    print(colored("- Type 'exit' to end the conversation\n", "yellow"))
+    asyncio.run(chat_loop(answer_turns(client, session), f"{GREEN}\nThank you for using our Personal Support! Goodbye!{RESET}"))
     
-    while True:
-        # Get user input
-        user_input = input(colored("You: ", "cyan"))
-        
-        if user_input.lower() == 'exit':
-            print(colored("\nThank you for using our Personal Support! Goodbye!", "green"))
-            break
-            
-        # Add user message to history
-        conversation_history.append({"role": "user", "content": user_input})
-        
-        try:
-            # Get response from agent with context
-            response = client.run(
-                agent=agent,
-                messages=conversation_history,
-                context_variables=context
-            )
-            
-            # Update context with any changes
-            context.update(response.context_variables)
-            
-            # Update conversation history
-            conversation_history.extend(response.messages)
-            
-            # Print agent's response
-            print(colored(f"\n{AGENT_NAME}: {response.messages[-1]['content']}\n", "green"))
-            
-        except Exception as e:
-            print(colored(f"\nError: {str(e)}", "red"))
-            print(colored("Please try again.\n", "yellow"))
-            
 except Exception as e:
-    print(colored(f"Initialization Error: {str(e)}", "red")) 
\ No newline at end of file
+    print(f"{RED}Initialization Error: {str(e)}{RESET}") 
\ No newline at end of file
@@ -5,21 +5,19 @@
 # Includes department-specific functions and knowledge
 """
 
-from swarm import Swarm, Agent
+from _shared import Agent, ChatSession, answer_turns, chat_loop, freeze_tools, get_client, tool_log
+from _shared import GREEN, YELLOW, RED, RESET
 from swarm.types import Result
-from termcolor import colored
-import os
-from openai import AsyncOpenAI
 import asyncio
-from typing import Dict, Optional
 
 # Constants
 MODEL_NAME = "gpt-4o"
+MAX_TOKENS = 256
 
 # Technical Support Functions
 def check_system_status() -> str:
     """Check the status of various systems"""
-    print(colored("\n🔄 Checking system status...", "magenta"))
+    tool_log.info("🔄 Checking system status...")
     return "All systems operational: Website (✓) | Database (✓) | API (✓)"
 
 def troubleshoot_issue(issue_type: str) -> str:
@@ -28,7 +26,7 @@ def troubleshoot_issue(issue_type: str) -> str:
     Args:
         issue_type: Type of issue to troubleshoot
     """
-    print(colored(f"\n🛠️ Getting troubleshooting steps for: {issue_type}", "magenta"))
+    tool_log.info("🛠️ Getting troubleshooting steps for: %s", issue_type)
     solutions = {
         "login": "1. Clear browser cache\n2. Reset password\n3. Check email verification",
         "performance": "1. Check internet connection\n2. Clear browser cache\n3. Try incognito mode",
@@ -43,7 +41,7 @@ def check_payment_status(invoice_id: str) -> str:
     Args:
         invoice_id: Invoice ID to check
     """
-    print(colored(f"\n💳 Checking payment status for invoice: {invoice_id}", "magenta"))
+    tool_log.info("💳 Checking payment status for invoice: %s", invoice_id)
     # Mock payment data
     payments = {
         "INV001": "Paid",
@@ -58,13 +56,14 @@ def process_refund(order_id: str) -> str:
     Args:
         order_id: Order ID to refund
     """
-    print(colored(f"\n💰 Processing refund for order: {order_id}", "magenta"))
+    tool_log.info("💰 Processing refund for order: %s", order_id)
     return f"Refund initiated for order {order_id}. Please allow 3-5 business days for processing."
 
 # Create specialized agents
 tech_support = Agent(
     name="Tech Support",
     model=MODEL_NAME,
+    max_tokens=MAX_TOKENS,
     instructions="""You are a Technical Support Specialist.
 Focus on resolving technical issues and system-related problems.
 Use the available diagnostic and troubleshooting tools.""",
@@ -74,6 +73,7 @@ Use the available diagnostic and troubleshooting tools.""",
 billing_support = Agent(
     name="Billing Support",
     model=MODEL_NAME,
+    max_tokens=MAX_TOKENS,
     instructions="""You are a Billing Support Specialist.
 Handle all payment, invoice, and refund related queries.
 Ensure accurate processing of financial transactions.""",
@@ -98,6 +98,7 @@ def transfer_to_billing_support() -> Result:
 triage_agent = Agent(
     name="Support Triage",
     model=MODEL_NAME,
+    max_tokens=MAX_TOKENS,
     instructions="""You are the initial Support Triage Agent.
 Determine if the customer needs technical or billing support.
 Transfer to the appropriate department using the available functions.
@@ -106,51 +107,24 @@ For billing issues: transfer_to_billing_support()""",
     functions=[transfer_to_tech_support, transfer_to_billing_support]
 )
 
+# Build every agent's tool schemas once, up front
+for department_agent in (tech_support, billing_support, triage_agent):
+    freeze_tools(department_agent)
+
 try:
     # Initialize the client
-    client = Swarm()
+    client = get_client()
+    
+    # Initialize the conversation, starting with triage; the session follows any handoff
+    session = ChatSession(triage_agent)
     
-    # Initialize conversation history
-    conversation_history = []
+    print(f"{GREEN}Customer Support System Initialized!{RESET}")
+    print(f"{YELLOW}Available departments:{RESET}")
+    print(f"{YELLOW}- Technical Support (system issues, troubleshooting){RESET}")
+    print(f"{YELLOW}- Billing Support (payments, refunds, invoices){RESET}")
+    print(f"{YELLOW}Type 'exit' to end the conversation\n{RESET}")
     
-    print(colored("Customer Support System Initialized!", "green"))
-    print(colored("Available departments:", "yellow"))
-    print(colored("- Technical Support (system issues, troubleshooting)", "yellow"))
-    print(colored("- Billing Support (payments, refunds, invoices)", "yellow"))
-    print(colored("Type 'exit' to end the conversation\n", "yellow"))
+    asyncio.run(chat_loop(answer_turns(client, session), f"{GREEN}\nThank you for using our support system! Goodbye!{RESET}"))
     
-    while True:
-        # Get user input
-        user_input = input(colored("You: ", "cyan"))
-        
-        if user_input.lower() == 'exit':
-            print(colored("\nThank you for using our support system! Goodbye!", "green"))
-            break
-            
-        # Add user message to history
-        conversation_history.append({"role": "user", "content": user_input})
-        
-        try:
-            # Get response from current agent
-            response = client.run(
-                agent=triage_agent,  # Initial agent, may change during conversation
-                messages=conversation_history
-            )
-            
-            # Update conversation history
-            conversation_history.extend(response.messages)
-            
-            # Handle agent transfer if it occurred
-            if response.agent:
-                triage_agent = response.agent
-                print(colored(f"\nTransferred to {triage_agent.name}!", "yellow"))
-            
-            # Print agent's response
-            print(colored(f"\n{response.messages[-1]['sender']}: {response.messages[-1]['content']}\n", "green"))
-            
-        except Exception as e:
-            print(colored(f"\nError: {str(e)}", "red"))
-            print(colored("Please try again.\n", "yellow"))
-            
 except Exception as e:
-    print(colored(f"Initialization Error: {str(e)}", "red")) 
\ No newline at end of file
+    print(f"{RED}Initialization Error: {str(e)}{RESET}") 
\ No newline at end of file
@@ -5,18 +5,14 @@
 # Includes detailed product information and search capabilities
 """
 
-from swarm import Swarm, Agent
-from swarm.types import Result
-from termcolor import colored
-import os
-from openai import AsyncOpenAI
+from _shared import Agent, ChatSession, answer_turns, chat_loop, freeze_tools, get_client, tool_log
+from _shared import GREEN, YELLOW, RED, RESET
 import asyncio
-from typing import Dict, List
-import time
-import sys
+from functools import lru_cache
 
 # Constants
 MODEL_NAME = "gpt-4o"
+MAX_TOKENS = 512
 AGENT_NAME = "Product Specialist"
 
 # Mock product database
@@ -55,29 +51,70 @@ PRODUCTS = {
     }
 }
 
+# Valid product IDs, for membership checks that don't need the product itself
+PRODUCT_IDS = frozenset(PRODUCTS)
+
+# Lowercased searchable text per product, built once at import time
+PRODUCT_SEARCH_BLOB = {
+    pid: " ".join([
+        product["name"],
+        *(f"{key} {value}" for key, value in product["specs"].items()),
+        *product["features"]
+    ]).lower()
+    for pid, product in PRODUCTS.items()
+}
+
+# The catalog never changes at runtime, so tool outputs are memoized per argument
+@lru_cache(maxsize=128)
+def format_product_info(product_id: str) -> str:
+    """Build the product information text for a known product ID"""
+    product = PRODUCTS[product_id]
+    info = [
+        f"Product: {product['name']}",
+        f"Price: ${product['price']}",
+        "\nSpecifications:",
+        *(f"- {k.upper()}: {v}" for k, v in product['specs'].items()),
+        "\nFeatures:",
+        *(f"- {feature}" for feature in product['features'])
+    ]
+    return "\n".join(info)
+
 def get_product_info(product_id: str) -> str:
     """Get detailed product information
     
     Args:
         product_id: ID of the product to look up
     """
-    print(colored(f"\n📱 Retrieving product information for: {product_id}", "magenta"))
+    tool_log.info("📱 Retrieving product information for: %s", product_id)
     try:
-        if product_id in PRODUCTS:
-            product = PRODUCTS[product_id]
-            info = [
-                f"Product: {product['name']}",
-                f"Price: ${product['price']}",
-                "\nSpecifications:",
-                *[f"- {k.upper()}: {v}" for k, v in product['specs'].items()],
-                "\nFeatures:",
-                *[f"- {feature}" for feature in product['features']]
-            ]
-            return "\n".join(info)
-        return f"Product {product_id} not found in our catalog."
+        # Reject unknown IDs up front so they never take up cache slots
+        if product_id not in PRODUCT_IDS:
+            return f"Product {product_id} not found in our catalog."
+        return format_product_info(product_id)
     except Exception as e:
         return f"Error retrieving product information: {str(e)}"
 
+@lru_cache(maxsize=128)
+def format_comparison(product_id1: str, product_id2: str) -> str:
+    """Build the side-by-side comparison text for two known product IDs"""
+    p1 = PRODUCTS[product_id1]
+    p2 = PRODUCTS[product_id2]
+    
+    comparison = [
+        f"Comparing {p1['name']} vs {p2['name']}",
+        f"\nPrice:",
+        f"{p1['name']}: ${p1['price']}",
+        f"{p2['name']}: ${p2['price']}",
+        f"\nSpecifications Comparison:"
+    ]
+    
+    for spec, value in p1['specs'].items():
+        comparison.append(f"{spec.upper()}:")
+        comparison.append(f"- {p1['name']}: {value}")
+        comparison.append(f"- {p2['name']}: {p2['specs'][spec]}")
+        
+    return "\n".join(comparison)
+
 def compare_products(product_id1: str, product_id2: str) -> str:
     """Compare two products
     
@@ -86,29 +123,24 @@ def compare_products(product_id1: str, product_id2: str) -> str:
         product_id2: Second product ID
     """
     try:
-        if product_id1 not in PRODUCTS or product_id2 not in PRODUCTS:
+        if product_id1 not in PRODUCT_IDS or product_id2 not in PRODUCT_IDS:
             return "One or both products not found."
-            
-        p1 = PRODUCTS[product_id1]
-        p2 = PRODUCTS[product_id2]
-        
-        comparison = [
-            f"Comparing {p1['name']} vs {p2['name']}",
-            f"\nPrice:",
-            f"{p1['name']}: ${p1['price']}",
-            f"{p2['name']}: ${p2['price']}",
-            f"\nSpecifications Comparison:"
-        ]
-        
-        for spec in p1['specs'].keys():
-            comparison.append(f"{spec.upper()}:")
-            comparison.append(f"- {p1['name']}: {p1['specs'][spec]}")
-            comparison.append(f"- {p2['name']}: {p2['specs'][spec]}")
-            
-        return "\n".join(comparison)
+        return format_comparison(product_id1, product_id2)
     except Exception as e:
         return f"Error comparing products: {str(e)}"
 
+@lru_cache(maxsize=64)
+def find_products(query: str) -> str:
+    """Build the search results text for a lowercased query"""
+    results = []
+    for pid, blob in PRODUCT_SEARCH_BLOB.items():
+        if query in blob:
+            results.append(f"- {PRODUCTS[pid]['name']} (ID: {pid})")
+            
+    if results:
+        return "Found products:\n" + "\n".join(results)
+    return "No products found matching your query."
+
 def search_products(query: str) -> str:
     """Search products by keyword
     
@@ -116,85 +148,37 @@ def search_products(query: str) -> str:
         query: Search query
     """
     try:
-        results = []
-        query = query.lower()
-        
-        for pid, product in PRODUCTS.items():
-            if (query in product['name'].lower() or
-                query in str(product['specs']).lower() or
-                query in str(product['features']).lower()):
-                results.append(f"- {product['name']} (ID: {pid})")
-                
-        if results:
-            return "Found products:\n" + "\n".join(results)
-        return "No products found matching your query."
+        return find_products(query.lower())
     except Exception as e:
         return f"Error searching products: {str(e)}"
 
 try:
     # Initialize the client
-    client = Swarm()
+    client = get_client()
     
     # Create the product specialist agent
     agent = Agent(
         name=AGENT_NAME,
         model=MODEL_NAME,
+        max_tokens=MAX_TOKENS,
         instructions="""You are a Product Specialist with deep knowledge of our product catalog.
 Help customers find and compare products, and provide detailed information about specifications and features.
 Use the available functions to search and retrieve product information.""",
         functions=[get_product_info, compare_products, search_products]
     )
+    freeze_tools(agent)
     
-    # Initialize conversation history
-    conversation_history = []
+    # Initialize the conversation
+    session = ChatSession(agent)
     
-    print(colored("Product Information System Initialized!", "green"))
-    print(colored("Available commands:", "yellow"))
-    print(colored("- Get product info (e.g., 'Tell me about laptop-pro')", "yellow"))
-    print(colored("- Compare products (e.g., 'Compare laptop-pro and smartphone-x')", "yellow"))
-    print(colored("- Search products (e.g., 'Search for laptops')", "yellow"))
-    print(colored("Type 'exit' to end the conversation\n", "yellow"))
+    print(f"{GREEN}Product Information System Initialized!{RESET}")
+    print(f"{YELLOW}Available commands:{RESET}")
+    print(f"{YELLOW}- Get product info (e.g., 'Tell me about laptop-pro'){RESET}")
+    print(f"{YELLOW}- Compare products (e.g., 'Compare laptop-pro and smartphone-x'){RESET}")
+    print(f"{YELLOW}- Search products (e.g., 'Search for laptops'){RESET}")
+    print(f"{YELLOW}Type 'exit' to end the conversation\n{RESET}")
+    
+    asyncio.run(chat_loop(answer_turns(client, session, stream=True), f"{GREEN}\nThank you for using our Product Information System! Goodbye!{RESET}"))
     
-    while True:
-        # Get user input
-        user_input = input(colored("You: ", "cyan"))
-        
-        if user_input.lower() == 'exit':
-            print(colored("\nThank you for using our Product Information System! Goodbye!", "green"))
-            break
-            
-        # Add user message to history
-        conversation_history.append({"role": "user", "content": user_input})
-        
-        try:
-            # Get streaming response from agent
-            stream = client.run(
-                agent=agent,
-                messages=conversation_history,
-                stream=True
-            )
-            
-            # Process the stream
-            current_message = ""
-            print(colored(f"\n{AGENT_NAME}: ", "green"), end="", flush=True)
-            
-            for chunk in stream:
-                if "delim" in chunk:
-                    continue
-                elif "response" in chunk:
-                    # Final response object
-                    conversation_history.extend(chunk["response"].messages)
-                    print("\n")
-                else:
-                    # Content chunk
-                    if "content" in chunk:
-                        content = chunk["content"]
-                        current_message += content
-                        print(content, end="", flush=True)
-                        
-        except Exception as e:
-            print(colored(f"\nError: {str(e)}", "red"))
-            print(colored("Please try again.\n", "yellow"))
-            
 except Exception as e:
-    print(colored(f"Initialization Error: {str(e)}", "red")) 
\ No newline at end of file
+    print(f"{RED}Initialization Error: {str(e)}{RESET}") 
\ No newline at end of file
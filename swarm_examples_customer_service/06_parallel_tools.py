@@ -5,15 +5,11 @@
 # Includes flight, hotel, and car rental availability checks
 """
 
-from swarm import Swarm, Agent
-from swarm.types import Result
-from termcolor import colored
-import os
-from openai import AsyncOpenAI
+from swarm import Agent
+from _shared import CachedSwarm, ChatSession, answer_turns, chat_loop, get_client, tool_log
+from _shared import GREEN, YELLOW, RED, RESET
 import asyncio
-from typing import Dict, List
-import random
-from datetime import datetime, timedelta
+from itertools import chain
 
 # Constants
 MODEL_NAME = "gpt-4o"
@@ -53,6 +49,13 @@ CARS = {
     ]
 }
 
+# Each city's cars grouped by lowercased type, so filtering is one lookup
+CARS_BY_TYPE = {}
+for city, cars in CARS.items():
+    by_type = CARS_BY_TYPE[city] = {}
+    for car in cars:
+        by_type.setdefault(car["type"].lower(), []).append(car)
+
 def check_flights(from_city: str, to_city: str) -> str:
     """Check flight availability
     
@@ -60,17 +63,15 @@ def check_flights(from_city: str, to_city: str) -> str:
         from_city: Departure city
         to_city: Arrival city
     """
-    print(colored(f"\n✈️ Checking flights from {from_city} to {to_city}", "magenta"))
+    tool_log.info("✈️ Checking flights from %s to %s", from_city, to_city)
     try:
         route = f"{from_city}-{to_city}"
         if route in FLIGHTS:
             flights = FLIGHTS[route]
-            result = [f"Found {len(flights)} flights from {from_city} to {to_city}:"]
-            for flight in flights:
-                result.append(
-                    f"- {flight['airline']}: ${flight['price']} ({flight['duration']})"
-                )
-            return "\n".join(result)
+            return "\n".join(chain(
+                [f"Found {len(flights)} flights from {from_city} to {to_city}:"],
+                (f"- {flight['airline']}: ${flight['price']} ({flight['duration']})" for flight in flights)
+            ))
         return f"No flights found for route {from_city} to {to_city}"
     except Exception as e:
         return f"Error checking flights: {str(e)}"
@@ -85,12 +86,10 @@ def check_hotels(city: str, max_price: float = 1000.0) -> str:
     try:
         if city in HOTELS:
             hotels = [h for h in HOTELS[city] if h['price'] <= max_price]
-            result = [f"Found {len(hotels)} hotels in {city}:"]
-            for hotel in hotels:
-                result.append(
-                    f"- {hotel['name']}: ${hotel['price']}/night ({hotel['rating']}★)"
-                )
-            return "\n".join(result)
+            return "\n".join(chain(
+                [f"Found {len(hotels)} hotels in {city}:"],
+                (f"- {hotel['name']}: ${hotel['price']}/night ({hotel['rating']}★)" for hotel in hotels)
+            ))
         return f"No hotels found in {city}"
     except Exception as e:
         return f"Error checking hotels: {str(e)}"
@@ -105,15 +104,14 @@ def check_car_rentals(city: str, car_type: str = "all") -> str:
     try:
         if city in CARS:
             cars = CARS[city]
-            if car_type.lower() != "all":
-                cars = [c for c in cars if c['type'].lower() == car_type.lower()]
+            car_type = car_type.lower()
+            if car_type != "all":
+                cars = CARS_BY_TYPE[city].get(car_type, [])
             
-            result = [f"Found {len(cars)} car rentals in {city}:"]
-            for car in cars:
-                result.append(
-                    f"- {car['company']} {car['type']}: ${car['price']}/day"
-                )
-            return "\n".join(result)
+            return "\n".join(chain(
+                [f"Found {len(cars)} car rentals in {city}:"],
+                (f"- {car['company']} {car['type']}: ${car['price']}/day" for car in cars)
+            ))
         return f"No car rentals found in {city}"
     except Exception as e:
         return f"Error checking car rentals: {str(e)}"
@@ -146,7 +144,7 @@ def get_travel_package(from_city: str, to_city: str) -> str:
 
 try:
     # Initialize the client
-    client = Swarm()
+    client = CachedSwarm(get_client())
     
     # Create the travel advisor agent
     agent = Agent(
@@ -160,44 +158,21 @@ For complete trip planning, use get_travel_package to check everything at once."
         parallel_tool_calls=True  # Enable parallel function execution
     )
     
-    # Initialize conversation history
-    conversation_history = []
+    # Initialize the conversation
+    session = ChatSession(agent)
     
-    print(colored("Travel Planning System Initialized!", "green"))
-    print(colored("Available services:", "yellow"))
-    print(colored("- Check flights (NYC-LAX, LAX-NYC)", "yellow"))
-    print(colored("- Check hotels (NYC, LAX)", "yellow"))
-    print(colored("- Check car rentals (NYC, LAX)", "yellow"))
-    print(colored("- Get complete travel packages", "yellow"))
-    print(colored("Type 'exit' to end the conversation\n", "yellow"))
+    # One write for the whole banner
+    print(
+        f"{GREEN}Travel Planning System Initialized!{RESET}\n"
+        f"{YELLOW}Available services:{RESET}\n"
+        f"{YELLOW}- Check flights (NYC-LAX, LAX-NYC){RESET}\n"
+        f"{YELLOW}- Check hotels (NYC, LAX){RESET}\n"
+        f"{YELLOW}- Check car rentals (NYC, LAX){RESET}\n"
+        f"{YELLOW}- Get complete travel packages{RESET}\n"
+        f"{YELLOW}Type 'exit' to end the conversation\n{RESET}"
+    )
+    
+    asyncio.run(chat_loop(answer_turns(client, session, stream=True), f"{GREEN}\nThank you for using our Travel Planning System! Goodbye!{RESET}"))
     
-    while True:
-        # Get user input
-        user_input = input(colored("You: ", "cyan"))
-        
-        if user_input.lower() == 'exit':
-            print(colored("\nThank you for using our Travel Planning System! Goodbye!", "green"))
-            break
-            
-        # Add user message to history
-        conversation_history.append({"role": "user", "content": user_input})
-        
-        try:
-            # Get response from agent
-            response = client.run(
-                agent=agent,
-                messages=conversation_history
-            )
-            
-            # Update conversation history
-            conversation_history.extend(response.messages)
-            
-            # Print agent's response
-            print(colored(f"\n{AGENT_NAME}: {response.messages[-1]['content']}\n", "green"))
-            
-        except Exception as e:
-            print(colored(f"\nError: {str(e)}", "red"))
-            print(colored("Please try again.\n", "yellow"))
-            
 except Exception as e:
-    print(colored(f"Initialization Error: {str(e)}", "red")) 
\ No newline at end of file
+    print(f"{RED}Initialization Error: {str(e)}{RESET}") 
\ No newline at end of file
@@ -5,24 +5,96 @@
 # Includes ticket priority assessment and routing
 """
 
-from swarm import Swarm, Agent
-from swarm.types import Result
-from termcolor import colored
+from swarm import Agent
+from _shared import CachedSwarm, chat_loop, get_client, stream_turn, timestamp, trim_history, tool_log
+from _shared import GREEN, YELLOW, RED, RESET
 import os
-from openai import AsyncOpenAI
 import asyncio
-from typing import Dict, List
-import time
-from datetime import datetime
+import json
+import threading
+from typing import Dict, List, Optional
+import re
+from dataclasses import asdict, dataclass
+from itertools import count
+from functools import lru_cache
 
 # Constants
 DEFAULT_MODEL = "gpt-4o"
 FAST_MODEL = "gpt-4o-mini"  # For quick assessments
 AGENT_NAME = "Support Coordinator"
 
+@dataclass(slots=True)
+class Ticket:
+    """A support ticket in the mock database"""
+    description: str
+    customer_email: str
+    status: str
+    created_at: str
+    priority: str
+    department: str
+
 # Mock ticket database
-TICKETS = {}
-TICKET_COUNTER = 0
+TICKETS: Dict[str, Ticket] = {}
+# next() on a count is atomic, so concurrent tool calls never share an ID
+TICKET_NUMBERS = count(1)
+
+# Optional append-only ticket log, one JSON line per change; set TICKET_LOG=<path> to enable
+TICKET_LOG_PATH = os.environ.get("TICKET_LOG")
+_ticket_log_lock = threading.Lock()
+
+def log_ticket(ticket_id: str):
+    """Append a ticket's current state to the ticket log, if one is configured
+    
+    Tools run in Swarm's worker threads, so the write never blocks the event loop.
+    The file is opened for each write, so every line is on disk once the
+    tool returns and nothing is left open at exit.
+    """
+    if not TICKET_LOG_PATH:
+        return
+    line = json.dumps({"ticket_id": ticket_id, **asdict(TICKETS[ticket_id])})
+    with _ticket_log_lock, open(TICKET_LOG_PATH, "a", encoding="utf-8") as log:
+        log.write(line + "\n")
+
+# Keyword tables for the mock assessment and routing; earlier keywords win
+PRIORITY_KEYWORDS = {
+    "urgent": "high",
+    "emergency": "high",
+    "broken": "high",
+    "bug": "medium",
+    "question": "low",
+    "help": "low"
+}
+
+DEPARTMENT_KEYWORDS = {
+    "password": "security",
+    "login": "security",
+    "payment": "billing",
+    "charge": "billing",
+    "bug": "technical",
+    "error": "technical"
+}
+
+def compile_keywords(keywords: Dict[str, str]) -> re.Pattern:
+    """Compile a keyword table into one alternation scanned in a single pass"""
+    return re.compile("|".join(map(re.escape, keywords)))
+
+PRIORITY_PATTERN = compile_keywords(PRIORITY_KEYWORDS)
+DEPARTMENT_PATTERN = compile_keywords(DEPARTMENT_KEYWORDS)
+
+def match_keyword(pattern: re.Pattern, keywords: Dict[str, str], text: str):
+    """Value of the earliest-listed keyword that occurs in text, or None"""
+    found = set(pattern.findall(text))
+    return next((value for keyword, value in keywords.items() if keyword in found), None)
+
+@lru_cache(maxsize=4096)
+def priority_for(description: str) -> Optional[str]:
+    """Matched priority for a ticket description, remembered per description"""
+    return match_keyword(PRIORITY_PATTERN, PRIORITY_KEYWORDS, description.lower())
+
+@lru_cache(maxsize=4096)
+def department_for(description: str) -> Optional[str]:
+    """Matched department for a ticket description, remembered per description"""
+    return match_keyword(DEPARTMENT_PATTERN, DEPARTMENT_KEYWORDS, description.lower())
 
 class TicketPriorityError(Exception):
     """Custom error for invalid ticket priorities"""
@@ -44,20 +116,19 @@ def create_ticket(
         customer_email: Customer's email
         context_variables: Context variables including agent assessment
     """
-    print(colored(f"\n🎫 Creating ticket for customer: {customer_email}", "magenta"))
+    tool_log.info("🎫 Creating ticket for customer: %s", customer_email)
     try:
-        global TICKET_COUNTER
-        TICKET_COUNTER += 1
-        ticket_id = f"TICK{TICKET_COUNTER:04d}"
+        ticket_id = f"TICK{next(TICKET_NUMBERS):04d}"
         
-        TICKETS[ticket_id] = {
-            "description": description,
-            "customer_email": customer_email,
-            "status": "new",
-            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "priority": context_variables.get("assessed_priority", "medium"),
-            "department": context_variables.get("assigned_department", "general")
-        }
+        TICKETS[ticket_id] = Ticket(
+            description=description,
+            customer_email=customer_email,
+            status="new",
+            created_at=timestamp(),
+            priority=context_variables.get("assessed_priority", "medium"),
+            department=context_variables.get("assigned_department", "general")
+        )
+        log_ticket(ticket_id)
         
         return f"Created ticket {ticket_id}"
     except Exception as e:
@@ -71,21 +142,8 @@ def assess_priority(description: str) -> str:
     """
     try:
         # Simulate priority assessment
-        keywords = {
-            "urgent": "high",
-            "emergency": "high",
-            "broken": "high",
-            "bug": "medium",
-            "question": "low",
-            "help": "low"
-        }
-        
-        description = description.lower()
-        for keyword, priority in keywords.items():
-            if keyword in description:
-                return f"Assessed priority: {priority}"
-        
-        return "Assessed priority: medium"
+        priority = priority_for(description)
+        return f"Assessed priority: {priority or 'medium'}"
     except Exception as e:
         return f"Error assessing priority: {str(e)}"
 
@@ -97,21 +155,8 @@ def route_to_department(description: str) -> str:
     """
     try:
         # Simulate department routing
-        keywords = {
-            "password": "security",
-            "login": "security",
-            "payment": "billing",
-            "charge": "billing",
-            "bug": "technical",
-            "error": "technical"
-        }
-        
-        description = description.lower()
-        for keyword, dept in keywords.items():
-            if keyword in description:
-                return f"Routed to: {dept}"
-        
-        return "Routed to: general"
+        dept = department_for(description)
+        return f"Routed to: {dept or 'general'}"
     except Exception as e:
         return f"Error routing ticket: {str(e)}"
 
@@ -126,10 +171,10 @@ def get_ticket_status(ticket_id: str) -> str:
             ticket = TICKETS[ticket_id]
             return (
                 f"Ticket {ticket_id}:\n"
-                f"Status: {ticket['status']}\n"
-                f"Priority: {ticket['priority']}\n"
-                f"Department: {ticket['department']}\n"
-                f"Created: {ticket['created_at']}"
+                f"Status: {ticket.status}\n"
+                f"Priority: {ticket.priority}\n"
+                f"Department: {ticket.department}\n"
+                f"Created: {ticket.created_at}"
             )
         return f"Ticket {ticket_id} not found"
     except Exception as e:
@@ -150,14 +195,86 @@ def update_ticket_status(ticket_id: str, new_status: str) -> str:
         if new_status not in valid_statuses:
             raise ValueError(f"Invalid status. Must be one of: {', '.join(valid_statuses)}")
             
-        TICKETS[ticket_id]["status"] = new_status
+        TICKETS[ticket_id].status = new_status
+        log_ticket(ticket_id)
         return f"Updated ticket {ticket_id} status to: {new_status}"
     except Exception as e:
         return f"Error updating ticket status: {str(e)}"
 
+async def assess_and_route(user_input: str) -> Dict:
+    """Run priority assessment and department routing for a new ticket
+    
+    Both specialists only look at the user's message, so they run concurrently.
+    """
+    context = {}
+    messages = [{"role": "user", "content": user_input}]
+    priority_response, routing_response = await asyncio.gather(
+        client.run_async(agent=assessment_agent, messages=messages),
+        client.run_async(agent=routing_agent, messages=messages),
+        return_exceptions=True
+    )
+    
+    try:
+        # Get priority assessment
+        if isinstance(priority_response, Exception):
+            raise priority_response
+        priority = priority_response.messages[-1]["content"].split(": ")[1]
+        context["assessed_priority"] = priority
+        print(f"{YELLOW}Priority Assessment: {priority}{RESET}")
+        
+        # Get department routing
+        if isinstance(routing_response, Exception):
+            raise routing_response
+        department = routing_response.messages[-1]["content"].split(": ")[1]
+        context["assigned_department"] = department
+        print(f"{YELLOW}Department Assignment: {department}{RESET}")
+        
+    except Exception as e:
+        print(f"{YELLOW}Warning: Assessment error: {str(e)}{RESET}")
+        print(f"{YELLOW}Proceeding with default values...\n{RESET}")
+    
+    return context
+
+async def start_answer(history: List[Dict], user_input: str):
+    """Assess the message if needed, then start streaming the support agent's reply"""
+    # Initialize context for new tickets
+    context = {}
+    
+    # If it looks like a new ticket request, do priority assessment and routing
+    if "help" in user_input.lower() or "issue" in user_input.lower():
+        context = await assess_and_route(user_input)
+    
+    # Get response from support agent
+    return client.stream_async(
+        agent=support_agent,
+        messages=history + [{"role": "user", "content": user_input}],
+        context_variables=context
+    )
+
+async def answer(user_input: str):
+    """Answer one message, streaming the support agent's reply as it arrives"""
+    # Drop the oldest turns once the history outgrows the token budget
+    trim_history(conversation_history)
+    
+    try:
+        stream = await start_answer(conversation_history, user_input)
+        
+        # Add user message to history
+        conversation_history.append({"role": "user", "content": user_input})
+        
+        # Print agent's response as it arrives
+        print(f"{GREEN}\n{AGENT_NAME}: {RESET}", end="", flush=True)
+        response = await stream_turn(stream)
+        if response:
+            conversation_history.extend(response.messages)
+        print("\n")
+        
+    except Exception as e:
+        print(f"{RED}\nError: {str(e)}{RESET}\n{YELLOW}Please try again.\n{RESET}")
+
 try:
     # Initialize the client
-    client = Swarm()
+    client = CachedSwarm(get_client())
     
     # Create assessment agent with faster model
     assessment_agent = Agent(
@@ -192,69 +309,17 @@ Use the available functions to manage tickets efficiently.""",
     # Initialize conversation history
     conversation_history = []
     
-    print(colored("Support Ticket System Initialized!", "green"))
-    print(colored("Available commands:", "yellow"))
-    print(colored("- Create ticket (e.g., 'I need help with login issues')", "yellow"))
-    print(colored("- Check status (e.g., 'What's the status of TICK0001?')", "yellow"))
-    print(colored("- Update status (e.g., 'Mark TICK0001 as resolved')", "yellow"))
-    print(colored("Type 'exit' to end the conversation\n", "yellow"))
+    # One write for the whole banner
+    print(
+        f"{GREEN}Support Ticket System Initialized!{RESET}\n"
+        f"{YELLOW}Available commands:{RESET}\n"
+        f"{YELLOW}- Create ticket (e.g., 'I need help with login issues'){RESET}\n"
+        f"{YELLOW}- Check status (e.g., 'What's the status of TICK0001?'){RESET}\n"
+        f"{YELLOW}- Update status (e.g., 'Mark TICK0001 as resolved'){RESET}\n"
+        f"{YELLOW}Type 'exit' to end the conversation\n{RESET}"
+    )
+    
+    asyncio.run(chat_loop(answer, f"{GREEN}\nThank you for using our Support System! Goodbye!{RESET}"))
     
-    while True:
-        # Get user input
-        user_input = input(colored("You: ", "cyan"))
-        
-        if user_input.lower() == 'exit':
-            print(colored("\nThank you for using our Support System! Goodbye!", "green"))
-            break
-            
-        # Add user message to history
-        conversation_history.append({"role": "user", "content": user_input})
-        
-        try:
-            # Initialize context for new tickets
-            context = {}
-            
-            # If it looks like a new ticket request, do priority assessment and routing
-            if "help" in user_input.lower() or "issue" in user_input.lower():
-                try:
-                    # Get priority assessment
-                    priority_response = client.run(
-                        agent=assessment_agent,
-                        messages=[{"role": "user", "content": user_input}]
-                    )
-                    priority = priority_response.messages[-1]["content"].split(": ")[1]
-                    context["assessed_priority"] = priority
-                    print(colored(f"Priority Assessment: {priority}", "yellow"))
-                    
-                    # Get department routing
-                    routing_response = client.run(
-                        agent=routing_agent,
-                        messages=[{"role": "user", "content": user_input}]
-                    )
-                    department = routing_response.messages[-1]["content"].split(": ")[1]
-                    context["assigned_department"] = department
-                    print(colored(f"Department Assignment: {department}", "yellow"))
-                    
-                except Exception as e:
-                    print(colored(f"Warning: Assessment error: {str(e)}", "yellow"))
-                    print(colored("Proceeding with default values...\n", "yellow"))
-            
-            # Get response from support agent
-            response = client.run(
-                agent=support_agent,
-                messages=conversation_history,
-                context_variables=context
-            )
-            
-            # Update conversation history
-            conversation_history.extend(response.messages)
-            
-            # Print agent's response
-            print(colored(f"\n{AGENT_NAME}: {response.messages[-1]['content']}\n", "green"))
-            
-        except Exception as e:
-            print(colored(f"\nError: {str(e)}", "red"))
-            print(colored("Please try again.\n", "yellow"))
-            
 except Exception as e:
-    print(colored(f"Initialization Error: {str(e)}", "red")) 
\ No newline at end of file
+    print(f"{RED}Initialization Error: {str(e)}{RESET}") 
\ No newline at end of file
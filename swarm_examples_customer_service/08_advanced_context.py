@@ -5,15 +5,15 @@
 # Includes personalized product suggestions and cart management
 """
 
-from swarm import Swarm, Agent
-from swarm.types import Result
-from termcolor import colored
-import os
-from openai import AsyncOpenAI
+from swarm import Agent
+from _shared import CachedSwarm, ChatSession, answer_turns, chat_loop, get_client, pretty_json, timestamp, tool_log
+from _shared import GREEN, YELLOW, RED, RESET
 import asyncio
-from typing import Dict, List
-from datetime import datetime
-import json
+from typing import Dict, Tuple
+from functools import lru_cache
+import bisect
+import numpy as np
+from itertools import chain
 
 # Constants
 MODEL_NAME = "gpt-4o"
@@ -33,28 +33,95 @@ PRODUCTS = {
     }
 }
 
-def get_instructions(context_variables: Dict) -> str:
-    """Dynamic instructions based on user preferences and history"""
-    print(colored("\n📋 Generating personalized shopping instructions", "magenta"))
-    preferences = context_variables.get("preferences", {})
-    cart = context_variables.get("shopping_cart", [])
-    history = context_variables.get("purchase_history", [])
-    
-    instructions = f"""You are a Personalized Shopping Assistant.
+# Every product by ID, across all categories
+PRODUCT_INDEX = {
+    pid: product
+    for products in PRODUCTS.values()
+    for pid, product in products.items()
+}
+
+# Recommendation lines per category, rendered once and sorted by price
+PRODUCTS_SORTED = {
+    category: sorted(
+        (product["price"], f"- {product['name']}: ${product['price']} ({pid})")
+        for pid, product in products.items()
+    )
+    for category, products in PRODUCTS.items()
+}
+PRODUCT_PRICES = {
+    category: [price for price, _ in lines]
+    for category, lines in PRODUCTS_SORTED.items()
+}
+PRODUCT_LINES = {
+    category: [line for _, line in lines]
+    for category, lines in PRODUCTS_SORTED.items()
+}
+
+# Highest price recommended for each budget range
+MAX_PRICE = {"low": 100.0, "medium": 500.0, "high": float('inf'), "any": float('inf')}
+
+# Fixed text of the instructions, filled in from the customer's context
+INSTRUCTIONS_TEMPLATE = """You are a Personalized Shopping Assistant.
 
 Customer Preferences:
-- Favorite Categories: {', '.join(preferences.get('favorite_categories', ['Not set']))}
-- Size Preferences: {preferences.get('sizes', 'Not set')}
-- Style Preferences: {preferences.get('style', 'Not set')}
-- Budget Range: {preferences.get('budget_range', 'Not set')}
+- Favorite Categories: {categories}
+- Size Preferences: {sizes}
+- Style Preferences: {style}
+- Budget Range: {budget_range}
 
-Current Cart: {len(cart)} items
-Purchase History: {len(history)} previous purchases
+Current Cart: {cart_size} items
+Purchase History: {history_size} previous purchases
 
 Tailor your recommendations based on the customer's preferences and history.
 Be mindful of their budget range when making suggestions."""
-    
-    return instructions
+
+@lru_cache(maxsize=256)
+def build_instructions(
+    favorite_categories: Tuple[str, ...],
+    sizes: str,
+    style: str,
+    budget_range: str,
+    cart_size: int,
+    history_size: int
+) -> str:
+    """Render the instructions once per distinct preferences and cart/history size"""
+    tool_log.info("📋 Generating personalized shopping instructions")
+    return INSTRUCTIONS_TEMPLATE.format_map({
+        "categories": ', '.join(favorite_categories),
+        "sizes": sizes,
+        "style": style,
+        "budget_range": budget_range,
+        "cart_size": cart_size,
+        "history_size": history_size
+    })
+
+def get_instructions(context_variables: Dict) -> str:
+    """Dynamic instructions based on user preferences and history"""
+    # Swarm calls this on every turn; the prompt only changes with the preferences
+    # or the number of cart items and past purchases
+    preferences = context_variables.get("preferences", {})
+    cart = context_variables.get("shopping_cart")
+    return build_instructions(
+        tuple(preferences.get('favorite_categories', ['Not set'])),
+        preferences.get('sizes', 'Not set'),
+        preferences.get('style', 'Not set'),
+        preferences.get('budget_range', 'Not set'),
+        len(cart["product_ids"]) if cart else 0,
+        len(context_variables.get("purchase_history", []))
+    )
+
+def new_cart() -> Dict:
+    """Empty shopping cart, stored column-wise so totals are one dot product"""
+    return {
+        "product_ids": [],
+        "names": [],
+        "prices": np.empty(0, dtype=np.float64),
+        "quantities": np.empty(0, dtype=np.int64)
+    }
+
+def cart_total(cart: Dict) -> float:
+    """Sum of price times quantity over the cart"""
+    return float(np.dot(cart["prices"], cart["quantities"]))
 
 def update_preferences(
     context_variables: Dict,
@@ -93,7 +160,7 @@ def update_preferences(
         if budget:
             prefs["budget_range"] = budget
             
-        return "Updated preferences:\n" + json.dumps(prefs, indent=2)
+        return "Updated preferences:\n" + pretty_json(prefs)
     except Exception as e:
         return f"Error updating preferences: {str(e)}"
 
@@ -107,28 +174,19 @@ def add_to_cart(context_variables: Dict, product_id: str, quantity: int = 1) ->
     """
     try:
         if "shopping_cart" not in context_variables:
-            context_variables["shopping_cart"] = []
+            context_variables["shopping_cart"] = new_cart()
             
         # Find product in catalog
-        product = None
-        for category in PRODUCTS.values():
-            if product_id in category:
-                product = category[product_id]
-                break
-                
+        product = PRODUCT_INDEX.get(product_id)
         if not product:
             return f"Product {product_id} not found"
             
         # Add to cart
-        cart_item = {
-            "product_id": product_id,
-            "name": product["name"],
-            "price": product["price"],
-            "quantity": quantity,
-            "total": product["price"] * quantity
-        }
-        
-        context_variables["shopping_cart"].append(cart_item)
+        cart = context_variables["shopping_cart"]
+        cart["product_ids"].append(product_id)
+        cart["names"].append(product["name"])
+        cart["prices"] = np.append(cart["prices"], product["price"])
+        cart["quantities"] = np.append(cart["quantities"], quantity)
         
         return f"Added {quantity}x {product['name']} to cart"
     except Exception as e:
@@ -141,20 +199,18 @@ def view_cart(context_variables: Dict) -> str:
         context_variables: Current context
     """
     try:
-        cart = context_variables.get("shopping_cart", [])
-        if not cart:
+        cart = context_variables.get("shopping_cart", new_cart())
+        if not cart["product_ids"]:
             return "Your cart is empty"
             
-        total = sum(item["total"] for item in cart)
+        total = cart_total(cart)
         
-        cart_view = ["Your Shopping Cart:"]
-        for item in cart:
-            cart_view.append(
-                f"- {item['quantity']}x {item['name']} (${item['price']} each)"
-            )
-        cart_view.append(f"\nTotal: ${total:.2f}")
-        
-        return "\n".join(cart_view)
+        items = zip(cart["names"], cart["prices"].tolist(), cart["quantities"].tolist())
+        return "\n".join(chain(
+            ["Your Shopping Cart:"],
+            (f"- {quantity}x {name} (${price} each)" for name, price, quantity in items),
+            [f"\nTotal: ${total:.2f}"]
+        ))
     except Exception as e:
         return f"Error viewing cart: {str(e)}"
 
@@ -175,21 +231,14 @@ def get_recommendations(context_variables: Dict) -> str:
             
         # Get budget range
         budget = prefs.get("budget_range", "any")
-        max_price = float('inf')
-        if budget == "low":
-            max_price = 100
-        elif budget == "medium":
-            max_price = 500
+        max_price = MAX_PRICE.get(budget, float('inf'))
             
-        # Find matching products
+        # Take each category's products up to the budget
         recommendations = []
         for category in categories:
-            if category in PRODUCTS:
-                for pid, product in PRODUCTS[category].items():
-                    if product["price"] <= max_price:
-                        recommendations.append(
-                            f"- {product['name']}: ${product['price']} ({pid})"
-                        )
+            if category in PRODUCT_LINES:
+                cut = bisect.bisect_right(PRODUCT_PRICES[category], max_price)
+                recommendations += PRODUCT_LINES[category][:cut]
                         
         if recommendations:
             return "Recommended for you:\n" + "\n".join(recommendations)
@@ -204,19 +253,19 @@ def checkout(context_variables: Dict) -> str:
         context_variables: Current context
     """
     try:
-        cart = context_variables.get("shopping_cart", [])
-        if not cart:
+        cart = context_variables.get("shopping_cart", new_cart())
+        if not cart["product_ids"]:
             return "Cannot checkout with empty cart"
             
         # Calculate total
-        total = sum(item["total"] for item in cart)
+        total = cart_total(cart)
         
         # Add to purchase history
         if "purchase_history" not in context_variables:
             context_variables["purchase_history"] = []
             
         purchase = {
-            "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "date": timestamp(),
             "items": cart,
             "total": total
         }
@@ -224,77 +273,54 @@ def checkout(context_variables: Dict) -> str:
         context_variables["purchase_history"].append(purchase)
         
         # Clear cart
-        context_variables["shopping_cart"] = []
+        context_variables["shopping_cart"] = new_cart()
         
         return f"Checkout completed! Total paid: ${total:.2f}"
     except Exception as e:
         return f"Error processing checkout: {str(e)}"
 
-try:
-    # Initialize the client
-    client = Swarm()
-    
-    # Create the shopping assistant agent
-    agent = Agent(
-        name=AGENT_NAME,
-        model=MODEL_NAME,
-        instructions=get_instructions,
-        functions=[
-            update_preferences,
-            add_to_cart,
-            view_cart,
-            get_recommendations,
-            checkout
-        ]
-    )
-    
-    # Initialize conversation and context
-    conversation_history = []
-    context = {
+# Create the shopping assistant agent
+agent = Agent(
+    name=AGENT_NAME,
+    model=MODEL_NAME,
+    instructions=get_instructions,
+    functions=[
+        update_preferences,
+        add_to_cart,
+        view_cart,
+        get_recommendations,
+        checkout
+    ]
+)
+
+def new_session() -> ChatSession:
+    """A fresh conversation with an empty cart and no preferences"""
+    return ChatSession(agent, {
         "preferences": {},
-        "shopping_cart": [],
+        "shopping_cart": new_cart(),
         "purchase_history": []
-    }
-    
-    print(colored("Shopping Assistant Initialized!", "green"))
-    print(colored("Available commands:", "yellow"))
-    print(colored("- Update preferences (e.g., 'I prefer casual style and medium budget')", "yellow"))
-    print(colored("- View products (e.g., 'Show me recommendations')", "yellow"))
-    print(colored("- Manage cart (e.g., 'Add laptop to cart', 'Show my cart')", "yellow"))
-    print(colored("- Checkout (e.g., 'I want to checkout')", "yellow"))
-    print(colored("Type 'exit' to end the conversation\n", "yellow"))
-    
-    while True:
-        # Get user input
-        user_input = input(colored("You: ", "cyan"))
+    })
+
+if __name__ == "__main__":
+    try:
+        # Initialize the client
+        client = CachedSwarm(get_client())
         
-        if user_input.lower() == 'exit':
-            print(colored("\nThank you for shopping with us! Goodbye!", "green"))
-            break
-            
-        # Add user message to history
-        conversation_history.append({"role": "user", "content": user_input})
+        # Initialize conversation and context
+        session = new_session()
         
-        try:
-            # Get response from agent with context
-            response = client.run(
-                agent=agent,
-                messages=conversation_history,
-                context_variables=context
-            )
-            
-            # Update context with any changes
-            context.update(response.context_variables)
-            
-            # Update conversation history
-            conversation_history.extend(response.messages)
-            
-            # Print agent's response
-            print(colored(f"\n{AGENT_NAME}: {response.messages[-1]['content']}\n", "green"))
-            
-        except Exception as e:
-            print(colored(f"\nError: {str(e)}", "red"))
-            print(colored("Please try again.\n", "yellow"))
-            
-except Exception as e:
-    print(colored(f"Initialization Error: {str(e)}", "red")) 
\ No newline at end of file
+        # One write for the whole banner
+        print(
+            f"{GREEN}Shopping Assistant Initialized!{RESET}\n"
+            f"{YELLOW}Available commands:{RESET}\n"
+            f"{YELLOW}- Update preferences (e.g., 'I prefer casual style and medium budget'){RESET}\n"
+            f"{YELLOW}- View products (e.g., 'Show me recommendations'){RESET}\n"
+            f"{YELLOW}- Manage cart (e.g., 'Add laptop to cart', 'Show my cart'){RESET}\n"
+            f"{YELLOW}- Checkout (e.g., 'I want to checkout'){RESET}\n"
+            f"{YELLOW}Type 'exit' to end the conversation\n{RESET}"
+        )
+        
+        asyncio.run(chat_loop(answer_turns(client, session, stream=True), f"{GREEN}\nThank you for shopping with us! Goodbye!{RESET}"))
+        
+    except Exception as e:
+        print(f"{RED}Initialization Error: {str(e)}{RESET}")
\ No newline at end of file
@@ -5,16 +5,16 @@
 # Includes order processing, kitchen coordination, and delivery tracking
 """
 
-from swarm import Swarm, Agent
+from swarm import Agent
+from _shared import CachedSwarm, ChatSession, RecordStore, answer_turns, chat_loop, get_client, timestamp
+from _shared import GREEN, YELLOW, RED, RESET
 from swarm.types import Result
-from termcolor import colored
-import os
-from openai import AsyncOpenAI
 import asyncio
 from typing import Dict, List
-from datetime import datetime
-import json
+from dataclasses import dataclass
+from itertools import count
 import random
+import numpy as np
 
 # Constants
 DEFAULT_MODEL = "gpt-4o"
@@ -39,24 +39,84 @@ MENU = {
     }
 }
 
-# Mock order database
-ORDERS = {}
-ORDER_COUNTER = 0
+# Every menu item by ID, across all categories
+MENU_ITEMS = {
+    item_id: item
+    for items in MENU.values()
+    for item_id, item in items.items()
+}
+
+# Menu prices and prep times as arrays, indexed by each item's position in MENU_ITEMS
+MENU_POSITIONS = {item_id: position for position, item_id in enumerate(MENU_ITEMS)}
+MENU_PRICES = np.array([item["price"] for item in MENU_ITEMS.values()], dtype=np.float64)
+MENU_PREP_TIMES = np.array([item["prep_time"] for item in MENU_ITEMS.values()], dtype=np.int64)
+
+def order_totals(positions: np.ndarray, prices: np.ndarray, prep_times: np.ndarray):
+    """Total price and prep time of the menu items at these positions"""
+    return prices[positions].sum(), prep_times[positions].sum()
+
+@dataclass(slots=True)
+class OrderItem:
+    """One menu item on an order"""
+    item_id: str
+    name: str
+    price: float
+
+@dataclass(slots=True)
+class Order:
+    """A restaurant order in the mock database"""
+    order_id: str
+    customer_name: str
+    items: List[OrderItem]
+    special_instructions: str
+    total: float
+    status: str
+    estimated_prep_time: int
+    created_at: str
+    driver: str = ""
+
+# Mock order database; statuses are kept as objects so no value is ever cut short
+ORDERS = RecordStore("ORD", Order, "order_id", columns={"status": "object", "total": "f8"})
+
+# Simulated progress percentages (0-100), drawn up front and read round-robin
+PROGRESS_DRAWS = np.random.default_rng().integers(0, 101, size=8192).tolist()
+PROGRESS_MASK = len(PROGRESS_DRAWS) - 1
+_progress_reads = count()
+
+DRIVERS = ("John", "Sarah", "Mike", "Lisa")
+
+def random_progress() -> int:
+    """Next simulated progress percentage"""
+    return PROGRESS_DRAWS[next(_progress_reads) & PROGRESS_MASK]
+
+def build_menu_text() -> str:
+    """Format the whole menu as text"""
+    menu_text = ["Restaurant Menu:"]
+    for category, items in MENU.items():
+        menu_text.append(f"\n{category.upper()}:")
+        for item_id, item in items.items():
+            menu_text.append(
+                f"- {item['name']}: ${item['price']} ({item_id})"
+            )
+    return "\n".join(menu_text)
+
+# The menu never changes, so its text is built once
+MENU_TEXT = build_menu_text()
+
+# Startup help, colored once
+BANNER = (
+    f"{GREEN}Restaurant Ordering System Initialized!{RESET}\n"
+    f"{YELLOW}Available commands:{RESET}\n"
+    f"{YELLOW}- View menu (e.g., 'Show me the menu'){RESET}\n"
+    f"{YELLOW}- Place order (e.g., 'I want to order pasta and salad'){RESET}\n"
+    f"{YELLOW}- Check status (e.g., 'What's the status of my order?'){RESET}\n"
+    f"{YELLOW}Type 'exit' to end the conversation\n{RESET}"
+)
 
 # Order Taker Functions
 def view_menu() -> str:
     """View the restaurant menu"""
-    try:
-        menu_text = ["Restaurant Menu:"]
-        for category, items in MENU.items():
-            menu_text.append(f"\n{category.upper()}:")
-            for item_id, item in items.items():
-                menu_text.append(
-                    f"- {item['name']}: ${item['price']} ({item_id})"
-                )
-        return "\n".join(menu_text)
-    except Exception as e:
-        return f"Error viewing menu: {str(e)}"
+    return MENU_TEXT
 
 def create_order(
     context_variables: Dict,
@@ -73,44 +133,32 @@ def create_order(
         special_instructions: Special preparation instructions
     """
     try:
-        global ORDER_COUNTER
-        ORDER_COUNTER += 1
-        order_id = f"ORD{ORDER_COUNTER:04d}"
-        
         # Validate and collect items
         order_items = []
-        total_prep_time = 0
+        positions = []
         for item_id in items:
-            item = None
-            for category in MENU.values():
-                if item_id in category:
-                    item = category[item_id]
-                    break
-            
-            if not item:
+            item = MENU_ITEMS.get(item_id)
+            if item is None:
                 return f"Item {item_id} not found in menu"
                 
-            order_items.append({
-                "item_id": item_id,
-                "name": item["name"],
-                "price": item["price"]
-            })
-            total_prep_time += item["prep_time"]
-            
-        # Calculate total
-        total = sum(item["price"] for item in order_items)
+            order_items.append(OrderItem(item_id, item["name"], item["price"]))
+            positions.append(MENU_POSITIONS[item_id])
+        
+        total, total_prep_time = order_totals(
+            np.array(positions, dtype=np.intp), MENU_PRICES, MENU_PREP_TIMES
+        )
+        total, total_prep_time = float(total), int(total_prep_time)
         
         # Create order
-        ORDERS[order_id] = {
-            "order_id": order_id,
-            "customer_name": customer_name,
-            "items": order_items,
-            "special_instructions": special_instructions,
-            "total": total,
-            "status": "new",
-            "estimated_prep_time": total_prep_time,
-            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
+        order_id = ORDERS.create(
+            customer_name=customer_name,
+            items=order_items,
+            special_instructions=special_instructions,
+            total=total,
+            status="new",
+            estimated_prep_time=total_prep_time,
+            created_at=timestamp()
+        )
         
         # Store order ID in context for other agents
         context_variables["current_order_id"] = order_id
@@ -126,17 +174,17 @@ def check_order_status(order_id: str) -> str:
         order_id: Order ID to check
     """
     try:
-        if order_id not in ORDERS:
+        order = ORDERS.get(order_id)
+        if order is None:
             return f"Order {order_id} not found"
             
-        order = ORDERS[order_id]
         return (
             f"Order {order_id} Status:\n"
-            f"Customer: {order['customer_name']}\n"
-            f"Status: {order['status']}\n"
-            f"Created: {order['created_at']}\n"
-            f"Items: {', '.join(item['name'] for item in order['items'])}\n"
-            f"Total: ${order['total']:.2f}"
+            f"Customer: {order.customer_name}\n"
+            f"Status: {order.status}\n"
+            f"Created: {order.created_at}\n"
+            f"Items: {', '.join(item.name for item in order.items)}\n"
+            f"Total: ${order.total:.2f}"
         )
     except Exception as e:
         return f"Error checking order status: {str(e)}"
@@ -150,15 +198,15 @@ def start_preparation(context_variables: Dict) -> str:
     """
     try:
         order_id = context_variables.get("current_order_id")
-        if not order_id or order_id not in ORDERS:
+        order = ORDERS.get(order_id)
+        if order is None:
             return "No valid order to prepare"
             
-        order = ORDERS[order_id]
-        if order["status"] != "new":
-            return f"Order {order_id} is already {order['status']}"
+        if order.status != "new":
+            return f"Order {order_id} is already {order.status}"
             
-        order["status"] = "preparing"
-        return f"Started preparing order {order_id}. Estimated time: {order['estimated_prep_time']} minutes"
+        ORDERS.update(order_id, status="preparing")
+        return f"Started preparing order {order_id}. Estimated time: {order.estimated_prep_time} minutes"
     except Exception as e:
         return f"Error starting preparation: {str(e)}"
 
@@ -171,23 +219,40 @@ def update_preparation_status(context_variables: Dict, status_update: str) -> st
     """
     try:
         order_id = context_variables.get("current_order_id")
-        if not order_id or order_id not in ORDERS:
+        order = ORDERS.get(order_id)
+        if order is None:
             return "No valid order to update"
             
-        order = ORDERS[order_id]
-        if order["status"] not in ["preparing", "ready"]:
+        if order.status not in ["preparing", "ready"]:
             return f"Order {order_id} is not being prepared"
             
         # Simulate progress
-        progress = random.randint(0, 100)
+        progress = random_progress()
         if progress >= 100:
-            order["status"] = "ready"
+            ORDERS.update(order_id, status="ready")
             return f"Order {order_id} is ready for delivery!"
         
         return f"Order {order_id} preparation progress: {progress}% - {status_update}"
     except Exception as e:
         return f"Error updating status: {str(e)}"
 
+def get_order_summary() -> str:
+    """Summarize all orders by status, with the order count and revenue for each"""
+    try:
+        statuses = ORDERS.column("status")
+        if not len(statuses):
+            return "No orders yet"
+            
+        totals = ORDERS.column("total")
+        summary = ["Order Summary:"]
+        for status, orders in zip(*np.unique(statuses, return_counts=True)):
+            revenue = totals[statuses == status].sum()
+            summary.append(f"- {status}: {orders} orders, ${revenue:.2f}")
+        summary.append(f"Total revenue: ${totals.sum():.2f}")
+        return "\n".join(summary)
+    except Exception as e:
+        return f"Error summarizing orders: {str(e)}"
+
 # Delivery Functions
 def assign_delivery(context_variables: Dict) -> str:
     """Assign order for delivery
@@ -197,18 +262,16 @@ def assign_delivery(context_variables: Dict) -> str:
     """
     try:
         order_id = context_variables.get("current_order_id")
-        if not order_id or order_id not in ORDERS:
+        order = ORDERS.get(order_id)
+        if order is None:
             return "No valid order to deliver"
             
-        order = ORDERS[order_id]
-        if order["status"] != "ready":
+        if order.status != "ready":
             return f"Order {order_id} is not ready for delivery"
             
         # Simulate delivery assignment
-        drivers = ["John", "Sarah", "Mike", "Lisa"]
-        assigned_driver = random.choice(drivers)
-        order["status"] = "out_for_delivery"
-        order["driver"] = assigned_driver
+        assigned_driver = random.choice(DRIVERS)
+        ORDERS.update(order_id, status="out_for_delivery", driver=assigned_driver)
         
         return f"Order {order_id} assigned to driver {assigned_driver}"
     except Exception as e:
@@ -222,23 +285,23 @@ def track_delivery(context_variables: Dict) -> str:
     """
     try:
         order_id = context_variables.get("current_order_id")
-        if not order_id or order_id not in ORDERS:
+        order = ORDERS.get(order_id)
+        if order is None:
             return "No valid order to track"
             
-        order = ORDERS[order_id]
-        if order["status"] not in ["out_for_delivery", "delivered"]:
+        if order.status not in ["out_for_delivery", "delivered"]:
             return f"Order {order_id} is not out for delivery"
             
         # Simulate delivery progress
-        progress = random.randint(0, 100)
+        progress = random_progress()
         if progress >= 100:
-            order["status"] = "delivered"
+            ORDERS.update(order_id, status="delivered")
             return f"Order {order_id} has been delivered!"
             
         locations = ["Leaving restaurant", "On main street", "Near destination", "Arriving soon"]
         current_location = locations[progress // 25]
         
-        return f"Order {order_id} - Driver {order['driver']} is {current_location}"
+        return f"Order {order_id} - Driver {order.driver} is {current_location}"
     except Exception as e:
         return f"Error tracking delivery: {str(e)}"
 
@@ -258,7 +321,7 @@ kitchen_manager = Agent(
     instructions="""You are the Kitchen Manager coordinating food preparation.
 Monitor order preparation and update status regularly.
 Ensure proper timing and coordination of all dishes.""",
-    functions=[start_preparation, update_preparation_status]
+    functions=[start_preparation, update_preparation_status, get_order_summary]
 )
 
 delivery_coordinator = Agent(
@@ -296,60 +359,24 @@ order_taker.functions.append(transfer_to_kitchen)
 kitchen_manager.functions.extend([transfer_to_delivery, transfer_to_order_taker])
 delivery_coordinator.functions.append(transfer_to_order_taker)
 
-try:
-    # Initialize the client
-    client = Swarm()
-    
-    # Initialize conversation and context
-    conversation_history = []
-    context = {}
-    
-    # Start with order taker
-    current_agent = order_taker
-    
-    print(colored("Restaurant Ordering System Initialized!", "green"))
-    print(colored("Available commands:", "yellow"))
-    print(colored("- View menu (e.g., 'Show me the menu')", "yellow"))
-    print(colored("- Place order (e.g., 'I want to order pasta and salad')", "yellow"))
-    print(colored("- Check status (e.g., 'What's the status of my order?')", "yellow"))
-    print(colored("Type 'exit' to end the conversation\n", "yellow"))
-    
-    while True:
-        # Get user input
-        user_input = input(colored("You: ", "cyan"))
+def new_session() -> ChatSession:
+    """A fresh conversation, starting with the order taker"""
+    return ChatSession(order_taker)
+
+if __name__ == "__main__":
+    try:
+        # Initialize the client; menu lookups never change, so replies that only used them can be reused
+        client = CachedSwarm(get_client(), cacheable_tools=["view_menu"])
         
-        if user_input.lower() == 'exit':
-            print(colored("\nThank you for dining with us! Goodbye!", "green"))
-            break
-            
-        # Add user message to history
-        conversation_history.append({"role": "user", "content": user_input})
+        # Initialize conversation and context
+        session = new_session()
         
-        try:
-            # Get response from current agent
-            response = client.run(
-                agent=current_agent,
-                messages=conversation_history,
-                context_variables=context
-            )
-            
-            # Update context with any changes
-            context.update(response.context_variables)
-            
-            # Handle agent transfer if it occurred
-            if response.agent:
-                current_agent = response.agent
-                print(colored(f"\nTransferred to {current_agent.name}!", "yellow"))
-            
-            # Update conversation history
-            conversation_history.extend(response.messages)
-            
-            # Print agent's response
-            print(colored(f"\n{response.messages[-1]['sender']}: {response.messages[-1]['content']}\n", "green"))
-            
-        except Exception as e:
-            print(colored(f"\nError: {str(e)}", "red"))
-            print(colored("Please try again.\n", "yellow"))
-            
-except Exception as e:
-    print(colored(f"Initialization Error: {str(e)}", "red")) 
\ No newline at end of file
+        print(BANNER)
+        
+        asyncio.run(chat_loop(
+            answer_turns(client, session, stream=True),
+            f"{GREEN}\nThank you for dining with us! Goodbye!{RESET}"
+        ))
+        
+    except Exception as e:
+        print(f"{RED}Initialization Error: {str(e)}{RESET}")
\ No newline at end of file
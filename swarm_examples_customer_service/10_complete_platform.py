@@ -5,16 +5,16 @@
 # Includes knowledge base, ticket system, and live chat
 """
 
-from swarm import Swarm, Agent
+from swarm import Agent
+from _shared import CachedSwarm, ChatSession, RecordStore, answer_turns, chat_loop, get_client, timestamp, tool_log
+from _shared import GREEN, YELLOW, RED, RESET
 from swarm.types import Result
-from termcolor import colored
-import os
-from openai import AsyncOpenAI
 import asyncio
-from typing import Dict, List
-from datetime import datetime
-import json
-import random
+from typing import Dict, FrozenSet, List, Tuple
+from collections import defaultdict
+from dataclasses import dataclass, field
+from functools import lru_cache
+import re
 
 # Constants
 DEFAULT_MODEL = "gpt-4o"
@@ -76,9 +76,83 @@ Rate Limit: 100 requests/minute""",
     }
 }
 
+# Every article's location and search result line, in knowledge base order
+ARTICLES = [
+    (category, article_id, f"[{category.upper()}] {article['title']}")
+    for category, articles in KNOWLEDGE_BASE.items()
+    for article_id, article in articles.items()
+]
+
+# Lowercased word -> positions in ARTICLES of the articles containing it
+KB_INDEX = defaultdict(set)
+for position, (category, article_id, _) in enumerate(ARTICLES):
+    article = KNOWLEDGE_BASE[category][article_id]
+    text = f"{article['title']} {article['content']} {' '.join(article['tags'])}".lower()
+    for word in re.findall(r"\w+", text):
+        KB_INDEX[word].add(position)
+
+@lru_cache(maxsize=1024)
+def term_positions(term: str) -> FrozenSet[int]:
+    """Positions of the articles with a word containing term, worked out once per term"""
+    # Match inside longer words too, like the plain substring search did
+    return frozenset().union(*(positions for word, positions in KB_INDEX.items() if term in word))
+
+@lru_cache(maxsize=512)
+def find_articles(query: str) -> Tuple[str, ...]:
+    """Result lines for a lowercased query, in knowledge base order"""
+    hits = frozenset().union(*map(term_positions, set(re.findall(r"\w+", query))))
+    return tuple(ARTICLES[position][2] for position in sorted(hits))
+
+# Startup help, colored once
+BANNER = (
+    f"{GREEN}Customer Support Platform Initialized!{RESET}\n"
+    f"{YELLOW}Available services:{RESET}\n"
+    f"{YELLOW}1. Knowledge Base{RESET}\n"
+    f"{YELLOW}   - Search articles (e.g., 'Search for password reset'){RESET}\n"
+    f"{YELLOW}   - View article (e.g., 'Show me the refund policy'){RESET}\n"
+    f"{YELLOW}2. Ticket Support{RESET}\n"
+    f"{YELLOW}   - Create ticket (e.g., 'I need help with billing'){RESET}\n"
+    f"{YELLOW}   - Check status (e.g., 'What's the status of TICK0001?'){RESET}\n"
+    f"{YELLOW}3. Live Chat{RESET}\n"
+    f"{YELLOW}   - Start chat (e.g., 'I want to chat with support'){RESET}\n"
+    f"{YELLOW}Type 'exit' to end the session\n{RESET}"
+)
+
 # Mock ticket database
-TICKETS = {}
-TICKET_COUNTER = 0
+@dataclass(slots=True)
+class TicketUpdate:
+    """A timestamped note added to a ticket"""
+    timestamp: str
+    message: str
+
+@dataclass(slots=True)
+class Ticket:
+    """A support ticket in the mock database"""
+    ticket_id: str
+    customer_email: str
+    subject: str
+    description: str
+    priority: str
+    status: str
+    created_at: str
+    updates: List[TicketUpdate] = field(default_factory=list)
+
+@dataclass(slots=True)
+class ChatMessage:
+    """One message in a live chat"""
+    timestamp: str
+    sender: str
+    message: str
+
+@dataclass(slots=True)
+class LiveChat:
+    """A live chat session, kept in the context while it is open"""
+    customer_name: str
+    start_time: str
+    messages: List[ChatMessage] = field(default_factory=list)
+
+# Object columns hold any status or priority string whole, however long
+TICKETS = RecordStore("TICK", Ticket, "ticket_id", columns={"status": "object", "priority": "object"})
 
 # Knowledge Base Functions
 def search_knowledge_base(query: str) -> str:
@@ -87,17 +161,9 @@ def search_knowledge_base(query: str) -> str:
     Args:
         query: Search query
     """
-    print(colored(f"\n🔍 Searching knowledge base for: {query}", "magenta"))
+    tool_log.info("🔍 Searching knowledge base for: %s", query)
     try:
-        results = []
-        for category, articles in KNOWLEDGE_BASE.items():
-            for article_id, article in articles.items():
-                if any(term.lower() in article['content'].lower() or 
-                      term.lower() in article['title'].lower() or
-                      term.lower() in ' '.join(article['tags']).lower() 
-                      for term in query.split()):
-                    results.append(f"[{category.upper()}] {article['title']}")
-        
+        results = find_articles(query.lower())
         if results:
             return "Found relevant articles:\n" + "\n".join(results)
         return "No relevant articles found."
@@ -111,7 +177,7 @@ def get_article(category: str, article_id: str) -> str:
         category: Article category
         article_id: Article ID
     """
-    print(colored(f"\n📖 Retrieving article: {category}/{article_id}", "magenta"))
+    tool_log.info("📖 Retrieving article: %s/%s", category, article_id)
     try:
         if category in KNOWLEDGE_BASE and article_id in KNOWLEDGE_BASE[category]:
             article = KNOWLEDGE_BASE[category][article_id]
@@ -143,20 +209,14 @@ def create_ticket(
         priority: Ticket priority
     """
     try:
-        global TICKET_COUNTER
-        TICKET_COUNTER += 1
-        ticket_id = f"TICK{TICKET_COUNTER:04d}"
-        
-        TICKETS[ticket_id] = {
-            "ticket_id": ticket_id,
-            "customer_email": customer_email,
-            "subject": subject,
-            "description": description,
-            "priority": priority,
-            "status": "open",
-            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "updates": []
-        }
+        ticket_id = TICKETS.create(
+            customer_email=customer_email,
+            subject=subject,
+            description=description,
+            priority=priority,
+            status="open",
+            created_at=timestamp()
+        )
         
         context_variables["current_ticket_id"] = ticket_id
         
@@ -177,23 +237,19 @@ def update_ticket(
         new_status: Optional new status
     """
     try:
-        if ticket_id not in TICKETS:
+        ticket = TICKETS.get(ticket_id)
+        if ticket is None:
             return f"Ticket {ticket_id} not found"
-            
-        ticket = TICKETS[ticket_id]
         
         # Add update
-        ticket["updates"].append({
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "message": update_text
-        })
+        ticket.updates.append(TicketUpdate(timestamp(), update_text))
         
         # Update status if provided
         if new_status:
             valid_statuses = ["open", "in_progress", "pending", "resolved", "closed"]
             if new_status not in valid_statuses:
                 return f"Invalid status. Must be one of: {', '.join(valid_statuses)}"
-            ticket["status"] = new_status
+            TICKETS.update(ticket_id, status=new_status)
             
         return f"Updated ticket {ticket_id}"
     except Exception as e:
@@ -206,31 +262,53 @@ def get_ticket_details(ticket_id: str) -> str:
         ticket_id: Ticket to view
     """
     try:
-        if ticket_id not in TICKETS:
+        ticket = TICKETS.get(ticket_id)
+        if ticket is None:
             return f"Ticket {ticket_id} not found"
-            
-        ticket = TICKETS[ticket_id]
         
         details = [
             f"Ticket {ticket_id}:",
-            f"Subject: {ticket['subject']}",
-            f"Status: {ticket['status']}",
-            f"Priority: {ticket['priority']}",
-            f"Created: {ticket['created_at']}",
+            f"Subject: {ticket.subject}",
+            f"Status: {ticket.status}",
+            f"Priority: {ticket.priority}",
+            f"Created: {ticket.created_at}",
             f"\nDescription:",
-            ticket['description'],
+            ticket.description,
             "\nUpdates:"
         ]
         
-        for update in ticket["updates"]:
+        for update in ticket.updates:
             details.append(
-                f"[{update['timestamp']}] {update['message']}"
+                f"[{update.timestamp}] {update.message}"
             )
             
         return "\n".join(details)
     except Exception as e:
         return f"Error getting ticket details: {str(e)}"
 
+def list_tickets(status: str = "open", priority: str = "") -> str:
+    """List tickets with a given status
+    
+    Args:
+        status: Status to list
+        priority: Optional priority to narrow the list to
+    """
+    try:
+        mask = TICKETS.column("status") == status
+        if priority:
+            mask &= TICKETS.column("priority") == priority
+        ticket_ids = TICKETS.ids_where(mask)
+        if not ticket_ids:
+            return f"No {status} tickets"
+            
+        lines = [f"{len(ticket_ids)} {status} tickets:"]
+        for ticket_id in ticket_ids:
+            ticket = TICKETS.get(ticket_id)
+            lines.append(f"- {ticket_id} [{ticket.priority}] {ticket.subject}")
+        return "\n".join(lines)
+    except Exception as e:
+        return f"Error listing tickets: {str(e)}"
+
 # Live Chat Functions
 def start_chat_session(
     context_variables: Dict,
@@ -245,18 +323,12 @@ def start_chat_session(
         initial_message: Initial chat message
     """
     try:
-        context_variables["chat_session"] = {
-            "customer_name": customer_name,
-            "start_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "messages": []
-        }
+        context_variables["chat_session"] = LiveChat(customer_name, timestamp())
         
         # Add initial message
-        context_variables["chat_session"]["messages"].append({
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "sender": customer_name,
-            "message": initial_message
-        })
+        context_variables["chat_session"].messages.append(
+            ChatMessage(timestamp(), customer_name, initial_message)
+        )
         
         return f"Started chat session with {customer_name}"
     except Exception as e:
@@ -279,13 +351,9 @@ def add_chat_message(
             return "No active chat session"
             
         session = context_variables["chat_session"]
-        sender = session["customer_name"] if is_customer else "Support Agent"
+        sender = session.customer_name if is_customer else "Support Agent"
         
-        session["messages"].append({
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "sender": sender,
-            "message": message
-        })
+        session.messages.append(ChatMessage(timestamp(), sender, message))
         
         return f"Added message from {sender}"
     except Exception as e:
@@ -302,7 +370,7 @@ def end_chat_session(context_variables: Dict) -> str:
             return "No active chat session"
             
         session = context_variables.pop("chat_session")
-        return f"Ended chat session with {session['customer_name']}"
+        return f"Ended chat session with {session.customer_name}"
     except Exception as e:
         return f"Error ending chat session: {str(e)}"
 
@@ -322,7 +390,7 @@ ticket_agent = Agent(
     instructions="""You are a Ticket Support Specialist.
 Handle ticket creation, updates, and status changes.
 Ensure proper documentation of all customer interactions.""",
-    functions=[create_ticket, update_ticket, get_ticket_details]
+    functions=[create_ticket, update_ticket, get_ticket_details, list_tickets]
 )
 
 chat_agent = Agent(
@@ -361,65 +429,24 @@ knowledge_agent.functions.extend([transfer_to_ticket_support, transfer_to_live_c
 ticket_agent.functions.extend([transfer_to_knowledge_base, transfer_to_live_chat])
 chat_agent.functions.extend([transfer_to_knowledge_base, transfer_to_ticket_support])
 
-try:
-    # Initialize the client
-    client = Swarm()
-    
-    # Initialize conversation and context
-    conversation_history = []
-    context = {}
-    
-    # Start with knowledge base agent
-    current_agent = knowledge_agent
-    
-    print(colored("Customer Support Platform Initialized!", "green"))
-    print(colored("Available services:", "yellow"))
-    print(colored("1. Knowledge Base", "yellow"))
-    print(colored("   - Search articles (e.g., 'Search for password reset')", "yellow"))
-    print(colored("   - View article (e.g., 'Show me the refund policy')", "yellow"))
-    print(colored("2. Ticket Support", "yellow"))
-    print(colored("   - Create ticket (e.g., 'I need help with billing')", "yellow"))
-    print(colored("   - Check status (e.g., 'What's the status of TICK0001?')", "yellow"))
-    print(colored("3. Live Chat", "yellow"))
-    print(colored("   - Start chat (e.g., 'I want to chat with support')", "yellow"))
-    print(colored("Type 'exit' to end the session\n", "yellow"))
-    
-    while True:
-        # Get user input
-        user_input = input(colored("You: ", "cyan"))
+def new_session() -> ChatSession:
+    """A fresh conversation, starting with the knowledge base agent"""
+    return ChatSession(knowledge_agent)
+
+if __name__ == "__main__":
+    try:
+        # Initialize the client; the knowledge base is static, so replies that only searched it can be reused
+        client = CachedSwarm(get_client(), cacheable_tools=["search_knowledge_base", "get_article"])
         
-        if user_input.lower() == 'exit':
-            print(colored("\nThank you for using our support platform! Goodbye!", "green"))
-            break
-            
-        # Add user message to history
-        conversation_history.append({"role": "user", "content": user_input})
+        # Initialize conversation and context
+        session = new_session()
         
-        try:
-            # Get response from current agent
-            response = client.run(
-                agent=current_agent,
-                messages=conversation_history,
-                context_variables=context
-            )
-            
-            # Update context with any changes
-            context.update(response.context_variables)
-            
-            # Handle agent transfer if it occurred
-            if response.agent:
-                current_agent = response.agent
-                print(colored(f"\nTransferred to {current_agent.name}!", "yellow"))
-            
-            # Update conversation history
-            conversation_history.extend(response.messages)
-            
-            # Print agent's response
-            print(colored(f"\n{response.messages[-1]['sender']}: {response.messages[-1]['content']}\n", "green"))
-            
-        except Exception as e:
-            print(colored(f"\nError: {str(e)}", "red"))
-            print(colored("Please try again.\n", "yellow"))
-            
-except Exception as e:
-    print(colored(f"Initialization Error: {str(e)}", "red")) 
\ No newline at end of file
+        print(BANNER)
+        
+        asyncio.run(chat_loop(
+            answer_turns(client, session, stream=True),
+            f"{GREEN}\nThank you for using our support platform! Goodbye!{RESET}"
+        ))
+        
+    except Exception as e:
+        print(f"{RED}Initialization Error: {str(e)}{RESET}")
\ No newline at end of file
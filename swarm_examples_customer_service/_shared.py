@@ -0,0 +1,700 @@
+"""
+# Shared helpers for the customer service examples
+# Extends the Swarm Agent with an optional max_tokens cap on replies
+# Passes the cap through to every chat completion request
+# Builds each tool's JSON schema once instead of on every request
+# Lets an agent carry its finished tool list so requests skip rebuilding it
+# Provides one pooled HTTP/2 client that every example reuses
+# Keeps conversation history within a token budget
+# Precomputed ANSI color codes for terminal output
+# A single logger for tool diagnostics, muted with LOGLEVEL=WARNING
+# Uses orjson for pretty-printed output when it is installed
+# Async REPL loop that answers queued messages one at a time, in order
+# Reads input ahead in a background thread while a reply is on its way
+# Reuses earlier replies for repeated or near-identical questions
+# Streams replies to the terminal as they arrive
+# Tags requests with the agent name so the provider reuses its cached prompt prefix
+# Timestamps for tickets, orders and chats, formatted once per second
+# Runs a turn's independent tool calls side by side
+# A small in-memory store for orders and tickets with sequential IDs
+# Mirrors chosen record fields into NumPy columns for fast bulk queries
+# One conversation's agent, history and context, so many can share a client
+# Optionally keeps cached replies on disk so repeated sessions skip the model
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import count
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from pydantic import PrivateAttr
+
+import httpx
+import numpy as np
+import swarm
+import tiktoken
+from openai import OpenAI
+from swarm.core import __CTX_VARS_NAME__
+from swarm.types import Response
+from swarm.util import function_to_json, debug_print
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def pretty_json(obj) -> str:
+    """Serialize obj as JSON indented by two spaces, with orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(obj, indent=2)
+
+# Token budget for the history sent with each request
+MAX_HISTORY_TOKENS = 4000
+
+# How long an idle pooled connection is kept before it is closed, in seconds
+KEEPALIVE_EXPIRY = 60
+
+# Flush streamed text every STREAM_FLUSH_CHUNKS chunks or STREAM_FLUSH_INTERVAL seconds
+STREAM_FLUSH_CHUNKS = 16
+STREAM_FLUSH_INTERVAL = 0.05
+_STREAM_END = object()
+
+# Worker threads for running one turn's independent tool calls side by side
+_TOOL_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="swarm-tool")
+
+# Embedding model and cosine similarity used to spot a repeated question
+EMBEDDING_MODEL = "text-embedding-3-small"
+SIMILARITY_THRESHOLD = 0.95
+
+# Optional on-disk reply cache shared across runs; set SWARM_CACHE=<path> to enable
+RESPONSE_CACHE_PATH = os.environ.get("SWARM_CACHE")
+
+# ANSI color codes, left empty when output is not a terminal (same rules as termcolor)
+_USE_COLOR = "FORCE_COLOR" in os.environ or (
+    "NO_COLOR" not in os.environ and sys.stdout.isatty()
+)
+GREEN = "\033[32m" if _USE_COLOR else ""
+YELLOW = "\033[33m" if _USE_COLOR else ""
+RED = "\033[31m" if _USE_COLOR else ""
+MAGENTA = "\033[35m" if _USE_COLOR else ""
+CYAN = "\033[36m" if _USE_COLOR else ""
+RESET = "\033[0m" if _USE_COLOR else ""
+
+YOU_PROMPT = f"{CYAN}You: {RESET}"
+
+class ColoredFormatter(logging.Formatter):
+    """Print tool diagnostics in magenta on their own line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        return f"{MAGENTA}\n{super().format(record)}{RESET}"
+
+# Tool functions log here instead of printing, so LOGLEVEL=WARNING mutes them
+tool_log = logging.getLogger("swarm.tools")
+if not tool_log.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(ColoredFormatter())
+    tool_log.addHandler(_handler)
+    tool_log.setLevel(os.environ.get("LOGLEVEL", "INFO").upper())
+    tool_log.propagate = False
+
+@lru_cache(maxsize=None)
+def tool_schema(func) -> dict:
+    """Derive a tool's JSON schema once, with context_variables hidden from the model"""
+    tool = function_to_json(func)
+    params = tool["function"]["parameters"]
+    params["properties"].pop(__CTX_VARS_NAME__, None)
+    if __CTX_VARS_NAME__ in params["required"]:
+        params["required"].remove(__CTX_VARS_NAME__)
+    return tool
+
+class Agent(swarm.Agent):
+    """Swarm agent with an optional cap on reply length"""
+    max_tokens: Optional[int] = None
+    _tool_specs: Optional[List[dict]] = PrivateAttr(default=None)
+
+def freeze_tools(agent: Agent) -> Agent:
+    """Build the agent's tool schemas now and reuse them for every request
+    
+    Call it again if the agent's functions change afterwards.
+    """
+    agent._tool_specs = [tool_schema(f) for f in agent.functions]
+    return agent
+
+class Swarm(swarm.Swarm):
+    """Swarm client that honours Agent.max_tokens"""
+
+    def completion_params(
+        self,
+        agent: Agent,
+        history: List,
+        context_variables: dict,
+        model_override: str,
+        stream: bool,
+        debug: bool,
+    ) -> dict:
+        """Build the chat completion request for one step of a run"""
+        context_variables = defaultdict(str, context_variables)
+        instructions = (
+            agent.instructions(context_variables)
+            if callable(agent.instructions)
+            else agent.instructions
+        )
+        messages = [{"role": "system", "content": instructions}] + history
+        debug_print(debug, "Getting chat completion for...:", messages)
+
+        tools = getattr(agent, "_tool_specs", None)
+        if tools is None:
+            tools = [tool_schema(f) for f in agent.functions]
+
+        create_params = {
+            "model": model_override or agent.model,
+            "messages": messages,
+            "tools": tools or None,
+            "tool_choice": agent.tool_choice,
+            "stream": stream,
+        }
+
+        if tools:
+            create_params["parallel_tool_calls"] = agent.parallel_tool_calls
+
+        # Handed-off agents may be plain swarm.Agent instances without a cap
+        max_tokens = getattr(agent, "max_tokens", None)
+        if max_tokens:
+            create_params["max_tokens"] = max_tokens
+
+        # Each agent's instructions and tools form a fixed prefix; keying the
+        # requests by agent lets OpenAI route them to the same prompt cache
+        create_params["extra_body"] = {"prompt_cache_key": agent.name}
+
+        return create_params
+
+    def get_chat_completion(self, agent: Agent, history: List, context_variables: dict,
+                            model_override: str, stream: bool, debug: bool):
+        create_params = self.completion_params(
+            agent, history, context_variables, model_override, stream, debug
+        )
+        return self.client.chat.completions.create(**create_params)
+
+    def handle_tool_calls(self, tool_calls: List, functions: List, context_variables: dict, debug: bool) -> Response:
+        """Run a turn's tool calls concurrently and merge their results in call order
+        
+        Tools that take context_variables can change shared state, so those
+        still run one at a time, in order, while the rest run in the pool.
+        """
+        if len(tool_calls) < 2:
+            return super().handle_tool_calls(tool_calls, functions, context_variables, debug)
+        
+        function_map = {f.__name__: f for f in functions}
+        
+        def run_one(tool_call) -> Response:
+            return super(Swarm, self).handle_tool_calls([tool_call], functions, context_variables, debug)
+        
+        def uses_context(tool_call) -> bool:
+            func = function_map.get(tool_call.function.name)
+            return func is not None and __CTX_VARS_NAME__ in func.__code__.co_varnames
+        
+        futures = {
+            i: _TOOL_POOL.submit(run_one, tool_call)
+            for i, tool_call in enumerate(tool_calls)
+            if not uses_context(tool_call)
+        }
+        in_order = {
+            i: run_one(tool_call)
+            for i, tool_call in enumerate(tool_calls)
+            if i not in futures
+        }
+        
+        response = Response(messages=[], agent=None, context_variables={})
+        for i in range(len(tool_calls)):
+            partial = futures[i].result() if i in futures else in_order[i]
+            response.messages.extend(partial.messages)
+            response.context_variables.update(partial.context_variables)
+            # As in Swarm, the last transfer in the turn wins
+            if partial.agent:
+                response.agent = partial.agent
+        return response
+
+    async def run_async(self, **kwargs):
+        """Awaitable Swarm.run; run itself is blocking, so it goes to a worker thread"""
+        return await asyncio.to_thread(self.run, **kwargs)
+
+    def stream_async(self, **kwargs):
+        """Start a streaming run in a worker thread and iterate its chunks asynchronously"""
+        return iterate_in_thread(lambda: self.run(stream=True, **kwargs))
+
+@lru_cache(maxsize=1)
+def get_client() -> Swarm:
+    """Return the shared Swarm client, creating it on first use"""
+    # Swarm only drives a synchronous OpenAI client, so pool the sync transport
+    http_client = httpx.Client(
+        http2=True,
+        limits=httpx.Limits(max_connections=100, keepalive_expiry=KEEPALIVE_EXPIRY),
+        timeout=httpx.Timeout(60, connect=5)
+    )
+    return Swarm(client=OpenAI(http_client=http_client))
+
+class CachedSwarm:
+    """Swarm client that answers repeated questions with an earlier reply
+    
+    A turn is identified by a hash of the agent, every message and the
+    context, so a reply is only reused in the same conversation and state.
+    Failing an exact match, a reworded last question is matched by embedding
+    similarity, but only among turns whose agent, earlier messages and
+    context were the same. Questions are embedded only once there is such a
+    turn to compare with, so a scope seen for the first time costs nothing
+    extra. Only replies whose tool calls are all in
+    cacheable_tools are kept, since other tool results depend on state that
+    changes between turns; by default that means replies with no tool calls.
+    
+    With a path, replies are also stored in SQLite under the same hash, so a
+    later run can replay them.
+    """
+
+    def __init__(
+        self,
+        client: Swarm,
+        threshold: float = SIMILARITY_THRESHOLD,
+        path: Optional[str] = RESPONSE_CACHE_PATH,
+        cacheable_tools: Sequence[str] = ()
+    ):
+        self.client = client
+        self.threshold = threshold
+        self.cacheable_tools = frozenset(cacheable_tools)
+        self.exact: Dict[str, List[dict]] = {}
+        # Cached (question, reply) rows per scope, and the embeddings of as
+        # many of those questions as have been needed so far, in row order
+        self.scopes: Dict[str, List[Tuple[str, List[dict]]]] = {}
+        self.embeddings: Dict[str, np.ndarray] = {}
+        self.disk = None
+        if path:
+            self.disk = sqlite3.connect(path, check_same_thread=False)
+            self.disk.execute("CREATE TABLE IF NOT EXISTS replies (key TEXT PRIMARY KEY, messages TEXT)")
+            self._disk_lock = threading.Lock()
+
+    @staticmethod
+    def _key(agent, messages: List[dict], context_variables: dict) -> str:
+        payload = json.dumps(
+            [agent.name, agent.model, messages, context_variables],
+            sort_keys=True,
+            default=str
+        )
+        return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+    def _disk_get(self, key: str) -> Optional[List[dict]]:
+        with self._disk_lock:
+            row = self.disk.execute("SELECT messages FROM replies WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _disk_put(self, key: str, reply: List[dict]):
+        with self._disk_lock:
+            self.disk.execute("INSERT OR REPLACE INTO replies VALUES (?, ?)", (key, json.dumps(reply)))
+            self.disk.commit()
+
+    def _cacheable(self, response: Response) -> bool:
+        return all(
+            call["function"]["name"] in self.cacheable_tools
+            for message in response.messages
+            for call in message.get("tool_calls") or ()
+        )
+
+    def _embed(self, texts: List[str]) -> Optional[np.ndarray]:
+        try:
+            response = self.client.client.embeddings.create(model=EMBEDDING_MODEL, input=texts)
+        except Exception:
+            # Only an optimization; fall back to the exact-match cache
+            return None
+        vectors = np.asarray([item.embedding for item in response.data], dtype=np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    def _lookup(self, scope: str, question: str) -> Optional[List[dict]]:
+        rows = self.scopes.get(scope)
+        if not rows:
+            return None
+        # Embed the question along with any cached ones not embedded yet, in one call
+        known = self.embeddings.get(scope)
+        done = 0 if known is None else len(known)
+        vectors = self._embed([question] + [text for text, _ in rows[done:]])
+        if vectors is None:
+            return None
+        matrix = vectors[1:] if known is None else np.vstack([known, vectors[1:]])
+        self.embeddings[scope] = matrix
+        scores = matrix @ vectors[0]
+        best = int(np.argmax(scores))
+        return rows[best][1] if scores[best] >= self.threshold else None
+
+    def _store(self, key: str, scope: str, question: str, response: Response):
+        if not self._cacheable(response):
+            return
+        reply = [dict(message) for message in response.messages]
+        self.exact[key] = reply
+        if self.disk is not None:
+            self._disk_put(key, reply)
+        self.scopes.setdefault(scope, []).append((question, reply))
+
+    def _record(self, stream, key: str, scope: str, question: str):
+        for chunk in stream:
+            if "response" in chunk:
+                self._store(key, scope, question, chunk["response"])
+            yield chunk
+
+    @staticmethod
+    def _replay(response: Response):
+        # Same chunk shapes as Swarm's own stream, with each reply sent whole
+        yield {"delim": "start"}
+        for message in response.messages:
+            if message["role"] == "assistant" and message.get("content"):
+                yield {"role": "assistant", "sender": message.get("sender")}
+                yield {"content": message["content"]}
+        yield {"delim": "end"}
+        yield {"response": response}
+
+    def run(self, agent, messages: List[dict], **kwargs):
+        last = messages[-1] if messages else {}
+        if last.get("role") != "user":
+            return self.client.run(agent=agent, messages=messages, **kwargs)
+        
+        context_variables = kwargs.get("context_variables", {})
+        key = self._key(agent, messages, context_variables)
+        # Everything but the question itself, which is matched by meaning
+        scope = self._key(agent, messages[:-1], context_variables)
+        question = (last.get("content") or "").strip().lower()
+        cached = self.exact.get(key)
+        if cached is None and self.disk is not None:
+            cached = self._disk_get(key)
+        if cached is None:
+            cached = self._lookup(scope, question)
+        
+        if cached is not None:
+            # Only state-free tools ran for this reply, so the agent and context stay as they are
+            response = Response(
+                messages=[dict(message) for message in cached],
+                agent=agent,
+                context_variables=context_variables
+            )
+            return self._replay(response) if kwargs.get("stream") else response
+        
+        response = self.client.run(agent=agent, messages=messages, **kwargs)
+        if kwargs.get("stream"):
+            return self._record(response, key, scope, question)
+        self._store(key, scope, question, response)
+        return response
+
+    async def run_async(self, **kwargs) -> Response:
+        """Awaitable run, with the blocking calls in a worker thread"""
+        return await asyncio.to_thread(self.run, **kwargs)
+
+    def stream_async(self, **kwargs):
+        """Start a streaming run in a worker thread and iterate its chunks asynchronously"""
+        return iterate_in_thread(lambda: self.run(stream=True, **kwargs))
+
+@lru_cache(maxsize=1)
+def _format_second(epoch_second: int) -> str:
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(epoch_second))
+
+def timestamp() -> str:
+    """Current local time as YYYY-MM-DD HH:MM:SS
+    
+    Calls within the same second reuse the formatted string.
+    """
+    return _format_second(int(time.time()))
+
+class RecordStore:
+    """In-memory records keyed by sequential IDs such as ORD0001
+    
+    Records are instances of record_type, built from the fields given to
+    create plus the new ID under id_field. IDs come from itertools.count,
+    so concurrent tool calls never hand out the same one. Tools only go
+    through create/get/update, which keeps the backing dict swappable for
+    a real database later.
+    
+    Fields named in columns (field -> NumPy dtype) are also kept in one
+    array per field, row i belonging to the i-th record created, so bulk
+    queries like "total of all new orders" are vectorized column scans.
+    """
+    
+    def __init__(self, prefix: str, record_type: type, id_field: str, columns: Optional[Dict[str, str]] = None):
+        self.prefix = prefix
+        self.record_type = record_type
+        self.id_field = id_field
+        self._records: Dict[str, Any] = {}
+        self._numbers = count(1)
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._columns = {field: np.empty(16, dtype=dtype) for field, dtype in (columns or {}).items()}
+        self._lock = threading.Lock()
+    
+    def create(self, **fields) -> str:
+        """Store a new record and return its ID"""
+        with self._lock:
+            record_id = f"{self.prefix}{next(self._numbers):04d}"
+            self._records[record_id] = self.record_type(**{self.id_field: record_id}, **fields)
+            row = len(self._ids)
+            self._ids.append(record_id)
+            self._rows[record_id] = row
+            for field, values in self._columns.items():
+                if row == len(values):
+                    # Double the capacity so appends stay amortized O(1)
+                    values = self._columns[field] = np.concatenate([values, np.empty_like(values)])
+                values[row] = fields[field]
+        return record_id
+    
+    def get(self, record_id: Optional[str]) -> Optional[Any]:
+        """The record with this ID, or None"""
+        return self._records.get(record_id)
+    
+    def update(self, record_id: str, **changes) -> Any:
+        """Apply field changes to a record and return it"""
+        with self._lock:
+            record = self._records[record_id]
+            for field, value in changes.items():
+                setattr(record, field, value)
+            row = self._rows[record_id]
+            for field in changes.keys() & self._columns.keys():
+                self._columns[field][row] = changes[field]
+        return record
+    
+    def column(self, field: str) -> np.ndarray:
+        """One mirrored field for every record, in creation order"""
+        return self._columns[field][:len(self._ids)]
+    
+    def ids_where(self, mask: np.ndarray) -> List[str]:
+        """IDs of the records selected by a boolean mask over the columns"""
+        return [self._ids[row] for row in np.flatnonzero(mask)]
+
+@lru_cache(maxsize=1)
+def _encoding():
+    return tiktoken.encoding_for_model("gpt-4o")
+
+def count_tokens(message: dict) -> int:
+    """Approximate the prompt tokens used by one chat message"""
+    text = message.get("content") or ""
+    for tool_call in message.get("tool_calls") or []:
+        text += tool_call["function"]["arguments"]
+    # Each message carries a few tokens of framing on top of its content
+    return len(_encoding().encode(text)) + 4
+
+def trim_history(history: List[dict], max_tokens: int = MAX_HISTORY_TOKENS) -> List[dict]:
+    """Drop the oldest turns in place until history fits within max_tokens
+    
+    Cuts only at user messages so tool results never lose their tool call,
+    and always keeps the latest turn even if it alone is over budget.
+    """
+    sizes = [count_tokens(message) for message in history]
+    remaining = sum(sizes)
+    cut = 0
+    for i, message in enumerate(history):
+        if message.get("role") == "user":
+            cut = i
+            if remaining <= max_tokens:
+                break
+        remaining -= sizes[i]
+    if cut:
+        del history[:cut]
+    return history
+
+class ChatSession:
+    """One user's conversation: the current agent, the history and the context
+    
+    Sessions hold no client, so any number of them can run side by side
+    over the one pooled client from get_client().
+    """
+    
+    def __init__(self, agent: swarm.Agent, context_variables: Optional[dict] = None):
+        self.agent = agent
+        self.history: List[dict] = []
+        self.context = context_variables if context_variables is not None else {}
+    
+    def add_user_message(self, text: str):
+        """Append the user's message, dropping the oldest turns past the token budget"""
+        self.history.append({"role": "user", "content": text})
+        trim_history(self.history)
+    
+    def apply(self, response: Response):
+        """Take on a finished turn's context, agent and messages"""
+        self.context.update(response.context_variables)
+        self.agent = response.agent
+        self.history.extend(response.messages)
+    
+    async def send(self, client, text: str) -> Response:
+        """Answer one message and return the response"""
+        self.add_user_message(text)
+        response = await client.run_async(
+            agent=self.agent,
+            messages=self.history,
+            context_variables=self.context
+        )
+        self.apply(response)
+        return response
+    
+    def stream(self, client, text: str):
+        """Start answering one message as a stream; pass the final response to apply()"""
+        self.add_user_message(text)
+        return client.stream_async(
+            agent=self.agent,
+            messages=self.history,
+            context_variables=self.context
+        )
+
+def iterate_in_thread(make_stream):
+    """Start draining a blocking generator in a worker thread right away
+    
+    Returns an async iterator over its items, so several streams can be
+    started together and read back one after another.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    
+    def pump():
+        try:
+            for item in make_stream():
+                # Swarm reuses a chunk after yielding it (it pops the sender
+                # off), so hand the loop a copy taken before that can happen
+                if isinstance(item, dict):
+                    item = dict(item)
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        loop.call_soon_threadsafe(queue.put_nowait, _STREAM_END)
+    
+    producer = asyncio.create_task(asyncio.to_thread(pump))
+    
+    async def items():
+        while (item := await queue.get()) is not _STREAM_END:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+        await producer
+    
+    return items()
+
+async def stream_turn(stream, agent_name: Optional[str] = None):
+    """Write a started stream's reply to the terminal and return the final response
+    
+    Given agent_name, the agent answering when the turn starts, each reply
+    is labelled with its sender, and a handoff to another agent is
+    announced before that agent's reply.
+    """
+    out = sys.stdout.buffer
+    pending = bytearray()
+    pending_chunks = 0
+    last_flush = time.monotonic()
+    response = None
+    sender = None
+    
+    def flush():
+        # Tool output goes through the text layer, so drain it first
+        sys.stdout.flush()
+        out.write(pending)
+        out.flush()
+        pending.clear()
+    
+    async for chunk in stream:
+        # Content chunks make up almost the whole stream, so test for them
+        # first with a single lookup; delimiters and tool call deltas fall through
+        content = chunk.get("content")
+        if content:
+            if sender is not None:
+                if sender != agent_name:
+                    pending += f"{YELLOW}\nTransferred to {sender}!{RESET}\n".encode()
+                    agent_name = sender
+                pending += f"{GREEN}\n{sender}: {RESET}".encode()
+                sender = None
+            pending += content.encode()
+            pending_chunks += 1
+            now = time.monotonic()
+            if pending_chunks >= STREAM_FLUSH_CHUNKS or now - last_flush >= STREAM_FLUSH_INTERVAL:
+                flush()
+                pending_chunks = 0
+                last_flush = now
+        elif "response" in chunk:
+            # Final response object
+            response = chunk["response"]
+        elif agent_name is not None and "sender" in chunk:
+            # Opens each completion; label its reply once content arrives
+            sender = chunk["sender"]
+    
+    flush()
+    return response
+
+def read_user_input() -> asyncio.Queue:
+    """Read lines from the terminal in a background thread and queue them up
+    
+    Reading goes on while a reply streams, so the next message can be typed
+    ahead; the prompt is left to the caller, which prints it only once the
+    reply is done so it never lands in the middle of one. End of input is
+    queued as 'exit'. The thread is a daemon, so Ctrl+C never waits on it.
+    """
+    loop = asyncio.get_running_loop()
+    inbox = asyncio.Queue()
+    
+    def read():
+        while True:
+            try:
+                user_input = input()
+            except EOFError:
+                user_input = "exit"
+            try:
+                loop.call_soon_threadsafe(inbox.put_nowait, user_input)
+            except RuntimeError:
+                return  # The event loop has already closed
+            if user_input.lower() == 'exit':
+                return
+    
+    threading.Thread(target=read, name="input-reader", daemon=True).start()
+    return inbox
+
+def answer_turns(client, session: ChatSession, stream: bool = False):
+    """Build the answer function chat_loop calls for each of the user's messages
+    
+    Each message goes through session, and its reply is printed labelled
+    with the sender, after a note of any handoff. With stream=True the
+    reply is written as it arrives rather than once the turn is done.
+    """
+    async def answer(user_input: str):
+        try:
+            if stream:
+                response = await stream_turn(session.stream(client, user_input), session.agent.name)
+                print("\n")
+                if response:
+                    # Update context, current agent and conversation history
+                    session.apply(response)
+                return
+            
+            agent = session.agent
+            response = await session.send(client, user_input)
+            if session.agent is not agent:
+                print(f"{YELLOW}\nTransferred to {session.agent.name}!{RESET}")
+            reply = response.messages[-1]
+            print(f"{GREEN}\n{reply['sender']}: {reply['content']}\n{RESET}")
+            
+        except Exception as e:
+            print(f"{RED}\nError: {str(e)}{RESET}\n{YELLOW}Please try again.\n{RESET}")
+    
+    return answer
+
+async def chat_loop(answer, farewell: str):
+    """Pass each user message to answer, in order, until the user types exit
+    
+    Messages typed while a reply is on its way wait their turn, so each is
+    answered with the earlier replies and context already in place.
+    """
+    inbox = read_user_input()
+    
+    while True:
+        print(YOU_PROMPT, end="", flush=True)
+        user_input = await inbox.get()
+        if user_input.lower() == 'exit':
+            print(farewell)
+            break
+        await answer(user_input)
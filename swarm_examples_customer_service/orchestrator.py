@@ -0,0 +1,61 @@
+"""
+# Runs many customer sessions at once over one shared client
+# Each session keeps its own agent, history and context
+# Reads scripted sessions from a JSON Lines file, one session per line:
+#   {"app": "restaurant", "messages": ["Show me the menu", "I'd like the pasta"]}
+"""
+
+import asyncio
+import importlib
+import json
+import sys
+from typing import List
+
+from _shared import get_client, GREEN, YELLOW, RED, RESET
+
+# Example module behind each app name; each one provides new_session()
+APPS = {
+    "shopping": "08_advanced_context",
+    "restaurant": "09_complex_multi_agent",
+    "support": "10_complete_platform"
+}
+
+# Sessions answered at the same time; the rest wait for a free slot
+MAX_SESSIONS = 32
+
+async def run_session(number: int, app: str, messages: List[str], client, slots: asyncio.Semaphore):
+    """Play one scripted session, printing each reply as it arrives"""
+    label = f"[{number} {app}]"
+    session = importlib.import_module(APPS[app]).new_session()
+    async with slots:
+        for text in messages:
+            try:
+                response = await session.send(client, text)
+                reply = response.messages[-1]
+                print(f"{GREEN}{label} {reply['sender']}: {RESET}{reply['content']}\n", flush=True)
+            except Exception as e:
+                print(f"{RED}{label} Error: {str(e)}{RESET}\n", flush=True)
+
+async def main(path: str):
+    with open(path, encoding="utf-8") as f:
+        scripts = [json.loads(line) for line in f if line.strip()]
+
+    # Every session shares one pooled client instead of opening its own connections
+    client = get_client()
+    slots = asyncio.Semaphore(MAX_SESSIONS)
+    await asyncio.gather(*(
+        run_session(number, script["app"], script["messages"], client, slots)
+        for number, script in enumerate(scripts, 1)
+    ))
+    print(f"{YELLOW}Finished {len(scripts)} sessions{RESET}")
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(f"{YELLOW}Usage: python orchestrator.py sessions.jsonl{RESET}")
+        print(f"{YELLOW}Apps: {', '.join(APPS)}{RESET}")
+        sys.exit(1)
+
+    try:
+        asyncio.run(main(sys.argv[1]))
+    except Exception as e:
+        print(f"{RED}Orchestrator Error: {str(e)}{RESET}")
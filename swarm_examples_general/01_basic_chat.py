@@ -5,18 +5,21 @@
 # Perfect starting point for understanding Swarm's core functionality
 """
 
-import os
 from termcolor import colored
-from openai import AsyncOpenAI
-from swarm import Swarm, Agent
+from swarm import Agent
+from _shared import trim_history, get_client
 
 # Constants
 MODEL = "gpt-4o"
-HISTORY = []
+
+# Colored text shown on every turn
+YOU_PROMPT = colored("\nYou: ", "yellow")
+EXIT_TEXT = colored("\nEnding chat...", "red")
+THINKING_TEXT = colored("\nAgent is thinking...", "cyan")
 
 # Initialize Swarm client
 print(colored("Initializing Swarm client...", "cyan"))
-client = Swarm()
+client = get_client()
 
 # Create a basic agent
 basic_agent = Agent(
@@ -26,33 +29,35 @@ basic_agent = Agent(
 )
 
 def chat_loop():
-    global HISTORY
+    history = []  # This session's messages
     print(colored("\nChat started! Type 'exit' to end the conversation.", "green"))
     
     while True:
         # Get user input
-        user_input = input(colored("\nYou: ", "yellow"))
+        user_input = input(YOU_PROMPT)
         
         if user_input.lower() == 'exit':
-            print(colored("\nEnding chat...", "red"))
+            print(EXIT_TEXT)
             break
 
         # Add user message to history
-        HISTORY.append({"role": "user", "content": user_input})
+        history.append({"role": "user", "content": user_input})
 
         try:
             # Get response from agent
-            print(colored("\nAgent is thinking...", "cyan"))
+            print(THINKING_TEXT)
             response = client.run(
                 agent=basic_agent,
-                messages=HISTORY
+                messages=trim_history(history)
             )
 
             # Update history with agent's response
-            HISTORY.extend(response.messages)
+            history.extend(response.messages)
             
             # Print agent's response
-            print(colored(f"\nAgent: {response.messages[-1]['content']}", "green"))
+            reply = response.messages[-1].get("content")
+            if reply:
+                print(colored(f"\nAgent: {reply}", "green"))
 
         except Exception as e:
             print(colored(f"\nError: {str(e)}", "red"))
@@ -5,33 +5,35 @@
 # Shows practical usage of function calling in a chat context
 """
 
+import asyncio
 import os
-from termcolor import colored
-import json
-from datetime import datetime
-from swarm import Swarm, Agent
+import random
+import time
+from functools import lru_cache
+from swarm import Agent
+from _shared import cached_run, trim_history, get_client, read_input_ahead, GREEN, YELLOW, RED, MAGENTA, CYAN, RESET
 
 # Constants
 MODEL = "gpt-4o"
-HISTORY = []
+WEATHER_CONDITIONS = ("Sunny", "Cloudy", "Rainy", "Windy")
+# Source of the fake weather; set SWARM_SEED to get the same readings every run
+RNG = random.Random(os.environ.get("SWARM_SEED"))
+
+@lru_cache(maxsize=1)
+def _format_minute(epoch_minute: int) -> str:
+    return time.strftime("%I:%M %p", time.localtime(epoch_minute * 60))
 
 def get_current_time() -> str:
     """Get the current time in a readable format."""
-    print(colored("\n🕒 Getting current time...", "magenta"))
-    current_time = datetime.now()
-    return current_time.strftime("%I:%M %p")
+    print(f"{MAGENTA}\n🕒 Getting current time...{RESET}")
+    # Only formatted again once the minute changes
+    return _format_minute(int(time.time()) // 60)
 
-def calculate(operation: str, x: float, y: float) -> str:
-    """Perform basic mathematical operations.
-    
-    Args:
-        operation: One of 'add', 'subtract', 'multiply', 'divide'
-        x: First number
-        y: Second number
-    """
-    print(colored(f"\n🔢 Calculating {operation} of {x} and {y}...", "magenta"))
+@lru_cache(maxsize=256, typed=True)
+def _calculate(operation: str, x: float, y: float) -> str:
+    # Tools themselves can't be wrapped: Swarm inspects their __code__
     try:
-        match operation.lower():
+        match operation:
             case "add":
                 result = x + y
             case "subtract":
@@ -49,22 +51,36 @@ def calculate(operation: str, x: float, y: float) -> str:
     except Exception as e:
         return f"Error performing calculation: {str(e)}"
 
+def calculate(operation: str, x: float, y: float) -> str:
+    """Perform basic mathematical operations.
+    
+    Args:
+        operation: One of 'add', 'subtract', 'multiply', 'divide'
+        x: First number
+        y: Second number
+    """
+    print(f"{MAGENTA}\n🔢 Calculating {operation} of {x} and {y}...{RESET}")
+    return _calculate(operation.lower(), x, y)
+
 def get_fake_weather(city: str) -> str:
     """Get simulated weather information for a city.
     
     Args:
         city: Name of the city
     """
-    print(colored(f"\n🌤️ Checking weather for {city}...", "magenta"))
-    import random
-    conditions = ["Sunny", "Cloudy", "Rainy", "Windy"]
-    temp = random.randint(0, 35)
-    condition = random.choice(conditions)
+    print(f"{MAGENTA}\n🌤️ Checking weather for {city}...{RESET}")
+    temp = RNG.randint(0, 35)
+    condition = RNG.choice(WEATHER_CONDITIONS)
     return f"Weather in {city}: {condition}, {temp}°C"
 
+# Colored text shown on every turn
+YOU_PROMPT = f"{YELLOW}\nYou: {RESET}"
+EXIT_TEXT = f"{RED}\nEnding chat...{RESET}"
+THINKING_TEXT = f"{CYAN}\nAgent is thinking...{RESET}"
+
 # Initialize Swarm client
-print(colored("Initializing Swarm client...", "cyan"))
-client = Swarm()
+print(f"{CYAN}Initializing Swarm client...{RESET}")
+client = get_client()
 
 # Create utility agent with multiple functions
 utility_agent = Agent(
@@ -81,43 +97,51 @@ utility_agent = Agent(
     functions=[get_current_time, calculate, get_fake_weather]
 )
 
-def chat_loop():
-    global HISTORY
-    print(colored("\nUtility Agent Chat started! Type 'exit' to end.", "green"))
-    print(colored("Try asking about:\n- Current time\n- Math calculations\n- Weather in any city", "cyan"))
+async def chat_loop():
+    history = []  # This session's messages
+    print(f"{GREEN}\nUtility Agent Chat started! Type 'exit' to end.{RESET}")
+    print(f"{CYAN}Try asking about:\n- Current time\n- Math calculations\n- Weather in any city{RESET}")
     
+    # Lines typed while a reply is on its way wait here for their turn
+    inbox = read_input_ahead()
     while True:
         # Get user input
-        user_input = input(colored("\nYou: ", "yellow"))
+        print(YOU_PROMPT, end="", flush=True)
+        user_input = await inbox.get()
         
         if user_input.lower() == 'exit':
-            print(colored("\nEnding chat...", "red"))
+            print(EXIT_TEXT)
             break
 
         # Add user message to history
-        HISTORY.append({"role": "user", "content": user_input})
+        history.append({"role": "user", "content": user_input})
 
         try:
             # Get response from agent
-            print(colored("\nAgent is thinking...", "cyan"))
-            response = client.run(
+            print(THINKING_TEXT)
+            response = await asyncio.to_thread(
+                cached_run,
+                client,
                 agent=utility_agent,
-                messages=HISTORY
+                messages=trim_history(history),
+                volatile_tools=["get_current_time", "get_fake_weather"]
             )
 
             # Update history with agent's response
-            HISTORY.extend(response.messages)
+            history.extend(response.messages)
             
             # Print agent's response
-            print(colored(f"\nAgent: {response.messages[-1]['content']}", "green"))
+            reply = response.messages[-1].get("content")
+            if reply:
+                print(f"{GREEN}\nAgent: {reply}{RESET}")
 
         except Exception as e:
-            print(colored(f"\nError: {str(e)}", "red"))
+            print(f"{RED}\nError: {str(e)}{RESET}")
 
 if __name__ == "__main__":
     try:
-        chat_loop()
+        asyncio.run(chat_loop())
     except KeyboardInterrupt:
-        print(colored("\nChat ended by user.", "yellow"))
+        print(f"{YELLOW}\nChat ended by user.{RESET}")
     except Exception as e:
-        print(colored(f"\nUnexpected error: {str(e)}", "red")) 
\ No newline at end of file
+        print(f"{RED}\nUnexpected error: {str(e)}{RESET}") 
\ No newline at end of file
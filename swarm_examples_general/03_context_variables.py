@@ -5,14 +5,14 @@
 # Implements a simple shopping cart system using context variables
 """
 
-import os
-from termcolor import colored
-from swarm import Swarm, Agent
+import asyncio
+import re
+from swarm import Agent
 from swarm.types import Result
+from _shared import cached_run, trim_history, get_client, read_input_ahead, GREEN, YELLOW, RED, MAGENTA, CYAN, RESET
 
 # Constants
 MODEL = "gpt-4o"
-HISTORY = []
 PRODUCTS = {
     "laptop": 999.99,
     "phone": 599.99,
@@ -20,10 +20,14 @@ PRODUCTS = {
     "tablet": 299.99,
     "smartwatch": 199.99
 }
+# The catalog never changes, so its listing is rendered once
+PRODUCT_LIST_TEXT = "Available Products:\n" + "\n".join(
+    f"{item.title()}: ${price:.2f}" for item, price in PRODUCTS.items()
+)
 
 def view_cart(context_variables: dict) -> str:
     """View the current items in the shopping cart."""
-    print(colored("\n🛒 Viewing shopping cart contents...", "magenta"))
+    print(f"{MAGENTA}\n🛒 Viewing shopping cart contents...{RESET}")
     cart = context_variables.get("cart", {})
     if not cart:
         return "Your cart is empty."
@@ -39,12 +43,13 @@ def add_to_cart(context_variables: dict, item: str, quantity: int = 1) -> Result
         item: Name of the product
         quantity: Number of items to add
     """
-    print(colored(f"\n➕ Adding {quantity} {item}(s) to cart...", "magenta"))
-    if item.lower() not in PRODUCTS:
+    print(f"{MAGENTA}\n➕ Adding {quantity} {item}(s) to cart...{RESET}")
+    key = item.strip().lower()
+    if key not in PRODUCTS:
         return Result(value=f"Error: Product '{item}' not found in our catalog.")
     
     cart = context_variables.get("cart", {})
-    item = item.lower()
+    item = key
     cart[item] = cart.get(item, 0) + quantity
     
     return Result(
@@ -59,7 +64,7 @@ def remove_from_cart(context_variables: dict, item: str, quantity: int = 1) -> R
         item: Name of the product
         quantity: Number of items to remove
     """
-    print(colored(f"\n➖ Removing {quantity} {item}(s) from cart...", "magenta"))
+    print(f"{MAGENTA}\n➖ Removing {quantity} {item}(s) from cart...{RESET}")
     cart = context_variables.get("cart", {})
     item = item.lower()
     
@@ -80,14 +85,30 @@ def remove_from_cart(context_variables: dict, item: str, quantity: int = 1) -> R
 
 def list_products() -> str:
     """List all available products and their prices."""
-    print(colored("\n📋 Fetching product catalog...", "magenta"))
-    return "Available Products:\n" + "\n".join(
-        f"{item.title()}: ${price:.2f}" for item, price in PRODUCTS.items()
-    )
+    print(f"{MAGENTA}\n📋 Fetching product catalog...{RESET}")
+    return PRODUCT_LIST_TEXT
+
+# Requests a tool answers exactly, so they skip the model round trip
+VIEW_CART_COMMAND = re.compile(r"(view|show)( my)? cart", re.IGNORECASE)
+LIST_PRODUCTS_COMMAND = re.compile(r"(view|list|show)( all)? products?", re.IGNORECASE)
+
+def answer_directly(text: str, context_variables: dict):
+    """Answer a plain cart or catalog request locally, or return None"""
+    text = text.strip()
+    if VIEW_CART_COMMAND.fullmatch(text):
+        return view_cart(context_variables)
+    if LIST_PRODUCTS_COMMAND.fullmatch(text):
+        return list_products()
+    return None
+
+# Colored text shown on every turn
+YOU_PROMPT = f"{YELLOW}\nYou: {RESET}"
+EXIT_TEXT = f"{RED}\nEnding chat...{RESET}"
+THINKING_TEXT = f"{CYAN}\nAgent is thinking...{RESET}"
 
 # Initialize Swarm client
-print(colored("Initializing Swarm client...", "cyan"))
-client = Swarm()
+print(f"{CYAN}Initializing Swarm client...{RESET}")
+client = get_client()
 
 # Create shopping cart agent
 shopping_agent = Agent(
@@ -105,30 +126,41 @@ shopping_agent = Agent(
     functions=[list_products, add_to_cart, remove_from_cart, view_cart]
 )
 
-def chat_loop():
-    global HISTORY
+async def chat_loop():
+    history = []  # This session's messages
     context = {"cart": {}}  # Initialize empty cart
     
-    print(colored("\nShopping Assistant started! Type 'exit' to end.", "green"))
-    print(colored("Try:\n- View products\n- Add items to cart\n- Remove items\n- View cart", "cyan"))
+    print(f"{GREEN}\nShopping Assistant started! Type 'exit' to end.{RESET}")
+    print(f"{CYAN}Try:\n- View products\n- Add items to cart\n- Remove items\n- View cart{RESET}")
     
+    # Lines typed while a reply is on its way wait here for their turn
+    inbox = read_input_ahead()
     while True:
         # Get user input
-        user_input = input(colored("\nYou: ", "yellow"))
+        print(YOU_PROMPT, end="", flush=True)
+        user_input = await inbox.get()
         
         if user_input.lower() == 'exit':
-            print(colored("\nEnding chat...", "red"))
+            print(EXIT_TEXT)
             break
 
         # Add user message to history
-        HISTORY.append({"role": "user", "content": user_input})
+        history.append({"role": "user", "content": user_input})
+
+        direct = answer_directly(user_input, context)
+        if direct is not None:
+            history.append({"role": "assistant", "content": direct, "sender": shopping_agent.name})
+            print(f"{GREEN}\nAgent: {direct}{RESET}")
+            continue
 
         try:
             # Get response from agent
-            print(colored("\nAgent is thinking...", "cyan"))
-            response = client.run(
+            print(THINKING_TEXT)
+            response = await asyncio.to_thread(
+                cached_run,
+                client,
                 agent=shopping_agent,
-                messages=HISTORY,
+                messages=trim_history(history),
                 context_variables=context
             )
 
@@ -136,18 +168,20 @@ def chat_loop():
             context.update(response.context_variables)
             
             # Update history with agent's response
-            HISTORY.extend(response.messages)
+            history.extend(response.messages)
             
             # Print agent's response
-            print(colored(f"\nAgent: {response.messages[-1]['content']}", "green"))
+            reply = response.messages[-1].get("content")
+            if reply:
+                print(f"{GREEN}\nAgent: {reply}{RESET}")
 
         except Exception as e:
-            print(colored(f"\nError: {str(e)}", "red"))
+            print(f"{RED}\nError: {str(e)}{RESET}")
 
 if __name__ == "__main__":
     try:
-        chat_loop()
+        asyncio.run(chat_loop())
     except KeyboardInterrupt:
-        print(colored("\nChat ended by user.", "yellow"))
+        print(f"{YELLOW}\nChat ended by user.{RESET}")
     except Exception as e:
-        print(colored(f"\nUnexpected error: {str(e)}", "red")) 
\ No newline at end of file
+        print(f"{RED}\nUnexpected error: {str(e)}{RESET}") 
\ No newline at end of file
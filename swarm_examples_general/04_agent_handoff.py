@@ -5,14 +5,29 @@
 # Implements a customer service system with support, sales, and technical departments
 """
 
+import asyncio
 import os
-from termcolor import colored
-from swarm import Swarm, Agent
+import random
+from swarm import Agent
 from swarm.types import Result
+from _shared import cached_run, trim_history, get_client, read_input_ahead, GREEN, YELLOW, RED, MAGENTA, CYAN, RESET
+from functools import lru_cache
 
 # Constants
 MODEL = "gpt-4o"
-HISTORY = []
+ORDER_STATUSES = ("Processing", "Shipped", "Delivered", "Pending")
+# Source of the simulated order statuses; set SWARM_SEED to make them repeatable
+RNG = random.Random(os.environ.get("SWARM_SEED"))
+PRODUCTS = {
+    "laptop": "High-performance laptop with 16GB RAM, 512GB SSD",
+    "phone": "Latest smartphone with 5G capability",
+    "tablet": "10-inch tablet with retina display",
+}
+FAQS = {
+    "wifi": "1. Restart your device\n2. Check WiFi settings\n3. Reset network settings",
+    "battery": "1. Check power settings\n2. Update firmware\n3. Contact support if issue persists",
+    "update": "1. Go to Settings\n2. Check for Updates\n3. Install available updates"
+}
 
 def check_order_status(order_id: str) -> str:
     """Check the status of an order.
@@ -20,11 +35,9 @@ def check_order_status(order_id: str) -> str:
     Args:
         order_id: The order ID to check
     """
-    print(colored(f"\n🔍 Checking status for Order #{order_id}...", "magenta"))
+    print(f"{MAGENTA}\n🔍 Checking status for Order #{order_id}...{RESET}")
     # Simulate order status check
-    import random
-    statuses = ["Processing", "Shipped", "Delivered", "Pending"]
-    return f"Order {order_id} status: {random.choice(statuses)}"
+    return f"Order {order_id} status: {RNG.choice(ORDER_STATUSES)}"
 
 def get_product_info(product_name: str) -> str:
     """Get information about a product.
@@ -32,13 +45,16 @@ def get_product_info(product_name: str) -> str:
     Args:
         product_name: Name of the product
     """
-    print(colored(f"\n📦 Fetching information for product: {product_name}...", "magenta"))
-    products = {
-        "laptop": "High-performance laptop with 16GB RAM, 512GB SSD",
-        "phone": "Latest smartphone with 5G capability",
-        "tablet": "10-inch tablet with retina display",
-    }
-    return products.get(product_name.lower(), f"Product '{product_name}' not found.")
+    print(f"{MAGENTA}\n📦 Fetching information for product: {product_name}...{RESET}")
+    return PRODUCTS.get(product_name.strip().lower(), f"Product '{product_name}' not found.")
+
+@lru_cache(maxsize=256)
+def _faq_solution(issue: str):
+    # First FAQ whose keyword appears in the lowercased issue, or None
+    for keyword, solution in FAQS.items():
+        if keyword in issue:
+            return solution
+    return None
 
 def technical_faq(issue: str) -> str:
     """Get technical support for common issues.
@@ -46,16 +62,10 @@ def technical_faq(issue: str) -> str:
     Args:
         issue: The technical issue description
     """
-    print(colored(f"\n🔧 Looking up solution for issue: {issue}...", "magenta"))
-    faqs = {
-        "wifi": "1. Restart your device\n2. Check WiFi settings\n3. Reset network settings",
-        "battery": "1. Check power settings\n2. Update firmware\n3. Contact support if issue persists",
-        "update": "1. Go to Settings\n2. Check for Updates\n3. Install available updates"
-    }
-    
-    for keyword, solution in faqs.items():
-        if keyword in issue.lower():
-            return f"Solution for {issue}:\n{solution}"
+    print(f"{MAGENTA}\n🔧 Looking up solution for issue: {issue}...{RESET}")
+    solution = _faq_solution(issue.lower())
+    if solution is not None:
+        return f"Solution for {issue}:\n{solution}"
     return "No specific solution found. Please contact technical support."
 
 # Create specialized agents
@@ -88,7 +98,7 @@ tech_agent = Agent(
 
 def transfer_to_support() -> Result:
     """Transfer the conversation to the support agent."""
-    print(colored("\n🔄 Transferring to support team...", "yellow"))
+    print(f"{YELLOW}\n🔄 Transferring to support team...{RESET}")
     return Result(
         value="Transferring you to our support team...",
         agent=support_agent
@@ -96,7 +106,7 @@ def transfer_to_support() -> Result:
 
 def transfer_to_sales() -> Result:
     """Transfer the conversation to the sales agent."""
-    print(colored("\n🔄 Transferring to sales team...", "yellow"))
+    print(f"{YELLOW}\n🔄 Transferring to sales team...{RESET}")
     return Result(
         value="Transferring you to our sales team...",
         agent=sales_agent
@@ -104,7 +114,7 @@ def transfer_to_sales() -> Result:
 
 def transfer_to_tech() -> Result:
     """Transfer the conversation to the technical support agent."""
-    print(colored("\n🔄 Transferring to technical support team...", "yellow"))
+    print(f"{YELLOW}\n🔄 Transferring to technical support team...{RESET}")
     return Result(
         value="Transferring you to our technical support team...",
         agent=tech_agent
@@ -115,54 +125,66 @@ support_agent.functions.extend([transfer_to_sales, transfer_to_tech])
 sales_agent.functions.extend([transfer_to_support, transfer_to_tech])
 tech_agent.functions.extend([transfer_to_support, transfer_to_sales])
 
+# Colored text shown on every turn
+YOU_PROMPT = f"{YELLOW}\nYou: {RESET}"
+EXIT_TEXT = f"{RED}\nEnding chat...{RESET}"
+
 # Initialize Swarm client
-print(colored("Initializing Swarm client...", "cyan"))
-client = Swarm()
+print(f"{CYAN}Initializing Swarm client...{RESET}")
+client = get_client()
 
-def chat_loop():
-    global HISTORY
+async def chat_loop():
+    history = []  # This session's messages
     current_agent = support_agent  # Start with support agent
     
-    print(colored("\nCustomer Service System started! Type 'exit' to end.", "green"))
-    print(colored("You can ask about:\n- Order status\n- Product information\n- Technical support", "cyan"))
+    print(f"{GREEN}\nCustomer Service System started! Type 'exit' to end.{RESET}")
+    print(f"{CYAN}You can ask about:\n- Order status\n- Product information\n- Technical support{RESET}")
     
+    # Lines typed while a reply is on its way wait here for their turn
+    inbox = read_input_ahead()
     while True:
         # Get user input
-        user_input = input(colored("\nYou: ", "yellow"))
+        print(YOU_PROMPT, end="", flush=True)
+        user_input = await inbox.get()
         
         if user_input.lower() == 'exit':
-            print(colored("\nEnding chat...", "red"))
+            print(EXIT_TEXT)
             break
 
         # Add user message to history
-        HISTORY.append({"role": "user", "content": user_input})
+        history.append({"role": "user", "content": user_input})
 
         try:
             # Get response from current agent
-            print(colored(f"\n{current_agent.name} is thinking...", "cyan"))
-            response = client.run(
+            print(f"{CYAN}\n{current_agent.name} is thinking...{RESET}")
+            response = await asyncio.to_thread(
+                cached_run,
+                client,
                 agent=current_agent,
-                messages=HISTORY
+                messages=trim_history(history),
+                volatile_tools=["check_order_status"]
             )
 
             # Update history with agent's response
-            HISTORY.extend(response.messages)
+            history.extend(response.messages)
             
             # Check if agent changed
             if response.agent and response.agent != current_agent:
                 current_agent = response.agent
-                print(colored(f"\nTransferred to {current_agent.name}", "yellow"))
+                print(f"{YELLOW}\nTransferred to {current_agent.name}{RESET}")
             
             # Print agent's response
-            print(colored(f"\n{current_agent.name}: {response.messages[-1]['content']}", "green"))
+            reply = response.messages[-1].get("content")
+            if reply:
+                print(f"{GREEN}\n{current_agent.name}: {reply}{RESET}")
 
         except Exception as e:
-            print(colored(f"\nError: {str(e)}", "red"))
+            print(f"{RED}\nError: {str(e)}{RESET}")
 
 if __name__ == "__main__":
     try:
-        chat_loop()
+        asyncio.run(chat_loop())
     except KeyboardInterrupt:
-        print(colored("\nChat ended by user.", "yellow"))
+        print(f"{YELLOW}\nChat ended by user.{RESET}")
     except Exception as e:
-        print(colored(f"\nUnexpected error: {str(e)}", "red")) 
\ No newline at end of file
+        print(f"{RED}\nUnexpected error: {str(e)}{RESET}") 
\ No newline at end of file
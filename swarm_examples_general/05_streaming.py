@@ -5,16 +5,22 @@
 # Implements an interactive storytelling system with dynamic choices
 """
 
+import asyncio
 import os
+import re
 import sys
 import time
-from termcolor import colored
-from swarm import Swarm, Agent
+from swarm import Agent
 from swarm.types import Result
+from _shared import cached_run, trim_history, get_client, read_input_ahead, iterate_in_thread, GREEN, YELLOW, RED, MAGENTA, CYAN, RESET
 
 # Constants
 MODEL = "gpt-4o"
-HISTORY = []
+# Seconds between characters for a typewriter effect; 0 prints text as it arrives
+TYPEWRITER_DELAY = float(os.environ.get("SWARM_TYPEWRITER_DELAY", "0"))
+# Streamed text is written every STREAM_FLUSH_CHUNKS chunks or STREAM_FLUSH_INTERVAL seconds
+STREAM_FLUSH_CHUNKS = 8
+STREAM_FLUSH_INTERVAL = 0.05
 STORY_CONTEXT = {
     "current_chapter": 1,
     "character_name": "",
@@ -23,6 +29,13 @@ STORY_CONTEXT = {
     "inventory": []
 }
 
+CLASSES = {
+    "warrior": {"health": 120, "inventory": ("sword", "shield")},
+    "mage": {"health": 80, "inventory": ("staff", "spellbook")},
+    "rogue": {"health": 100, "inventory": ("dagger", "lockpicks")}
+}
+INVALID_CLASS_TEXT = f"Invalid class. Choose from: {', '.join(CLASSES)}"
+
 def create_character(context_variables: dict, name: str, character_class: str) -> Result:
     """Create a new character for the story.
     
@@ -30,22 +43,17 @@ def create_character(context_variables: dict, name: str, character_class: str) -
         name: Character name
         character_class: Type of character (warrior, mage, rogue)
     """
-    print(colored(f"\n✨ Creating new character: {name} the {character_class}...", "magenta"))
-    classes = {
-        "warrior": {"health": 120, "inventory": ["sword", "shield"]},
-        "mage": {"health": 80, "inventory": ["staff", "spellbook"]},
-        "rogue": {"health": 100, "inventory": ["dagger", "lockpicks"]}
-    }
+    print(f"{MAGENTA}\n✨ Creating new character: {name} the {character_class}...{RESET}")
+    class_info = CLASSES.get(character_class.lower())
+    if class_info is None:
+        return Result(value=INVALID_CLASS_TEXT)
     
-    if character_class.lower() not in classes:
-        return Result(value=f"Invalid class. Choose from: {', '.join(classes.keys())}")
-    
-    class_info = classes[character_class.lower()]
     context = {
         "character_name": name,
         "character_class": character_class.lower(),
         "health": class_info["health"],
-        "inventory": class_info["inventory"]
+        # A fresh list, so the character's inventory never aliases CLASSES
+        "inventory": list(class_info["inventory"])
     }
     
     return Result(
@@ -59,12 +67,12 @@ def make_choice(choice: str) -> str:
     Args:
         choice: The choice made (A, B, or C)
     """
-    print(colored(f"\n🎲 Processing choice {choice}...", "magenta"))
+    print(f"{MAGENTA}\n🎲 Processing choice {choice}...{RESET}")
     return f"You chose option {choice}."
 
 def get_character_status(context_variables: dict) -> str:
     """Get the current status of the character."""
-    print(colored("\n📊 Checking character status...", "magenta"))
+    print(f"{MAGENTA}\n📊 Checking character status...{RESET}")
     return f"""
 Character Status:
 Name: {context_variables.get('character_name', 'Not created')}
@@ -73,9 +81,15 @@ Health: {context_variables.get('health', 0)}
 Inventory: {', '.join(context_variables.get('inventory', []))}
 """
 
+# "create character <name> <class>" is handled locally without asking the model
+CREATE_CHARACTER_COMMAND = re.compile(r"create character (\S+) (\S+)", re.IGNORECASE)
+
+# Colored text shown on every turn
+YOU_PROMPT = f"{YELLOW}\nYou: {RESET}"
+
 # Initialize Swarm client
-print(colored("Initializing Swarm client...", "cyan"))
-client = Swarm()
+print(f"{CYAN}Initializing Swarm client...{RESET}")
+client = get_client()
 
 # Create storyteller agent
 storyteller = Agent(
@@ -90,64 +104,95 @@ storyteller = Agent(
     functions=[create_character, make_choice, get_character_status]
 )
 
-def print_streaming(text: str, color: str = "white", delay: float = 0.02):
-    """Print text with a typewriter effect."""
+def print_streaming(text: str, color: str = "", delay: float = TYPEWRITER_DELAY, end: str = "\n"):
+    """Print text with a typewriter effect, or in one write when delay is 0."""
+    if not delay:
+        sys.stdout.write(f"{color}{text}{RESET}{end}")
+        sys.stdout.flush()
+        return
+    sys.stdout.write(color)
     for char in text:
-        sys.stdout.write(colored(char, color))
+        sys.stdout.write(char)
         sys.stdout.flush()
         time.sleep(delay)
-    sys.stdout.write("\n")
+    sys.stdout.write(RESET + end)
 
-def chat_loop():
-    global HISTORY
+def print_line(text: str, color: str = ""):
+    """Print a whole line in one write."""
+    sys.stdout.write(f"{color}{text}{RESET}\n")
+    sys.stdout.flush()
+
+async def chat_loop():
+    history = []  # This session's messages
     context = STORY_CONTEXT.copy()
     
-    print_streaming("\nInteractive Storyteller started! Type 'exit' to end.", "green")
-    print_streaming("First, create your character with: create character [name] [class]", "cyan")
-    print_streaming("Available classes: warrior, mage, rogue", "cyan")
+    print_streaming("\nInteractive Storyteller started! Type 'exit' to end.", GREEN)
+    print_streaming("First, create your character with: create character [name] [class]", CYAN)
+    print_streaming("Available classes: warrior, mage, rogue", CYAN)
     
+    # Lines typed while a reply is on its way wait here for their turn
+    inbox = read_input_ahead()
     while True:
         # Get user input
-        user_input = input(colored("\nYou: ", "yellow"))
+        print(YOU_PROMPT, end="", flush=True)
+        user_input = await inbox.get()
         
         if user_input.lower() == 'exit':
-            print_streaming("\nEnding story...", "red")
+            print_line("\nEnding story...", RED)
             break
 
         # Add user message to history
-        HISTORY.append({"role": "user", "content": user_input})
+        history.append({"role": "user", "content": user_input})
+
+        command = CREATE_CHARACTER_COMMAND.fullmatch(user_input.strip())
+        if command:
+            result = create_character(context, *command.groups())
+            context.update(result.context_variables)
+            history.append({"role": "assistant", "content": result.value, "sender": storyteller.name})
+            print_line(f"\n{result.value}", GREEN)
+            continue
 
         try:
             # Get streaming response from agent
-            print_streaming("\nStoryteller is weaving the tale...", "cyan", 0.05)
-            stream = client.run(
+            print_line("\nStoryteller is weaving the tale...", CYAN)
+            # The stream blocks on the network, so it is read in a worker thread
+            stream = iterate_in_thread(lambda: cached_run(
+                client,
                 agent=storyteller,
-                messages=HISTORY,
+                messages=trim_history(history),
                 context_variables=context,
                 stream=True
-            )
+            ))
 
-            # Process streaming response
-            for chunk in stream:
-                if "delim" in chunk:
-                    continue
+            # Process streaming response; content chunks come most often, so check them first
+            pending = []
+            last_flush = time.monotonic()
+            async for chunk in stream:
+                content = chunk.get("content")
+                if content:
+                    pending.append(content)
+                    now = time.monotonic()
+                    if len(pending) >= STREAM_FLUSH_CHUNKS or now - last_flush >= STREAM_FLUSH_INTERVAL:
+                        print_streaming("".join(pending), GREEN, end="")
+                        pending.clear()
+                        last_flush = now
+                elif chunk.get("delim") == "end":
+                    # Write what is left and end the reply's line
+                    print_streaming("".join(pending), GREEN)
+                    pending.clear()
                 elif "response" in chunk:
                     # Final response object
                     response = chunk["response"]
                     context.update(response.context_variables)
-                    HISTORY.extend(response.messages)
-                else:
-                    # Content chunk
-                    if "content" in chunk:
-                        print_streaming(chunk["content"], "green", 0.02)
+                    history.extend(response.messages)
 
         except Exception as e:
-            print_streaming(f"\nError: {str(e)}", "red")
+            print_line(f"\nError: {str(e)}", RED)
 
 if __name__ == "__main__":
     try:
-        chat_loop()
+        asyncio.run(chat_loop())
     except KeyboardInterrupt:
-        print_streaming("\nStory ended by user.", "yellow")
+        print_line("\nStory ended by user.", YELLOW)
     except Exception as e:
-        print_streaming(f"\nUnexpected error: {str(e)}", "red") 
\ No newline at end of file
+        print_line(f"\nUnexpected error: {str(e)}", RED) 
\ No newline at end of file
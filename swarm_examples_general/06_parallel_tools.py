@@ -5,34 +5,50 @@
 # Implements a data processing system that can analyze multiple metrics in parallel
 """
 
-import os
+import asyncio
 import time
-import random
-from termcolor import colored
-from swarm import Swarm, Agent
+import numpy as np
+from swarm import Agent
+from _shared import cached_run, trim_history, get_client, read_input_ahead, GREEN, YELLOW, RED, MAGENTA, CYAN, RESET
 
 # Constants
 MODEL = "gpt-4o"
-HISTORY = []
 SAMPLE_DATA = {
     "temperature": [20, 22, 21, 23, 22, 24, 23, 25, 24, 26],
     "humidity": [45, 48, 47, 46, 45, 44, 46, 47, 48, 49],
     "pressure": [1013, 1014, 1012, 1011, 1013, 1015, 1014, 1012, 1011, 1010]
 }
 
+# Each metric's readings as an array, so the reductions below run in C
+SERIES = {metric: np.asarray(values) for metric, values in SAMPLE_DATA.items()}
+
+def _trend(series: np.ndarray) -> str:
+    half = len(series) // 2
+    first_half = series[:half].mean()
+    second_half = series[half:].mean()
+    if second_half > first_half:
+        return "increasing"
+    if second_half < first_half:
+        return "decreasing"
+    return "stable"
+
+# SAMPLE_DATA is fixed, so every answer the tools give is worked out once here
+AVERAGES = {metric: series.mean().item() for metric, series in SERIES.items()}
+PEAKS = {metric: series.max().item() for metric, series in SERIES.items()}
+TRENDS = {metric: _trend(series) for metric, series in SERIES.items()}
+METRICS_TEXT = "Available metrics: " + ", ".join(SAMPLE_DATA.keys())
+
 def calculate_average(metric: str) -> str:
     """Calculate the average value for a metric.
     
     Args:
         metric: The metric to analyze (temperature, humidity, pressure)
     """
-    print(colored(f"\n📊 Calculating average for {metric}...", "magenta"))
+    print(f"{MAGENTA}\n📊 Calculating average for {metric}...{RESET}")
     if metric not in SAMPLE_DATA:
         return f"Error: Metric '{metric}' not found"
     
-    time.sleep(1)  # Simulate processing time
-    avg = sum(SAMPLE_DATA[metric]) / len(SAMPLE_DATA[metric])
-    return f"Average {metric}: {avg:.2f}"
+    return f"Average {metric}: {AVERAGES[metric]:.2f}"
 
 def find_peak_value(metric: str) -> str:
     """Find the peak value for a metric.
@@ -40,13 +56,11 @@ def find_peak_value(metric: str) -> str:
     Args:
         metric: The metric to analyze (temperature, humidity, pressure)
     """
-    print(colored(f"\n📈 Finding peak value for {metric}...", "magenta"))
+    print(f"{MAGENTA}\n📈 Finding peak value for {metric}...{RESET}")
     if metric not in SAMPLE_DATA:
         return f"Error: Metric '{metric}' not found"
     
-    time.sleep(1)  # Simulate processing time
-    peak = max(SAMPLE_DATA[metric])
-    return f"Peak {metric}: {peak}"
+    return f"Peak {metric}: {PEAKS[metric]}"
 
 def calculate_trend(metric: str) -> str:
     """Calculate the trend for a metric.
@@ -54,31 +68,25 @@ def calculate_trend(metric: str) -> str:
     Args:
         metric: The metric to analyze (temperature, humidity, pressure)
     """
-    print(colored(f"\n📉 Calculating trend for {metric}...", "magenta"))
+    print(f"{MAGENTA}\n📉 Calculating trend for {metric}...{RESET}")
     if metric not in SAMPLE_DATA:
         return f"Error: Metric '{metric}' not found"
     
-    time.sleep(1)  # Simulate processing time
-    first_half = sum(SAMPLE_DATA[metric][:5]) / 5
-    second_half = sum(SAMPLE_DATA[metric][5:]) / 5
-    
-    if second_half > first_half:
-        trend = "increasing"
-    elif second_half < first_half:
-        trend = "decreasing"
-    else:
-        trend = "stable"
-    
-    return f"{metric.title()} trend: {trend}"
+    return f"{metric.title()} trend: {TRENDS[metric]}"
 
 def get_available_metrics() -> str:
     """List all available metrics."""
-    print(colored("\n📋 Listing available metrics...", "magenta"))
-    return "Available metrics: " + ", ".join(SAMPLE_DATA.keys())
+    print(f"{MAGENTA}\n📋 Listing available metrics...{RESET}")
+    return METRICS_TEXT
+
+# Colored text shown on every turn
+YOU_PROMPT = f"{YELLOW}\nYou: {RESET}"
+EXIT_TEXT = f"{RED}\nEnding session...{RESET}"
+THINKING_TEXT = f"{CYAN}\nProcessing data...{RESET}"
 
 # Initialize Swarm client
-print(colored("Initializing Swarm client...", "cyan"))
-client = Swarm()
+print(f"{CYAN}Initializing Swarm client...{RESET}")
+client = get_client()
 
 # Create data processing agent
 data_agent = Agent(
@@ -93,47 +101,54 @@ data_agent = Agent(
     parallel_tool_calls=True  # Enable parallel tool calls
 )
 
-def chat_loop():
-    global HISTORY
+async def chat_loop():
+    history = []  # This session's messages
     
-    print(colored("\nData Processing System started! Type 'exit' to end.", "green"))
-    print(colored("Try asking about:\n- Average values\n- Peak values\n- Trends\nFor multiple metrics at once!", "cyan"))
+    print(f"{GREEN}\nData Processing System started! Type 'exit' to end.{RESET}")
+    print(f"{CYAN}Try asking about:\n- Average values\n- Peak values\n- Trends\nFor multiple metrics at once!{RESET}")
     
+    # Lines typed while a reply is on its way wait here for their turn
+    inbox = read_input_ahead()
     while True:
         # Get user input
-        user_input = input(colored("\nYou: ", "yellow"))
+        print(YOU_PROMPT, end="", flush=True)
+        user_input = await inbox.get()
         
         if user_input.lower() == 'exit':
-            print(colored("\nEnding session...", "red"))
+            print(EXIT_TEXT)
             break
 
         # Add user message to history
-        HISTORY.append({"role": "user", "content": user_input})
+        history.append({"role": "user", "content": user_input})
 
         try:
             # Get response from agent
-            print(colored("\nProcessing data...", "cyan"))
+            print(THINKING_TEXT)
             start_time = time.time()
             
-            response = client.run(
+            response = await asyncio.to_thread(
+                cached_run,
+                client,
                 agent=data_agent,
-                messages=HISTORY
+                messages=trim_history(history)
             )
 
             # Update history with agent's response
-            HISTORY.extend(response.messages)
+            history.extend(response.messages)
             
             # Print agent's response and processing time
-            print(colored(f"\nAgent: {response.messages[-1]['content']}", "green"))
-            print(colored(f"Processing time: {time.time() - start_time:.2f} seconds", "yellow"))
+            reply = response.messages[-1].get("content")
+            if reply:
+                print(f"{GREEN}\nAgent: {reply}{RESET}")
+            print(f"{YELLOW}Processing time: {time.time() - start_time:.2f} seconds{RESET}")
 
         except Exception as e:
-            print(colored(f"\nError: {str(e)}", "red"))
+            print(f"{RED}\nError: {str(e)}{RESET}")
 
 if __name__ == "__main__":
     try:
-        chat_loop()
+        asyncio.run(chat_loop())
     except KeyboardInterrupt:
-        print(colored("\nSession ended by user.", "yellow"))
+        print(f"{YELLOW}\nSession ended by user.{RESET}")
     except Exception as e:
-        print(colored(f"\nUnexpected error: {str(e)}", "red")) 
\ No newline at end of file
+        print(f"{RED}\nUnexpected error: {str(e)}{RESET}") 
\ No newline at end of file
@@ -5,15 +5,15 @@
 # Implements a system that uses appropriate models for different types of processing
 """
 
-import os
-from termcolor import colored
-from swarm import Swarm, Agent
+import asyncio
+import re
+from swarm import Agent
 from swarm.types import Result
+from _shared import ChatSession, print_stream, SemanticCache, get_client, read_input_ahead, GREEN, YELLOW, RED, MAGENTA, CYAN, RESET
 
 # Constants
 DEFAULT_MODEL = "gpt-4o"
 FAST_MODEL = "gpt-4o-mini"  # For simple tasks
-HISTORY = []
 
 def summarize_text(text: str) -> str:
     """Summarize a piece of text.
@@ -21,7 +21,7 @@ def summarize_text(text: str) -> str:
     Args:
         text: The text to summarize
     """
-    print(colored("\n📝 Summarizing text...", "magenta"))
+    print(f"{MAGENTA}\n📝 Summarizing text...{RESET}")
     return "This function will be handled by the model."
 
 def analyze_sentiment(text: str) -> str:
@@ -30,7 +30,7 @@ def analyze_sentiment(text: str) -> str:
     Args:
         text: The text to analyze
     """
-    print(colored("\n😊 Analyzing sentiment...", "magenta"))
+    print(f"{MAGENTA}\n😊 Analyzing sentiment...{RESET}")
     return "This function will be handled by the model."
 
 def extract_keywords(text: str) -> str:
@@ -39,7 +39,7 @@ def extract_keywords(text: str) -> str:
     Args:
         text: The text to analyze
     """
-    print(colored("\n🔑 Extracting keywords...", "magenta"))
+    print(f"{MAGENTA}\n🔑 Extracting keywords...{RESET}")
     return "This function will be handled by the model."
 
 def translate_text(text: str, target_language: str) -> str:
@@ -49,12 +49,18 @@ def translate_text(text: str, target_language: str) -> str:
         text: The text to translate
         target_language: The target language
     """
-    print(colored(f"\n🌐 Translating text to {target_language}...", "magenta"))
+    print(f"{MAGENTA}\n🌐 Translating text to {target_language}...{RESET}")
     return "This function will be handled by the model."
 
+# Colored text shown on every turn
+YOU_PROMPT = f"{YELLOW}\nYou: {RESET}"
+EXIT_TEXT = f"{RED}\nEnding session...{RESET}"
+
 # Initialize Swarm client
-print(colored("Initializing Swarm client...", "cyan"))
-client = Swarm()
+print(f"{CYAN}Initializing Swarm client...{RESET}")
+client = get_client()
+# Reworded repeats of a request are answered from here without a model call
+answers = SemanticCache(client)
 
 # Create specialized agents for different tasks
 basic_agent = Agent(
@@ -77,7 +83,7 @@ advanced_agent = Agent(
 
 def transfer_to_advanced() -> Result:
     """Transfer to the advanced agent for complex tasks."""
-    print(colored("\n🔄 Transferring to advanced processor...", "yellow"))
+    print(f"{YELLOW}\n🔄 Transferring to advanced processor...{RESET}")
     return Result(
         value="Transferring to advanced processor for complex task...",
         agent=advanced_agent
@@ -85,7 +91,7 @@ def transfer_to_advanced() -> Result:
 
 def transfer_to_basic() -> Result:
     """Transfer to the basic agent for simple tasks."""
-    print(colored("\n🔄 Transferring to basic processor...", "yellow"))
+    print(f"{YELLOW}\n🔄 Transferring to basic processor...{RESET}")
     return Result(
         value="Transferring to basic processor for simple task...",
         agent=basic_agent
@@ -95,52 +101,76 @@ def transfer_to_basic() -> Result:
 basic_agent.functions.append(transfer_to_advanced)
 advanced_agent.functions.append(transfer_to_basic)
 
-def chat_loop():
-    global HISTORY
-    current_agent = basic_agent  # Start with basic agent
+# Requests whose task is obvious from their wording go straight to the right
+# agent; anything else stays with the current one, which can still transfer
+ROUTES = (
+    (re.compile(r"\b(summar|translat)", re.IGNORECASE), advanced_agent),
+    (re.compile(r"\b(keyword|sentiment)", re.IGNORECASE), basic_agent)
+)
+
+def route(user_input: str):
+    """Pick the agent for a request by its wording, or None if it isn't clear"""
+    for pattern, agent in ROUTES:
+        if pattern.search(user_input):
+            return agent
+    return None
+
+def new_session() -> ChatSession:
+    """A fresh conversation, starting with the basic agent"""
+    return ChatSession(basic_agent)
+
+async def chat_loop():
+    session = new_session()
     
-    print(colored("\nMulti-Model Processing System started! Type 'exit' to end.", "green"))
-    print(colored("Available tasks:", "cyan"))
-    print(colored("Basic tasks (fast model):\n- Keyword extraction\n- Sentiment analysis", "cyan"))
-    print(colored("Advanced tasks (powerful model):\n- Text summarization\n- Translation", "cyan"))
+    print(f"{GREEN}\nMulti-Model Processing System started! Type 'exit' to end.{RESET}")
+    print(f"{CYAN}Available tasks:{RESET}")
+    print(f"{CYAN}Basic tasks (fast model):\n- Keyword extraction\n- Sentiment analysis{RESET}")
+    print(f"{CYAN}Advanced tasks (powerful model):\n- Text summarization\n- Translation{RESET}")
     
+    # Lines typed while a reply is on its way wait here for their turn
+    inbox = read_input_ahead()
     while True:
         # Get user input
-        user_input = input(colored("\nYou: ", "yellow"))
+        print(YOU_PROMPT, end="", flush=True)
+        user_input = await inbox.get()
         
         if user_input.lower() == 'exit':
-            print(colored("\nEnding session...", "red"))
+            print(EXIT_TEXT)
             break
 
         # Add user message to history
-        HISTORY.append({"role": "user", "content": user_input})
+        session.add_user_message(user_input)
+
+        # Switch agents locally instead of spending a model turn on a transfer
+        routed = route(user_input)
+        if routed is not None and routed is not session.agent:
+            session.agent = routed
+            print(f"{YELLOW}\nSwitched to {session.agent.name} ({session.agent.model}){RESET}")
 
         try:
             # Get response from current agent
-            print(colored(f"\n{current_agent.name} ({current_agent.model}) is processing...", "cyan"))
-            response = client.run(
-                agent=current_agent,
-                messages=HISTORY
-            )
-
-            # Update history with agent's response
-            HISTORY.extend(response.messages)
+            print(f"{CYAN}\n{session.agent.name} ({session.agent.model}) is processing...{RESET}")
+            response = await asyncio.to_thread(lambda: print_stream(answers.run(
+                agent=session.agent,
+                messages=list(session.history),
+                stream=True
+            ), "Agent: "))
+
+            # Update history and agent with the response
+            previous_agent = session.agent
+            session.apply(response)
             
             # Check if agent changed
-            if response.agent and response.agent != current_agent:
-                current_agent = response.agent
-                print(colored(f"\nSwitched to {current_agent.name} ({current_agent.model})", "yellow"))
+            if session.agent is not previous_agent:
+                print(f"{YELLOW}\nSwitched to {session.agent.name} ({session.agent.model}){RESET}")
             
-            # Print agent's response
-            print(colored(f"\nAgent: {response.messages[-1]['content']}", "green"))
-
         except Exception as e:
-            print(colored(f"\nError: {str(e)}", "red"))
+            print(f"{RED}\nError: {str(e)}{RESET}")
 
 if __name__ == "__main__":
     try:
-        chat_loop()
+        asyncio.run(chat_loop())
     except KeyboardInterrupt:
-        print(colored("\nSession ended by user.", "yellow"))
+        print(f"{YELLOW}\nSession ended by user.{RESET}")
     except Exception as e:
-        print(colored(f"\nUnexpected error: {str(e)}", "red")) 
\ No newline at end of file
+        print(f"{RED}\nUnexpected error: {str(e)}{RESET}") 
\ No newline at end of file
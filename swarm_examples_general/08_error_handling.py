@@ -5,21 +5,31 @@
 # Implements a system that can recover from failures and adapt its approach
 """
 
+import asyncio
 import os
 import time
 import random
-from termcolor import colored
-from swarm import Swarm, Agent, Result
+from functools import wraps
+from swarm import Agent
+from _shared import ChatSession, print_stream, SemanticCache, get_client, read_input_ahead, GREEN, YELLOW, RED, MAGENTA, CYAN, RESET
 
 # Constants
 MODEL = "gpt-4o"
-HISTORY = []
 MAX_RETRIES = 3
+# Upper bound in seconds for a single backoff sleep
+MAX_RETRY_DELAY = 10
+# Decides which task runs fail; set SWARM_SEED to replay the same failures
+RNG = random.Random(os.environ.get("SWARM_SEED"))
 TASKS = {
     "process_data": {"success_rate": 0.7, "retry_delay": 1},
     "validate_input": {"success_rate": 0.9, "retry_delay": 0.5},
     "generate_report": {"success_rate": 0.8, "retry_delay": 1.5}
 }
+# Chance of success per task; with_retry turns unknown tasks away before they run
+SUCCESS_RATES = {task: info["success_rate"] for task, info in TASKS.items()}
+TASK_LIST_TEXT = "Available tasks:\n" + "\n".join(
+    f"{task}: {info['success_rate'] * 100}% success rate" for task, info in TASKS.items()
+)
 
 class TaskError(Exception):
     """Custom error for task execution failures."""
@@ -27,13 +37,21 @@ class TaskError(Exception):
 
 def simulate_task_execution(task_name: str) -> bool:
     """Simulate task execution with controlled failure rate."""
-    if task_name not in TASKS:
-        return False
-    return random.random() < TASKS[task_name]["success_rate"]
+    return RNG.random() < SUCCESS_RATES[task_name]
 
 def with_retry(func):
-    """Decorator to add retry logic to functions."""
+    """Decorator to add retry logic to functions.
+
+    Waits between attempts with decorrelated-jitter exponential backoff, so
+    retries of the same task spread out instead of firing in lockstep.
+    """
+    @wraps(func)
     def wrapper(*args, **kwargs):
+        task_name = kwargs.get("task_name", args[0] if args else None)
+        # An unknown task fails the same way every time, so don't retry it
+        if task_name not in TASKS:
+            return f"Failed: unknown task '{task_name}'"
+        base_delay = delay = TASKS[task_name]["retry_delay"]
         retries = 0
         while retries < MAX_RETRIES:
             try:
@@ -42,9 +60,9 @@ def with_retry(func):
                 retries += 1
                 if retries == MAX_RETRIES:
                     return f"Failed after {MAX_RETRIES} retries: {str(e)}"
-                delay = TASKS.get(args[0], {}).get("retry_delay", 1)
+                delay = min(MAX_RETRY_DELAY, RNG.uniform(base_delay, delay * 3))
                 time.sleep(delay)
-                print(colored(f"Retry {retries}/{MAX_RETRIES} after {delay}s delay...", "yellow"))
+                print(f"{YELLOW}Retry {retries}/{MAX_RETRIES} after {delay:.2f}s delay...{RESET}")
         return "Maximum retries exceeded"
     return wrapper
 
@@ -56,7 +74,7 @@ def process_data(task_name: str, data: str) -> str:
         task_name: Name of the task
         data: Data to process
     """
-    print(colored(f"\n🔄 Processing data: {data}...", "magenta"))
+    print(f"{MAGENTA}\n🔄 Processing data: {data}...{RESET}")
     if not simulate_task_execution(task_name):
         raise TaskError(f"Failed to process data: {data}")
     return f"Successfully processed data: {data}"
@@ -69,7 +87,7 @@ def validate_input(task_name: str, input_data: str) -> str:
         task_name: Name of the task
         input_data: Data to validate
     """
-    print(colored(f"\n✅ Validating input: {input_data}...", "magenta"))
+    print(f"{MAGENTA}\n✅ Validating input: {input_data}...{RESET}")
     if not simulate_task_execution(task_name):
         raise TaskError(f"Failed to validate input: {input_data}")
     return f"Input validated successfully: {input_data}"
@@ -82,23 +100,27 @@ def generate_report(task_name: str, report_type: str) -> str:
         task_name: Name of the task
         report_type: Type of report to generate
     """
-    print(colored(f"\n📄 Generating {report_type} report...", "magenta"))
+    print(f"{MAGENTA}\n📄 Generating {report_type} report...{RESET}")
     if not simulate_task_execution(task_name):
         raise TaskError(f"Failed to generate {report_type} report")
     return f"Generated {report_type} report successfully"
 
 def list_available_tasks() -> str:
     """List all available tasks and their success rates."""
-    print(colored("\n📋 Listing available tasks...", "magenta"))
-    tasks = []
-    for task, info in TASKS.items():
-        success_rate = info["success_rate"] * 100
-        tasks.append(f"{task}: {success_rate}% success rate")
-    return "Available tasks:\n" + "\n".join(tasks)
+    print(f"{MAGENTA}\n📋 Listing available tasks...{RESET}")
+    return TASK_LIST_TEXT
+
+# Colored text shown on every turn
+YOU_PROMPT = f"{YELLOW}\nYou: {RESET}"
+EXIT_TEXT = f"{RED}\nEnding session...{RESET}"
+THINKING_TEXT = f"{CYAN}\nExecuting task...{RESET}"
+HANDLED_TEXT = f"{YELLOW}This error was handled by the system, not the agent{RESET}"
 
 # Initialize Swarm client
-print(colored("Initializing Swarm client...", "cyan"))
-client = Swarm()
+print(f"{CYAN}Initializing Swarm client...{RESET}")
+client = get_client()
+# Task runs fail at random, so only replies that ran no task are reused
+answers = SemanticCache(client, volatile_tools=list(TASKS))
 
 # Create error-handling agent
 error_handler = Agent(
@@ -116,46 +138,51 @@ error_handler = Agent(
     functions=[process_data, validate_input, generate_report, list_available_tasks]
 )
 
-def chat_loop():
-    global HISTORY
+def new_session() -> ChatSession:
+    """A fresh conversation with the error handler"""
+    return ChatSession(error_handler)
+
+async def chat_loop():
+    session = new_session()
     
-    print(colored("\nRobust Task Executor started! Type 'exit' to end.", "green"))
-    print(colored("Try:\n- Processing data\n- Validating input\n- Generating reports", "cyan"))
-    print(colored("Note: Tasks may fail randomly to demonstrate error handling", "yellow"))
+    print(f"{GREEN}\nRobust Task Executor started! Type 'exit' to end.{RESET}")
+    print(f"{CYAN}Try:\n- Processing data\n- Validating input\n- Generating reports{RESET}")
+    print(f"{YELLOW}Note: Tasks may fail randomly to demonstrate error handling{RESET}")
     
+    # Lines typed while a reply is on its way wait here for their turn
+    inbox = read_input_ahead()
     while True:
         # Get user input
-        user_input = input(colored("\nYou: ", "yellow"))
+        print(YOU_PROMPT, end="", flush=True)
+        user_input = await inbox.get()
         
         if user_input.lower() == 'exit':
-            print(colored("\nEnding session...", "red"))
+            print(EXIT_TEXT)
             break
 
         # Add user message to history
-        HISTORY.append({"role": "user", "content": user_input})
+        session.add_user_message(user_input)
 
         try:
             # Get response from agent
-            print(colored("\nExecuting task...", "cyan"))
-            response = client.run(
-                agent=error_handler,
-                messages=HISTORY
-            )
+            print(THINKING_TEXT)
+            response = await asyncio.to_thread(lambda: print_stream(answers.run(
+                agent=session.agent,
+                messages=list(session.history),
+                stream=True
+            ), "Agent: "))
 
             # Update history with agent's response
-            HISTORY.extend(response.messages)
+            session.apply(response)
             
-            # Print agent's response
-            print(colored(f"\nAgent: {response.messages[-1]['content']}", "green"))
-
         except Exception as e:
-            print(colored(f"\nSystem Error: {str(e)}", "red"))
-            print(colored("This error was handled by the system, not the agent", "yellow"))
+            print(f"{RED}\nSystem Error: {str(e)}{RESET}")
+            print(HANDLED_TEXT)
 
 if __name__ == "__main__":
     try:
-        chat_loop()
+        asyncio.run(chat_loop())
     except KeyboardInterrupt:
-        print(colored("\nSession ended by user.", "yellow"))
+        print(f"{YELLOW}\nSession ended by user.{RESET}")
     except Exception as e:
-        print(colored(f"\nUnexpected error: {str(e)}", "red")) 
\ No newline at end of file
+        print(f"{RED}\nUnexpected error: {str(e)}{RESET}") 
\ No newline at end of file
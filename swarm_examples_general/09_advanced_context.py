@@ -5,15 +5,17 @@
 # Implements a simple RPG system with inventory, stats, and quest management
 """
 
-import os
-import random
-from termcolor import colored
-from swarm import Swarm, Agent
+import asyncio
+import math
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+import numpy as np
+from swarm import Agent
 from swarm.types import Result
+from _shared import ChatSession, print_stream, cached_run, get_client, read_input_ahead, GREEN, YELLOW, RED, MAGENTA, CYAN, RESET
 
 # Constants
 MODEL = "gpt-4o"
-HISTORY = []
 
 # Game constants
 ITEMS = {
@@ -23,12 +25,36 @@ ITEMS = {
     "magic_scroll": {"type": "consumable", "effect": "magic", "value": 50},
 }
 
+@dataclass(slots=True, frozen=True)
+class Enemy:
+    """Fixed combat stats of an enemy type"""
+    hp: int
+    damage: int
+    xp: int
+
+@dataclass(slots=True)
+class Player:
+    """The player's character, kept in the context as the game goes on"""
+    name: str = ""
+    level: int = 1
+    xp: int = 0
+    hp: int = 100
+    max_hp: int = 100
+    gold: int = 100
+    inventory: List[str] = field(default_factory=lambda: ["health_potion"])
+    equipped: Dict[str, Optional[str]] = field(default_factory=lambda: {"weapon": None, "armor": None})
+
 ENEMIES = {
-    "goblin": {"hp": 30, "damage": 5, "xp": 20},
-    "wolf": {"hp": 25, "damage": 8, "xp": 15},
-    "bandit": {"hp": 40, "damage": 10, "xp": 30},
+    "goblin": Enemy(hp=30, damage=5, xp=20),
+    "wolf": Enemy(hp=25, damage=8, xp=15),
+    "bandit": Enemy(hp=40, damage=10, xp=30),
 }
 
+# Combat stats of the equippable items, looked up once per fight
+WEAPON_DAMAGE = {name: item["damage"] for name, item in ITEMS.items() if "damage" in item}
+ARMOR_DEFENSE = {name: item["defense"] for name, item in ITEMS.items() if "defense" in item}
+UNARMED_DAMAGE = 5
+
 LOCATIONS = {
     "town": ["shop", "inn", "blacksmith"],
     "forest": ["clearing", "cave", "river"],
@@ -37,18 +63,9 @@ LOCATIONS = {
 
 def initialize_game_state() -> Result:
     """Initialize a new game state with default values."""
-    print(colored("\n🎮 Initializing new game state...", "magenta"))
+    print(f"{MAGENTA}\n🎮 Initializing new game state...{RESET}")
     initial_state = {
-        "player": {
-            "name": "",
-            "level": 1,
-            "xp": 0,
-            "hp": 100,
-            "max_hp": 100,
-            "gold": 100,
-            "inventory": ["health_potion"],
-            "equipped": {"weapon": None, "armor": None}
-        },
+        "player": Player(),
         "location": "town",
         "quests": [],
         "discovered_locations": ["town"],
@@ -62,29 +79,20 @@ def initialize_game_state() -> Result:
 
 def check_status(context_variables: dict) -> str:
     """Check the player's current status."""
-    print(colored("\n📊 Checking player status...", "magenta"))
+    print(f"{MAGENTA}\n📊 Checking player status...{RESET}")
     player = context_variables["player"]
     location = context_variables["location"]
     
-    status = f"""
-Current Status:
-Name: {player['name']}
-Level: {player['level']} (XP: {player['xp']})
-HP: {player['hp']}/{player['max_hp']}
-Gold: {player['gold']}
-Location: {location}
-
-Inventory:
-{', '.join(player['inventory'])}
-
-Equipped:
-Weapon: {player['equipped']['weapon'] or 'None'}
-Armor: {player['equipped']['armor'] or 'None'}
-
-Quests: {len(context_variables['quests'])}
-Enemies Defeated: {context_variables['enemies_defeated']}
-Discovered Locations: {', '.join(context_variables['discovered_locations'])}
-"""
+    # This text stays in the history and is resent every turn, so keep it terse
+    name = f"{player.name}, " if player.name else ""
+    status = (
+        f"{name}Level {player.level} (XP {player.xp}), "
+        f"HP {player.hp}/{player.max_hp}, Gold {player.gold}, at {location}\n"
+        f"Inventory: {', '.join(player.inventory) or 'empty'}\n"
+        f"Equipped: {player.equipped['weapon'] or 'no weapon'}, {player.equipped['armor'] or 'no armor'}\n"
+        f"Quests: {len(context_variables['quests'])}, Enemies defeated: {context_variables['enemies_defeated']}\n"
+        f"Discovered: {', '.join(context_variables['discovered_locations'])}"
+    )
     return status
 
 def use_item(context_variables: dict, item_name: str) -> Result:
@@ -93,10 +101,10 @@ def use_item(context_variables: dict, item_name: str) -> Result:
     Args:
         item_name: Name of the item to use
     """
-    print(colored(f"\n🎒 Using item: {item_name}...", "magenta"))
+    print(f"{MAGENTA}\n🎒 Using item: {item_name}...{RESET}")
     player = context_variables["player"]
     
-    if item_name not in player["inventory"]:
+    if item_name not in player.inventory:
         return Result(value=f"You don't have a {item_name} in your inventory.")
     
     if item_name not in ITEMS:
@@ -106,19 +114,19 @@ def use_item(context_variables: dict, item_name: str) -> Result:
     result_msg = ""
     
     if item["type"] == "consumable":
-        player["inventory"].remove(item_name)
+        player.inventory.remove(item_name)
         if item["effect"] == "heal":
             heal_amount = item["value"]
-            player["hp"] = min(player["hp"] + heal_amount, player["max_hp"])
+            player.hp = min(player.hp + heal_amount, player.max_hp)
             result_msg = f"Used {item_name}. Healed for {heal_amount} HP."
         elif item["effect"] == "magic":
             result_msg = f"Used {item_name}. Magical effects applied."
     elif item["type"] in ["weapon", "armor"]:
-        old_item = player["equipped"][item["type"]]
+        old_item = player.equipped[item["type"]]
         if old_item:
-            player["inventory"].append(old_item)
-        player["equipped"][item["type"]] = item_name
-        player["inventory"].remove(item_name)
+            player.inventory.append(old_item)
+        player.equipped[item["type"]] = item_name
+        player.inventory.remove(item_name)
         result_msg = f"Equipped {item_name}."
         if old_item:
             result_msg += f" Unequipped {old_item}."
@@ -134,7 +142,7 @@ def travel_to(context_variables: dict, destination: str) -> Result:
     Args:
         destination: The location to travel to
     """
-    print(colored(f"\n🗺️ Traveling to {destination}...", "magenta"))
+    print(f"{MAGENTA}\n🗺️ Traveling to {destination}...{RESET}")
     if destination not in LOCATIONS:
         return Result(value=f"Cannot travel to {destination}. Location doesn't exist.")
     
@@ -158,54 +166,53 @@ def combat_simulation(context_variables: dict, enemy_type: str) -> Result:
     Args:
         enemy_type: Type of enemy to fight
     """
-    print(colored(f"\n⚔️ Starting combat with {enemy_type}...", "magenta"))
+    print(f"{MAGENTA}\n⚔️ Starting combat with {enemy_type}...{RESET}")
     if enemy_type not in ENEMIES:
         return Result(value=f"Enemy type '{enemy_type}' not found.")
     
     if "player" not in context_variables:
         return Result(value="Error: No player found. Please initialize game first.")
     
-    player = context_variables["player"].copy()  # Create a copy to avoid modifying the original
-    enemy = ENEMIES[enemy_type].copy()
+    # Swarm hands tools their own copy of the context, so the player is updated in place
+    player = context_variables["player"]
+    enemy = ENEMIES[enemy_type]
     combat_log = [f"Combat started with {enemy_type}!"]
     
-    # Calculate player damage
-    weapon = player["equipped"]["weapon"]
-    base_damage = ITEMS[weapon]["damage"] if weapon else 5
+    # Damage on both sides is fixed for the whole fight
+    base_damage = WEAPON_DAMAGE.get(player.equipped["weapon"], UNARMED_DAMAGE)
+    defense = ARMOR_DEFENSE.get(player.equipped["armor"], 0)
+    damage_taken = max(0, enemy.damage - defense)
     
-    # Calculate player defense
-    armor = player["equipped"]["armor"]
-    defense = ITEMS[armor]["defense"] if armor else 0
+    # So the number of rounds follows directly: the player strikes first each
+    # round and the enemy only answers if it survived the blow
+    hits_to_win = math.ceil(enemy.hp / base_damage)
+    hits_to_lose = math.ceil(player.hp / damage_taken) if damage_taken else math.inf
+    won = hits_to_lose >= hits_to_win
+    enemy_hits = hits_to_win - 1 if won else hits_to_lose
     
-    while enemy["hp"] > 0 and player["hp"] > 0:
-        # Player turn
-        damage_dealt = base_damage
-        enemy["hp"] -= damage_dealt
-        combat_log.append(f"You deal {damage_dealt} damage to {enemy_type}")
-        
-        if enemy["hp"] <= 0:
-            break
-        
-        # Enemy turn
-        damage_taken = max(0, enemy["damage"] - defense)
-        player["hp"] -= damage_taken
-        combat_log.append(f"{enemy_type} deals {damage_taken} damage to you")
+    hit = f"You deal {base_damage} damage to {enemy_type}"
+    taken = f"{enemy_type} deals {damage_taken} damage to you"
+    combat_log.extend([hit, taken] * enemy_hits)
+    if won:
+        combat_log.append(hit)
+    player.hp -= enemy_hits * damage_taken
     
     # Combat results
-    if player["hp"] > 0:
-        player["xp"] += enemy["xp"]
-        enemies_defeated = context_variables.get("enemies_defeated", 0) + 1
-        combat_log.append(f"\nVictory! Gained {enemy['xp']} XP")
+    enemies_defeated = context_variables.get("enemies_defeated", 0)
+    if won:
+        player.xp += enemy.xp
+        enemies_defeated += 1
+        combat_log.append(f"\nVictory! Gained {enemy.xp} XP")
         
         # Level up check
-        if player["xp"] >= player["level"] * 100:
-            player["level"] += 1
-            player["max_hp"] += 20
-            player["hp"] = player["max_hp"]
-            combat_log.append(f"Level Up! Now level {player['level']}")
+        if player.xp >= player.level * 100:
+            player.level += 1
+            player.max_hp += 20
+            player.hp = player.max_hp
+            combat_log.append(f"Level Up! Now level {player.level}")
     else:
         combat_log.append("\nDefeat! You have been defeated...")
-        player["hp"] = 1  # Prevent actual death for demo
+        player.hp = 1  # Prevent actual death for demo
     
     # Update context with new player state and enemies defeated
     updated_context = {
@@ -218,9 +225,33 @@ def combat_simulation(context_variables: dict, enemy_type: str) -> Result:
         context_variables=updated_context
     )
 
+def simulate_many(enemy_type: str, player_hp, base_damage=UNARMED_DAMAGE, defense=0):
+    """Resolve many fights against one enemy type at once, for balancing
+
+    Follows the same rules as combat_simulation (minus levelling up), with
+    player_hp, base_damage and defense given as arrays or scalars that are
+    broadcast together. Returns (won, hp_left, xp_gained) arrays, e.g.
+    simulate_many("bandit", np.arange(1, 101), 15, 10) over every starting HP.
+    """
+    enemy = ENEMIES[enemy_type]
+    player_hp = np.asarray(player_hp)
+    damage_taken = np.maximum(0, enemy.damage - np.asarray(defense))
+    hits_to_win = np.ceil(enemy.hp / np.asarray(base_damage))
+    # No damage taken means the player can never lose: x / 0 gives inf
+    with np.errstate(divide="ignore"):
+        hits_to_lose = np.ceil(player_hp / damage_taken)
+    won = hits_to_lose >= hits_to_win
+    hp_left = np.where(won, player_hp - (hits_to_win - 1) * damage_taken, 1).astype(int)
+    return won, hp_left, enemy.xp * won
+
+# Colored text shown on every turn
+YOU_PROMPT = f"{YELLOW}\nYou: {RESET}"
+EXIT_TEXT = f"{RED}\nEnding game...{RESET}"
+THINKING_TEXT = f"{CYAN}\nGame Master is responding...{RESET}"
+
 # Initialize Swarm client
-print(colored("Initializing Swarm client...", "cyan"))
-client = Swarm()
+print(f"{CYAN}Initializing Swarm client...{RESET}")
+client = get_client()
 
 # Create game master agent
 game_master = Agent(
@@ -248,53 +279,54 @@ game_master = Agent(
     ]
 )
 
-def chat_loop():
-    global HISTORY
-    context = None  # Will be initialized when game starts
+def new_session() -> ChatSession:
+    """A fresh conversation; the game state arrives with initialize_game_state"""
+    return ChatSession(game_master)
+
+async def chat_loop():
+    session = new_session()
     
-    print(colored("\nRPG Adventure System started! Type 'exit' to end.", "green"))
-    print(colored("Type 'start' to begin a new game", "cyan"))
-    print(colored("Available commands:\n- check status\n- use [item]\n- travel to [location]\n- fight [enemy]", "cyan"))
+    print(f"{GREEN}\nRPG Adventure System started! Type 'exit' to end.{RESET}")
+    print(f"{CYAN}Type 'start' to begin a new game{RESET}")
+    print(f"{CYAN}Available commands:\n- check status\n- use [item]\n- travel to [location]\n- fight [enemy]{RESET}")
     
+    # Lines typed while a reply is on its way wait here for their turn
+    inbox = read_input_ahead()
     while True:
         # Get user input
-        user_input = input(colored("\nYou: ", "yellow"))
+        print(YOU_PROMPT, end="", flush=True)
+        user_input = await inbox.get()
         
         if user_input.lower() == 'exit':
-            print(colored("\nEnding game...", "red"))
+            print(EXIT_TEXT)
             break
 
         # Add user message to history
-        HISTORY.append({"role": "user", "content": user_input})
+        session.add_user_message(user_input)
 
         try:
             # Get response from game master
-            print(colored("\nGame Master is responding...", "cyan"))
-            response = client.run(
-                agent=game_master,
-                messages=HISTORY,
-                context_variables=context if context is not None else {}
-            )
+            print(THINKING_TEXT)
+            # Every tool here is deterministic, so a turn with the same history and
+            # state always plays out the same way and can be replayed from cache
+            response = await asyncio.to_thread(lambda: print_stream(cached_run(
+                client,
+                agent=session.agent,
+                messages=list(session.history),
+                context_variables=session.context,
+                stream=True
+            ), "Game Master: "))
 
-            # Update context with any changes
-            if response.context_variables:
-                if context is None:
-                    context = {}
-                context.update(response.context_variables)
+            # Update context and history with the response
+            session.apply(response)
             
-            # Update history with agent's response
-            HISTORY.extend(response.messages)
-            
-            # Print game master's response
-            print(colored(f"\nGame Master: {response.messages[-1]['content']}", "green"))
-
         except Exception as e:
-            print(colored(f"\nError: {str(e)}", "red"))
+            print(f"{RED}\nError: {str(e)}{RESET}")
 
 if __name__ == "__main__":
     try:
-        chat_loop()
+        asyncio.run(chat_loop())
     except KeyboardInterrupt:
-        print(colored("\nGame ended by user.", "yellow"))
+        print(f"{YELLOW}\nGame ended by user.{RESET}")
     except Exception as e:
-        print(colored(f"\nUnexpected error: {str(e)}", "red")) 
\ No newline at end of file
+        print(f"{RED}\nUnexpected error: {str(e)}{RESET}") 
\ No newline at end of file
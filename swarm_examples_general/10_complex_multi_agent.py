@@ -5,16 +5,22 @@
 # Implements a virtual company with different departments and roles
 """
 
+import asyncio
+import itertools
+import json
 import os
-import time
-from termcolor import colored
-from swarm import Swarm, Agent
+import re
+import sqlite3
+import threading
+from collections import deque
+from functools import lru_cache
+from swarm import Agent
 from swarm.types import Result
+from _shared import trim_history, get_client, warm_up, SemanticCache, print_stream, read_input_ahead, tool_log, GREEN, YELLOW, RED, CYAN, RESET
 
 # Constants
 MODEL = "gpt-4o"
 FAST_MODEL = "gpt-4o-mini"
-HISTORY = []
 
 # Company database simulation
 PRODUCTS = {
@@ -24,15 +30,96 @@ PRODUCTS = {
     "chair": {"price": 199.99, "stock": 45, "category": "furniture"}
 }
 
+# Each department's staff, next in line for a ticket first
 EMPLOYEES = {
-    "sales": ["John", "Alice"],
-    "support": ["Bob", "Carol"],
-    "technical": ["Dave", "Eve"],
-    "management": ["Frank"]
+    "sales": deque(["John", "Alice"]),
+    "support": deque(["Bob", "Carol"]),
+    "technical": deque(["Dave", "Eve"]),
+    "management": deque(["Frank"])
 }
+EMPLOYEE_DEPARTMENT = {name: department for department, names in EMPLOYEES.items() for name in names}
+# Tickets currently assigned to each department, kept up to date by assign_ticket
+DEPARTMENT_TICKETS = dict.fromkeys(EMPLOYEES, 0)
+
+# Reply templates for the lookup tools, filled straight from the records.
+# Kept to one line each: the replies stay in the history and are resent with
+# every later turn, so padding here is paid for again and again
+PRODUCT_TEMPLATE = "Product: {name}; Price: ${price}; Stock: {stock}; Category: {category}"
+ORDER_TEMPLATE = (
+    "Order {order_id}: {quantity}x {product}; Total: ${total_price:.2f}; "
+    "Status: {status}; Customer: {customer_name}"
+)
+TICKET_TEMPLATE = (
+    "Ticket {ticket_id}: {issue}; Priority: {priority}; Status: {status}; "
+    "Customer: {customer_name}; Assigned to: {assigned}"
+)
+DEPARTMENT_TEMPLATE = "Department: {department}; Employees: {employees}; Active tickets: {tickets}"
 
 TICKETS = {}  # Will store support tickets
 ORDERS = {}   # Will store orders
+# The client runs a turn's tool calls side by side; the read-only tools can,
+# but tools that change the data above take turns. Orders (and the stock they
+# draw down) and tickets (with their assignments) never touch each other's
+# data, so each has its own lock and an order never waits on a ticket
+ORDER_LOCK = threading.Lock()
+TICKET_LOCK = threading.Lock()
+
+# Optional on-disk copy of the data above that survives restarts; set
+# COMPANY_DB=<path> to enable. The dicts stay the working copy, so lookups
+# never touch the disk and only changes are written through
+COMPANY_DB_PATH = os.environ.get("COMPANY_DB")
+
+def open_company_db():
+    """Open the company database and load what it holds into the dicts above"""
+    if not COMPANY_DB_PATH:
+        return None
+    db = sqlite3.connect(COMPANY_DB_PATH, check_same_thread=False)
+    for table in ("stock", "orders", "tickets"):
+        db.execute(f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, record TEXT)")
+    for key, record in db.execute("SELECT key, record FROM stock"):
+        if key in PRODUCTS:
+            PRODUCTS[key]["stock"] = json.loads(record)
+    ORDERS.update((int(key), json.loads(record)) for key, record in db.execute("SELECT key, record FROM orders"))
+    TICKETS.update((int(key), json.loads(record)) for key, record in db.execute("SELECT key, record FROM tickets"))
+    for ticket in TICKETS.values():
+        if ticket["assigned_to"] in EMPLOYEE_DEPARTMENT:
+            DEPARTMENT_TICKETS[EMPLOYEE_DEPARTMENT[ticket["assigned_to"]]] += 1
+    return db
+
+company_db = open_company_db()
+# Next free IDs, picking up after any records loaded from the database
+NEXT_ORDER_ID = itertools.count(max(ORDERS, default=0) + 1)
+NEXT_TICKET_ID = itertools.count(max(TICKETS, default=0) + 1)
+
+# One connection serves both locks above, so its transactions take turns too
+DB_LOCK = threading.Lock()
+
+# Bumped whenever create_order changes PRODUCTS or ORDERS; the cached replies
+# below are keyed by it, so a change simply makes the old entries unreachable
+DATA_VERSION = {"products": 0, "orders": 0}
+
+def save_records(**tables):
+    """Write changed records through to the company database, if there is one"""
+    if company_db is None:
+        return
+    with DB_LOCK, company_db:
+        for table, records in tables.items():
+            company_db.executemany(
+                f"INSERT OR REPLACE INTO {table} VALUES (?, ?)",
+                [(str(key), json.dumps(record)) for key, record in records.items()]
+            )
+
+@lru_cache(maxsize=256)
+def product_reply(product_name: str, version: int) -> str:
+    if product_name not in PRODUCTS:
+        return f"Product '{product_name}' not found."
+    return PRODUCT_TEMPLATE.format(name=product_name, **PRODUCTS[product_name])
+
+@lru_cache(maxsize=256)
+def order_reply(order_id: int, version: int) -> str:
+    if order_id not in ORDERS:
+        return f"Order {order_id} not found."
+    return ORDER_TEMPLATE.format(order_id=order_id, **ORDERS[order_id])
 
 def check_product_info(product_name: str) -> str:
     """Get information about a product.
@@ -40,17 +127,8 @@ def check_product_info(product_name: str) -> str:
     Args:
         product_name: Name of the product
     """
-    print(colored(f"\n📦 Checking product info: {product_name}...", "magenta"))
-    if product_name not in PRODUCTS:
-        return f"Product '{product_name}' not found."
-    
-    product = PRODUCTS[product_name]
-    return f"""
-Product: {product_name}
-Price: ${product['price']}
-Stock: {product['stock']} units
-Category: {product['category']}
-"""
+    tool_log.info("📦 Checking product info: %s...", product_name)
+    return product_reply(product_name, DATA_VERSION["products"])
 
 def create_order(context_variables: dict, product_name: str, quantity: int) -> Result:
     """Create a new order.
@@ -59,7 +137,7 @@ def create_order(context_variables: dict, product_name: str, quantity: int) -> R
         product_name: Name of the product
         quantity: Quantity to order
     """
-    print(colored(f"\n🛍️ Creating order: {quantity}x {product_name}...", "magenta"))
+    tool_log.info("🛍️ Creating order: %sx %s...", quantity, product_name)
     if product_name not in PRODUCTS:
         return Result(value=f"Product '{product_name}' not found.")
     
@@ -67,25 +145,29 @@ def create_order(context_variables: dict, product_name: str, quantity: int) -> R
         return Result(value="Quantity must be positive.")
     
     product = PRODUCTS[product_name]
-    if quantity > product["stock"]:
-        return Result(value=f"Insufficient stock. Only {product['stock']} units available.")
-    
-    order_id = len(ORDERS) + 1
-    total_price = product["price"] * quantity
-    
-    ORDERS[order_id] = {
-        "product": product_name,
-        "quantity": quantity,
-        "total_price": total_price,
-        "status": "pending",
-        "customer_name": context_variables.get("customer_name", "Unknown")
-    }
-    
-    # Update stock
-    PRODUCTS[product_name]["stock"] -= quantity
+    with ORDER_LOCK:
+        if quantity > product["stock"]:
+            return Result(value=f"Insufficient stock. Only {product['stock']} units available.")
+        
+        order_id = next(NEXT_ORDER_ID)
+        total_price = product["price"] * quantity
+        
+        ORDERS[order_id] = {
+            "product": product_name,
+            "quantity": quantity,
+            "total_price": total_price,
+            "status": "pending",
+            "customer_name": context_variables.get("customer_name", "Unknown")
+        }
+        
+        # Update stock
+        PRODUCTS[product_name]["stock"] -= quantity
+        DATA_VERSION["products"] += 1
+        DATA_VERSION["orders"] += 1
+        save_records(orders={order_id: ORDERS[order_id]}, stock={product_name: product["stock"]})
     
     return Result(
-        value=f"Order created successfully!\nOrder ID: {order_id}\nTotal: ${total_price:.2f}",
+        value=f"Order {order_id} created; Total: ${total_price:.2f}",
         context_variables={"last_order_id": order_id}
     )
 
@@ -95,19 +177,8 @@ def check_order_status(order_id: int) -> str:
     Args:
         order_id: The order ID to check
     """
-    print(colored(f"\n🔍 Checking order status #{order_id}...", "magenta"))
-    if order_id not in ORDERS:
-        return f"Order {order_id} not found."
-    
-    order = ORDERS[order_id]
-    return f"""
-Order ID: {order_id}
-Product: {order['product']}
-Quantity: {order['quantity']}
-Total Price: ${order['total_price']:.2f}
-Status: {order['status']}
-Customer: {order['customer_name']}
-"""
+    tool_log.info("🔍 Checking order status #%s...", order_id)
+    return order_reply(order_id, DATA_VERSION["orders"])
 
 def create_support_ticket(context_variables: dict, issue: str, priority: str) -> Result:
     """Create a new support ticket.
@@ -116,21 +187,23 @@ def create_support_ticket(context_variables: dict, issue: str, priority: str) ->
         issue: Description of the issue
         priority: Ticket priority (low, medium, high)
     """
-    print(colored(f"\n🎫 Creating support ticket: {priority} priority...", "magenta"))
+    tool_log.info("🎫 Creating support ticket: %s priority...", priority)
     if priority.lower() not in ["low", "medium", "high"]:
         return Result(value="Invalid priority. Use: low, medium, or high")
     
-    ticket_id = len(TICKETS) + 1
-    TICKETS[ticket_id] = {
-        "issue": issue,
-        "priority": priority.lower(),
-        "status": "open",
-        "customer_name": context_variables.get("customer_name", "Unknown"),
-        "assigned_to": None
-    }
+    with TICKET_LOCK:
+        ticket_id = next(NEXT_TICKET_ID)
+        TICKETS[ticket_id] = {
+            "issue": issue,
+            "priority": priority.lower(),
+            "status": "open",
+            "customer_name": context_variables.get("customer_name", "Unknown"),
+            "assigned_to": None
+        }
+        save_records(tickets={ticket_id: TICKETS[ticket_id]})
     
     return Result(
-        value=f"Support ticket created.\nTicket ID: {ticket_id}\nPriority: {priority}",
+        value=f"Ticket {ticket_id} created; Priority: {priority}",
         context_variables={"last_ticket_id": ticket_id}
     )
 
@@ -140,19 +213,12 @@ def check_ticket_status(ticket_id: int) -> str:
     Args:
         ticket_id: The ticket ID to check
     """
-    print(colored(f"\n🔍 Checking ticket status #{ticket_id}...", "magenta"))
+    tool_log.info("🔍 Checking ticket status #%s...", ticket_id)
     if ticket_id not in TICKETS:
         return f"Ticket {ticket_id} not found."
     
     ticket = TICKETS[ticket_id]
-    return f"""
-Ticket ID: {ticket_id}
-Issue: {ticket['issue']}
-Priority: {ticket['priority']}
-Status: {ticket['status']}
-Customer: {ticket['customer_name']}
-Assigned to: {ticket['assigned_to'] or 'Unassigned'}
-"""
+    return TICKET_TEMPLATE.format(ticket_id=ticket_id, assigned=ticket["assigned_to"] or "Unassigned", **ticket)
 
 def assign_ticket(ticket_id: int, department: str) -> Result:
     """Assign a ticket to a department.
@@ -161,7 +227,7 @@ def assign_ticket(ticket_id: int, department: str) -> Result:
         ticket_id: The ticket ID to assign
         department: Department to assign to
     """
-    print(colored(f"\n👥 Assigning ticket #{ticket_id} to {department} department...", "magenta"))
+    tool_log.info("👥 Assigning ticket #%s to %s department...", ticket_id, department)
     if ticket_id not in TICKETS:
         return Result(value=f"Ticket {ticket_id} not found.")
     
@@ -169,10 +235,16 @@ def assign_ticket(ticket_id: int, department: str) -> Result:
         return Result(value=f"Department '{department}' not found.")
     
     # Simple round-robin assignment
-    assigned_to = EMPLOYEES[department][0]
-    EMPLOYEES[department].append(EMPLOYEES[department].pop(0))
-    
-    TICKETS[ticket_id]["assigned_to"] = assigned_to
+    with TICKET_LOCK:
+        assigned_to = EMPLOYEES[department][0]
+        EMPLOYEES[department].rotate(-1)
+        
+        previous = TICKETS[ticket_id]["assigned_to"]
+        if previous is not None:
+            DEPARTMENT_TICKETS[EMPLOYEE_DEPARTMENT[previous]] -= 1
+        DEPARTMENT_TICKETS[department] += 1
+        TICKETS[ticket_id]["assigned_to"] = assigned_to
+        save_records(tickets={ticket_id: TICKETS[ticket_id]})
     
     return Result(
         value=f"Ticket {ticket_id} assigned to {assigned_to} from {department} department."
@@ -184,22 +256,29 @@ def get_department_status(department: str) -> str:
     Args:
         department: Name of the department
     """
-    print(colored(f"\n📊 Checking {department} department status...", "magenta"))
+    tool_log.info("📊 Checking %s department status...", department)
     if department not in EMPLOYEES:
         return f"Department '{department}' not found."
     
-    # Count assigned tickets
-    assigned_tickets = sum(1 for t in TICKETS.values() if t["assigned_to"] in EMPLOYEES[department])
-    
-    return f"""
-Department: {department}
-Employees: {', '.join(EMPLOYEES[department])}
-Active tickets: {assigned_tickets}
-"""
+    return DEPARTMENT_TEMPLATE.format(
+        department=department,
+        employees=", ".join(EMPLOYEES[department]),
+        tickets=DEPARTMENT_TICKETS[department]
+    )
+
+# Colored text shown on every turn
+YOU_PROMPT = f"{YELLOW}\nYou: {RESET}"
+EXIT_TEXT = f"{RED}\nEnding session...{RESET}"
 
 # Initialize Swarm client
-print(colored("Initializing Swarm client...", "cyan"))
-client = Swarm()
+print(f"{CYAN}Initializing Swarm client...{RESET}")
+client = get_client()
+# Every tool reads or changes the company data, so only replies that called
+# none of them (small talk, general questions) are reused for reworded repeats
+answers = SemanticCache(client, volatile_tools=[
+    "check_product_info", "create_order", "check_order_status", "create_support_ticket",
+    "check_ticket_status", "assign_ticket", "get_department_status"
+])
 
 # Create specialized agents
 receptionist = Agent(
@@ -258,27 +337,27 @@ management_agent = Agent(
 # Create transfer functions
 def transfer_to_sales() -> Result:
     """Transfer to sales department."""
-    print(colored("\n🔄 Transferring to sales department...", "yellow"))
+    print(f"{YELLOW}\n🔄 Transferring to sales department...{RESET}")
     return Result(value="Transferring to sales...", agent=sales_agent)
 
 def transfer_to_support() -> Result:
     """Transfer to support department."""
-    print(colored("\n🔄 Transferring to support department...", "yellow"))
+    print(f"{YELLOW}\n🔄 Transferring to support department...{RESET}")
     return Result(value="Transferring to support...", agent=support_agent)
 
 def transfer_to_technical() -> Result:
     """Transfer to technical department."""
-    print(colored("\n🔄 Transferring to technical support...", "yellow"))
+    print(f"{YELLOW}\n🔄 Transferring to technical support...{RESET}")
     return Result(value="Transferring to technical support...", agent=technical_agent)
 
 def transfer_to_management() -> Result:
     """Transfer to management."""
-    print(colored("\n🔄 Transferring to management...", "yellow"))
+    print(f"{YELLOW}\n🔄 Transferring to management...{RESET}")
     return Result(value="Transferring to management...", agent=management_agent)
 
 def transfer_to_receptionist() -> Result:
     """Transfer back to receptionist."""
-    print(colored("\n🔄 Transferring back to reception...", "yellow"))
+    print(f"{YELLOW}\n🔄 Transferring back to reception...{RESET}")
     return Result(value="Transferring back to reception...", agent=receptionist)
 
 # Add transfer functions to each agent
@@ -299,61 +378,175 @@ management_agent.functions.extend([
     transfer_to_receptionist
 ])
 
-def chat_loop():
-    global HISTORY
+# Each department first tries the fast model with the same instructions and
+# tools; most turns only pick a tool and fill in its arguments
+DEPARTMENTS = (sales_agent, support_agent, technical_agent, management_agent)
+FAST_TWINS = {agent.name: agent.model_copy(update={"model": FAST_MODEL}) for agent in DEPARTMENTS}
+FULL_AGENTS = {agent.name: agent for agent in DEPARTMENTS}
+# A fast reply with no tool calls that runs longer than this was doing real
+# reasoning, so the turn is rerun on the full model
+ESCALATE_CHARS = 160
+
+def print_fast_stream(stream):
+    """Print a fast-model turn, or stop it and return None if it needs the full model
+
+    Only turns that call no tools are escalated, so rerunning one never
+    repeats an order, ticket or assignment. The reply is held back until a
+    tool call shows up, it ends, or it grows past ESCALATE_CHARS, so an
+    escalated draft is never shown.
+    """
+    held = []
+    chars = 0
+    for chunk in stream:
+        held.append(chunk)
+        if chunk.get("tool_calls"):
+            break
+        chars += len(chunk.get("content") or "")
+        if chars > ESCALATE_CHARS:
+            stream.close()
+            return None
+    return print_stream(itertools.chain(held, stream))
+
+# Requests the receptionist would obviously pass on go straight to that
+# department; earlier patterns win, and anything unclear stays at reception
+ROUTES = (
+    (re.compile(r"\b(escalat|manager|management)", re.IGNORECASE), management_agent),
+    (re.compile(r"\b(refund|complain|complaint|ticket)", re.IGNORECASE), support_agent),
+    (re.compile(r"\b(broken|crash|bug|error|install)", re.IGNORECASE), technical_agent),
+    (re.compile(r"\b(order|buy|purchase|price|product|stock)", re.IGNORECASE), sales_agent)
+)
+
+def route(user_input: str):
+    """Pick the department for a request by its wording, or None if it isn't clear"""
+    for pattern, agent in ROUTES:
+        if pattern.search(user_input):
+            return agent
+    return None
+
+# Summarizes the turns that slide out of the history window
+summarizer = Agent(
+    name="Summarizer",
+    model=FAST_MODEL,
+    instructions="""You keep a running summary of a customer conversation.
+    Merge the earlier summary with the new transcript into a few sentences.
+    Keep the customer's name, products, order and ticket IDs and open requests."""
+)
+
+def summarize_dropped(summary: str, history: list) -> str:
+    """Trim history in place and fold the turns it dropped into summary"""
+    before = list(history)
+    trim_history(history)
+    dropped = before[:len(before) - len(history)]
+    transcript = "\n".join(
+        f"{message.get('sender') or message['role']}: {message['content']}"
+        for message in dropped
+        if message.get("content")
+    )
+    if not transcript:
+        return summary
+    try:
+        response = client.run(
+            agent=summarizer,
+            messages=[{"role": "user", "content": f"Earlier summary: {summary or 'none'}\n\nTranscript:\n{transcript}"}]
+        )
+        return response.messages[-1].get("content") or summary
+    except Exception:
+        # Losing the summary isn't worth failing the turn over
+        return summary
+
+def run_turn(agent, messages: list, context: dict):
+    """Answer one turn, fast model first where there is one, printing as it streams"""
+    fast_agent = FAST_TWINS.get(agent.name)
+    response = None
+    if fast_agent is not None:
+        response = print_fast_stream(answers.run(
+            agent=fast_agent,
+            messages=messages,
+            context_variables=context,
+            stream=True
+        ))
+    if response is None:
+        response = print_stream(answers.run(
+            agent=agent,
+            messages=messages,
+            context_variables=context,
+            stream=True
+        ))
+    return response
+
+async def chat_loop():
+    history = []  # This session's recent messages
+    summary = ""  # What was said before those
     current_agent = receptionist
     context = {"customer_name": ""}
     
-    print(colored("\nVirtual Company System started! Type 'exit' to end.", "green"))
-    print(colored("You're speaking with our receptionist.", "cyan"))
-    print(colored("Available departments:\n- Sales\n- Support\n- Technical Support\n- Management", "cyan"))
+    print(f"{GREEN}\nVirtual Company System started! Type 'exit' to end.{RESET}")
+    print(f"{CYAN}You're speaking with our receptionist.{RESET}")
+    print(f"{CYAN}Available departments:\n- Sales\n- Support\n- Technical Support\n- Management{RESET}")
+    
+    # Lines typed while a reply is on its way wait here for their turn
+    inbox = read_input_ahead()
+    # Done while the customer types their name
+    warm_up(client, [receptionist, summarizer, *DEPARTMENTS, *FAST_TWINS.values()])
     
     # Get customer name
-    user_input = input(colored("\nReceptionist: Welcome! May I have your name? ", "green"))
+    print(f"{GREEN}\nReceptionist: Welcome! May I have your name? {RESET}", end="", flush=True)
+    user_input = await inbox.get()
     context["customer_name"] = user_input
-    HISTORY.append({"role": "user", "content": user_input})
+    history.append({"role": "user", "content": user_input})
     
     while True:
         # Get user input
-        user_input = input(colored("\nYou: ", "yellow"))
+        print(YOU_PROMPT, end="", flush=True)
+        user_input = await inbox.get()
         
         if user_input.lower() == 'exit':
-            print(colored("\nEnding session...", "red"))
+            print(EXIT_TEXT)
             break
 
         # Add user message to history
-        HISTORY.append({"role": "user", "content": user_input})
+        history.append({"role": "user", "content": user_input})
+
+        # Skip the receptionist's transfer call when the department is obvious
+        if current_agent is receptionist:
+            routed = route(user_input)
+            if routed is not None:
+                current_agent = routed
+                print(f"{YELLOW}\nTransferred to {current_agent.name}{RESET}")
 
         try:
+            # Older turns are sent as a short summary instead of in full
+            summary = await asyncio.to_thread(summarize_dropped, summary, history)
+            messages = history
+            if summary:
+                messages = [{"role": "system", "content": f"Conversation so far: {summary}"}] + history
+            # Customer details change from turn to turn, so they go last where they
+            # don't disturb the cached prefix; the message itself never enters history
+            details = json.dumps(context, separators=(",", ":"))
+            messages = messages + [{"role": "system", "content": f"Customer details: {details}"}]
+
             # Get response from current agent
-            print(colored(f"\n{current_agent.name} is responding...", "cyan"))
-            response = client.run(
-                agent=current_agent,
-                messages=HISTORY,
-                context_variables=context
-            )
+            print(f"{CYAN}\n{current_agent.name} is responding...{RESET}")
+            response = await asyncio.to_thread(run_turn, current_agent, messages, context)
 
             # Update context with any changes
             context.update(response.context_variables)
             
             # Update history with agent's response
-            HISTORY.extend(response.messages)
-            
-            # Check if agent changed
-            if response.agent and response.agent != current_agent:
-                current_agent = response.agent
-                print(colored(f"\nTransferred to {current_agent.name}", "yellow"))
+            history.extend(response.messages)
             
-            # Print agent's response
-            print(colored(f"\n{current_agent.name}: {response.messages[-1]['content']}", "green"))
+            # Check if agent changed; a fast twin stands for its full agent
+            if response.agent and response.agent.name != current_agent.name:
+                current_agent = FULL_AGENTS.get(response.agent.name, response.agent)
+                print(f"{YELLOW}\nTransferred to {current_agent.name}{RESET}")
 
         except Exception as e:
-            print(colored(f"\nSystem Error: {str(e)}", "red"))
+            print(f"{RED}\nSystem Error: {str(e)}{RESET}")
 
 if __name__ == "__main__":
     try:
-        chat_loop()
+        asyncio.run(chat_loop())
     except KeyboardInterrupt:
-        print(colored("\nSession ended by user.", "yellow"))
+        print(f"{YELLOW}\nSession ended by user.{RESET}")
     except Exception as e:
-        print(colored(f"\nUnexpected error: {str(e)}", "red")) 
\ No newline at end of file
+        print(f"{RED}\nUnexpected error: {str(e)}{RESET}") 
\ No newline at end of file
@@ -0,0 +1,704 @@
+"""
+# Shared helpers for the general examples
+# Replays a reply from cache when the exact same turn comes up again
+# Runs the independent tool calls of one turn side by side
+# Keeps the history sent with each request to a sliding window
+# Builds the one pooled HTTP/2 client every example shares
+# Sends each tool's schema in a compact form derived once per function
+# ANSI color constants for printing without termcolor
+# Lazily formatted logger for tool diagnostics
+# Async chat loop helpers: read-ahead input and streams drained in a thread
+# Answers reworded repeats of a question from an embedding cache
+# Per-user chat sessions holding the current agent, history and context
+# Warms the tokenizer, tool lists and connection before the first turn
+"""
+
+import asyncio
+import hashlib
+import inspect
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import httpx
+import numpy as np
+import tiktoken
+from openai import OpenAI
+from swarm import Swarm
+from swarm.core import __CTX_VARS_NAME__
+from swarm.types import Response
+from swarm.util import function_to_json, debug_print
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+# ANSI color codes, left empty when output is not a terminal (same rules as termcolor)
+_USE_COLOR = "FORCE_COLOR" in os.environ or (
+    "NO_COLOR" not in os.environ and sys.stdout.isatty()
+)
+GREEN = "\033[32m" if _USE_COLOR else ""
+YELLOW = "\033[33m" if _USE_COLOR else ""
+RED = "\033[31m" if _USE_COLOR else ""
+MAGENTA = "\033[35m" if _USE_COLOR else ""
+CYAN = "\033[36m" if _USE_COLOR else ""
+RESET = "\033[0m" if _USE_COLOR else ""
+
+class ColoredFormatter(logging.Formatter):
+    """Print tool diagnostics in magenta on their own line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        return f"{MAGENTA}\n{super().format(record)}{RESET}"
+
+class _BufferedStreamHandler(logging.StreamHandler):
+    # Leave flushing to the stream, which is line buffered on a terminal and
+    # block buffered when piped, instead of forcing a write per record
+    def flush(self):
+        pass
+
+# Tool functions log here instead of printing, so LOGLEVEL=WARNING mutes them
+tool_log = logging.getLogger("swarm.tools")
+if not tool_log.handlers:
+    _handler = _BufferedStreamHandler(sys.stdout)
+    _handler.setFormatter(ColoredFormatter())
+    tool_log.addHandler(_handler)
+    tool_log.setLevel(os.environ.get("LOGLEVEL", "INFO").upper())
+    tool_log.propagate = False
+
+_STREAM_END = object()
+
+# Embedding model, and the cosine similarity at which two questions count as the same
+EMBEDDING_MODEL = "text-embedding-3-small"
+SIMILARITY_THRESHOLD = 0.95
+# Questions kept by a SemanticCache; the least recently used one is dropped first
+SEMANTIC_CACHE_SIZE = 512
+# With hnswlib installed, a cache this full switches from a flat scan to an HNSW index,
+# fetching a few neighbours per query to find one that belongs to the same agent
+HNSW_MIN_ENTRIES = 1024
+HNSW_NEIGHBOURS = 8
+
+# Cached turns kept in memory; the least recently used one is dropped first
+RESPONSE_CACHE_SIZE = 256
+# Optional on-disk copy shared across runs; set LLM_CACHE=<path> to enable
+RESPONSE_CACHE_PATH = os.environ.get("LLM_CACHE")
+
+# Most user turns, and tokens, of history sent with each request
+MAX_TURNS = 20
+MAX_HISTORY_TOKENS = 4000
+# Once over a limit, history is cut down to this share of it rather than
+# just under it, so the next turns resend the same prefix and keep hitting
+# the server's prompt cache instead of shifting it by a turn every time
+TRIM_TARGET = 0.5
+
+# Connections the shared client keeps open, and how long an idle one lives
+MAX_CONNECTIONS = 32
+KEEPALIVE_EXPIRY = 60
+
+# Worker threads shared by every ParallelSwarm
+TOOL_WORKERS = 8
+_tool_pool = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="swarm-tool")
+
+_memory: "OrderedDict[str, Tuple[object, bytes]]" = OrderedDict()
+_disk = None
+_disk_lock = threading.Lock()
+
+def _open_disk():
+    global _disk
+    if _disk is None and RESPONSE_CACHE_PATH:
+        _disk = sqlite3.connect(RESPONSE_CACHE_PATH, check_same_thread=False)
+        _disk.execute("CREATE TABLE IF NOT EXISTS replies (key TEXT PRIMARY KEY, reply BLOB)")
+    return _disk
+
+def cache_key(agent, messages: list, context_variables: Optional[dict]) -> str:
+    """Hash of everything that decides a turn's reply"""
+    payload = json.dumps(
+        {"model": agent.model, "name": agent.name, "messages": messages, "ctx": context_variables},
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+@lru_cache(maxsize=1)
+def _encoding():
+    return tiktoken.encoding_for_model("gpt-4o")
+
+@lru_cache(maxsize=4096)
+def _text_tokens(text: str) -> int:
+    return len(_encoding().encode(text))
+
+def count_tokens(message: dict) -> int:
+    """Approximate the prompt tokens used by one chat message"""
+    tokens = _text_tokens(message.get("content") or "")
+    for tool_call in message.get("tool_calls") or ():
+        tokens += _text_tokens(tool_call["function"]["arguments"])
+    # Each message carries a few tokens of framing on top of its content
+    return tokens + 4
+
+def trim_history(history: list, max_turns: int = MAX_TURNS, max_tokens: int = MAX_HISTORY_TOKENS) -> list:
+    """Drop the oldest turns in place once history goes over either limit
+
+    Trims down to TRIM_TARGET of the limits. Cuts only at user messages so
+    tool results never lose their tool call, and always keeps the latest
+    turn even if it alone is over budget.
+    """
+    sizes = [count_tokens(message) for message in history]
+    remaining = sum(sizes)
+    turns = sum(1 for message in history if message.get("role") == "user")
+    if turns <= max_turns and remaining <= max_tokens:
+        return history
+    max_turns = max(1, int(max_turns * TRIM_TARGET))
+    max_tokens = int(max_tokens * TRIM_TARGET)
+    cut = 0
+    for i, message in enumerate(history):
+        if message.get("role") == "user":
+            cut = i
+            if turns <= max_turns and remaining <= max_tokens:
+                break
+            turns -= 1
+        remaining -= sizes[i]
+    if cut:
+        del history[:cut]
+    return history
+
+class TrimmedHistory:
+    """Chat history that drops its oldest turns as new messages arrive
+
+    Follows the same limits and user-message cut points as trim_history,
+    but keeps a running token count, so each turn only costs the tokens of
+    its new messages instead of a pass over the whole history.
+    """
+
+    def __init__(self, max_turns: int = MAX_TURNS, max_tokens: int = MAX_HISTORY_TOKENS):
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self._messages = deque()
+        self._sizes = deque()
+        self.tokens = 0
+        self.turns = 0
+
+    def append(self, message: dict):
+        self._add(message)
+        self._trim()
+
+    def extend(self, messages: list):
+        for message in messages:
+            self._add(message)
+        self._trim()
+
+    def _add(self, message: dict):
+        size = count_tokens(message)
+        self._messages.append(message)
+        self._sizes.append(size)
+        self.tokens += size
+        if message.get("role") == "user":
+            self.turns += 1
+
+    def _pop(self):
+        message = self._messages.popleft()
+        self.tokens -= self._sizes.popleft()
+        if message.get("role") == "user":
+            self.turns -= 1
+
+    def _trim(self):
+        if self.turns <= self.max_turns and self.tokens <= self.max_tokens:
+            return
+        # Drop whole turns from the front down to TRIM_TARGET of the limits,
+        # always keeping the latest one
+        max_turns = max(1, int(self.max_turns * TRIM_TARGET))
+        max_tokens = int(self.max_tokens * TRIM_TARGET)
+        while self.turns > 1 and (self.turns > max_turns or self.tokens > max_tokens):
+            self._pop()
+            while self._messages and self._messages[0].get("role") != "user":
+                self._pop()
+
+    def __iter__(self):
+        return iter(self._messages)
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+class ChatSession:
+    """One user's conversation: the current agent, the recent history and the context
+
+    Sessions hold no client, so any number of them can run side by side
+    over the one shared client from get_client().
+    """
+
+    __slots__ = ("agent", "history", "context")
+
+    def __init__(self, agent, context_variables: Optional[dict] = None):
+        self.agent = agent
+        self.history = TrimmedHistory()
+        self.context = context_variables if context_variables is not None else {}
+
+    def add_user_message(self, text: str):
+        self.history.append({"role": "user", "content": text})
+
+    def apply(self, response: Response):
+        """Take on a finished turn's context, agent and messages"""
+        self.context.update(response.context_variables)
+        if response.agent:
+            self.agent = response.agent
+        self.history.extend(response.messages)
+
+def _lookup(key: str, agent) -> Optional[Response]:
+    entry = _memory.get(key)
+    if entry is not None:
+        _memory.move_to_end(key)
+        next_agent, reply = entry
+    else:
+        disk = _open_disk()
+        if disk is None:
+            return None
+        with _disk_lock:
+            row = disk.execute("SELECT reply FROM replies WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        # Only turns that stayed with the calling agent are written to disk
+        next_agent, reply = agent, row[0]
+    # Unpickle a fresh copy so the caller can't change the cached turn
+    messages, context_variables = pickle.loads(reply)
+    return Response(messages=messages, agent=next_agent, context_variables=context_variables)
+
+def _store(key: str, agent, response: Response, volatile_tools: Sequence[str]):
+    for message in response.messages:
+        for tool_call in message.get("tool_calls") or ():
+            if tool_call["function"]["name"] in volatile_tools:
+                return
+    reply = pickle.dumps((response.messages, response.context_variables))
+    _memory[key] = (response.agent, reply)
+    if len(_memory) > RESPONSE_CACHE_SIZE:
+        _memory.popitem(last=False)
+    disk = _open_disk()
+    if disk is not None and response.agent is agent:
+        with _disk_lock:
+            disk.execute("INSERT OR REPLACE INTO replies VALUES (?, ?)", (key, reply))
+            disk.commit()
+
+def _replay(response: Response):
+    # Same chunk shapes as Swarm's own stream, with each reply sent whole
+    yield {"delim": "start"}
+    for message in response.messages:
+        if message["role"] == "assistant" and message.get("content"):
+            yield {"content": message["content"], "sender": message.get("sender")}
+    yield {"delim": "end"}
+    yield {"response": response}
+
+def _record(stream, key: str, agent, volatile_tools: Sequence[str]):
+    for chunk in stream:
+        if "response" in chunk:
+            _store(key, agent, chunk["response"], volatile_tools)
+        yield chunk
+
+def cached_run(client, agent, messages: list, volatile_tools: Sequence[str] = (), **kwargs):
+    """client.run, replaying the reply when the same turn was answered before
+
+    The key covers the agent, its model, every message and the context, so
+    a hit is exactly the turn that was cached. Replies that called any tool
+    in volatile_tools (clocks, random data) are never cached. With
+    stream=True a hit is replayed as a stream.
+    """
+    key = cache_key(agent, messages, kwargs.get("context_variables"))
+    response = _lookup(key, agent)
+    if response is not None:
+        return _replay(response) if kwargs.get("stream") else response
+
+    response = client.run(agent=agent, messages=messages, **kwargs)
+    if kwargs.get("stream"):
+        return _record(response, key, agent, volatile_tools)
+    _store(key, agent, response, volatile_tools)
+    return response
+
+@lru_cache(maxsize=None)
+def tool_schema(func) -> dict:
+    """A tool's JSON schema, derived once and trimmed for the request
+
+    The docstring's summary becomes the tool description and each line of
+    its Args section becomes that parameter's description, with the
+    indentation and line breaks of the source dropped. context_variables
+    is hidden from the model, as Swarm does.
+    """
+    tool = function_to_json(func)
+    summary, _, args = inspect.cleandoc(func.__doc__ or "").partition("Args:")
+    tool["function"]["description"] = " ".join(summary.split())
+
+    params = tool["function"]["parameters"]
+    params["properties"].pop(__CTX_VARS_NAME__, None)
+    if __CTX_VARS_NAME__ in params["required"]:
+        params["required"].remove(__CTX_VARS_NAME__)
+    for line in args.splitlines():
+        name, found, text = line.partition(":")
+        if found and name.strip() in params["properties"]:
+            params["properties"][name.strip()]["description"] = text.strip()
+    return tool
+
+@lru_cache(maxsize=None)
+def agent_tools(functions: tuple) -> list:
+    """The tools list for an agent's functions, built once per distinct set
+
+    Keyed by the functions themselves, so an agent whose list changes
+    (07 and 04 add their transfers after creating the agents) just gets a
+    new entry, and every request for the same set reuses one list object.
+    """
+    return [tool_schema(f) for f in functions]
+
+class SemanticCache:
+    """Replays an earlier reply when a new question means the same as an old one
+
+    A reply is reused when its question is at least threshold similar to the
+    new one and was asked of the same agent and model, after the same earlier
+    messages (trailing system messages included) and with the same context,
+    so only the question itself may differ. Questions are embedded only once
+    such a turn exists to compare with, batched with any cached questions of
+    that scope not embedded yet, and the last question's embedding is kept
+    so a retry with another agent doesn't ask for it again. Turns that handed
+    off to another agent, or that called any tool in volatile_tools, are never
+    stored. If the embedding request fails, the turn simply runs normally.
+    Caches sized past HNSW_MIN_ENTRIES move to an approximate HNSW index
+    once they fill up that far, when hnswlib is available.
+    """
+
+    def __init__(self, client: Swarm, threshold: float = SIMILARITY_THRESHOLD,
+                 size: int = SEMANTIC_CACHE_SIZE, volatile_tools: Sequence[str] = ()):
+        self.client = client
+        self.threshold = threshold
+        self.size = size
+        self.volatile_tools = frozenset(volatile_tools)
+        self.embeddings: Optional[np.ndarray] = None  # One row per slot, allocated on first use
+        # slot -> (cache_key of everything but the question, pickled reply messages), oldest first
+        self.entries: "OrderedDict[int, Tuple[str, bytes]]" = OrderedDict()
+        self.scopes: Dict[str, Set[int]] = {}  # That same key -> its slots
+        self.pending: Dict[int, str] = {}  # slot -> question whose embedding isn't in yet
+        self.recent: Tuple[str, Optional[np.ndarray]] = ("", None)
+        self.index = None
+        # Runs can come from several threads at once and share the slots
+        self.lock = threading.Lock()
+
+    def _embed(self, texts: List[str]) -> Optional[np.ndarray]:
+        try:
+            response = self.client.client.embeddings.create(model=EMBEDDING_MODEL, input=texts)
+        except Exception:
+            return None
+        vectors = np.asarray([item.embedding for item in response.data], dtype=np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    def _question_embedding(self, scope: str, question: str) -> Optional[np.ndarray]:
+        # None when the scope has nothing cached, so there is nothing to match
+        with self.lock:
+            slots = self.scopes.get(scope)
+            if not slots:
+                return None
+            backlog = [(slot, self.pending[slot]) for slot in slots if slot in self.pending]
+            embedding = self.recent[1] if self.recent[0] == question else None
+        texts = ([] if embedding is not None else [question]) + [text for _, text in backlog]
+        if texts:
+            vectors = self._embed(texts)
+            if vectors is None:
+                return None
+            if embedding is None:
+                embedding, vectors = vectors[0], vectors[1:]
+            with self.lock:
+                self.recent = (question, embedding)
+                for (slot, text), vector in zip(backlog, vectors):
+                    # Unless the slot was reused while the request was out
+                    if self.pending.get(slot) == text:
+                        del self.pending[slot]
+                        self._place(slot, vector)
+        return embedding
+
+    def _candidates(self, scope: str, embedding: np.ndarray):
+        # (slot, similarity) pairs, most similar first
+        if self.index is not None:
+            k = min(HNSW_NEIGHBOURS, self.index.get_current_count())
+            slots, distances = self.index.knn_query(embedding, k=k)
+            return zip(slots[0].tolist(), (1 - distances[0]).tolist())
+        slots = np.fromiter(self.scopes[scope], dtype=np.intp)
+        scores = self.embeddings[slots] @ embedding
+        order = np.argsort(scores)[::-1]
+        return zip(slots[order].tolist(), scores[order].tolist())
+
+    def _lookup(self, scope: str, embedding: np.ndarray) -> Optional[list]:
+        if self.embeddings is None or not self.scopes.get(scope):
+            return None
+        for slot, score in self._candidates(scope, embedding):
+            if score < self.threshold:
+                break
+            owner, reply = self.entries[slot]
+            # A pending slot's row may still hold the vector of the reply it replaced
+            if owner == scope and slot not in self.pending:
+                self.entries.move_to_end(slot)
+                return pickle.loads(reply)
+        return None
+
+    def _build_index(self):
+        index = hnswlib.Index(space="cosine", dim=self.embeddings.shape[1])
+        index.init_index(max_elements=self.size, ef_construction=200, M=16)
+        slots = [slot for slot in self.entries if slot not in self.pending]
+        index.add_items(self.embeddings[slots], slots)
+        self.index = index
+
+    def _place(self, slot: int, embedding: np.ndarray):
+        if self.embeddings is None:
+            self.embeddings = np.zeros((self.size, embedding.shape[0]), dtype=np.float32)
+        self.embeddings[slot] = embedding
+        if self.index is not None:
+            # Adding a slot that is already indexed replaces its vector
+            self.index.add_items(embedding[np.newaxis], [slot])
+        elif hnswlib is not None and len(self.entries) >= HNSW_MIN_ENTRIES:
+            self._build_index()
+
+    def _store(self, agent, scope: str, question: str, response: Response):
+        if response.agent is not agent:
+            return
+        for message in response.messages:
+            for tool_call in message.get("tool_calls") or ():
+                if tool_call["function"]["name"] in self.volatile_tools:
+                    return
+        if len(self.entries) < self.size:
+            slot = len(self.entries)
+        else:
+            slot, (owner, _) = self.entries.popitem(last=False)
+            self.scopes[owner].discard(slot)
+            if not self.scopes[owner]:
+                del self.scopes[owner]
+            self.pending.pop(slot, None)
+        self.entries[slot] = (scope, pickle.dumps(response.messages))
+        self.scopes.setdefault(scope, set()).add(slot)
+        if self.recent[0] == question and self.recent[1] is not None:
+            self._place(slot, self.recent[1])
+        else:
+            # Embedded by the first lookup in this scope that needs it
+            self.pending[slot] = question
+
+    def run(self, agent, messages: list, **kwargs) -> Response:
+        """client.run, answered from the cache when a close enough question was seen
+
+        With stream=True a hit is replayed as a stream. The question is the
+        last message once any trailing system messages are skipped.
+        """
+        last = next((message for message in reversed(messages) if message.get("role") != "system"), {})
+        if last.get("role") != "user" or not last.get("content"):
+            return self.client.run(agent=agent, messages=messages, **kwargs)
+
+        question = last["content"].strip().lower()
+        context_variables = kwargs.get("context_variables")
+        scope = cache_key(agent, [message for message in messages if message is not last], context_variables)
+        embedding = self._question_embedding(scope, question)
+        if embedding is not None:
+            with self.lock:
+                reply = self._lookup(scope, embedding)
+            if reply is not None:
+                response = Response(
+                    messages=reply,
+                    agent=agent,
+                    context_variables=kwargs.get("context_variables") or {}
+                )
+                return _replay(response) if kwargs.get("stream") else response
+
+        response = self.client.run(agent=agent, messages=messages, **kwargs)
+        if kwargs.get("stream"):
+            return self._record(response, agent, scope, question)
+        with self.lock:
+            self._store(agent, scope, question, response)
+        return response
+
+    def _record(self, stream, agent, scope: str, question: str):
+        for chunk in stream:
+            if "response" in chunk:
+                with self.lock:
+                    self._store(agent, scope, question, chunk["response"])
+            yield chunk
+
+class ParallelSwarm(Swarm):
+    """Swarm that runs a turn's tool calls concurrently instead of one by one
+
+    A turn with N calls then takes as long as its slowest tool rather than
+    the sum of all of them. Tools that take context_variables still run one
+    at a time, in call order, on the real context, so no change is lost.
+    Tool lists come from agent_tools rather than being rebuilt every step.
+    """
+
+    def get_chat_completion(self, agent, history: List, context_variables: dict,
+                            model_override: str, stream: bool, debug: bool):
+        context_variables = defaultdict(str, context_variables)
+        instructions = (
+            agent.instructions(context_variables)
+            if callable(agent.instructions)
+            else agent.instructions
+        )
+        messages = [{"role": "system", "content": instructions}] + history
+        debug_print(debug, "Getting chat completion for...:", messages)
+
+        tools = agent_tools(tuple(agent.functions))
+        create_params = {
+            "model": model_override or agent.model,
+            "messages": messages,
+            "tools": tools or None,
+            "tool_choice": agent.tool_choice,
+            "stream": stream,
+        }
+        if tools:
+            create_params["parallel_tool_calls"] = agent.parallel_tool_calls
+
+        return self.client.chat.completions.create(**create_params)
+
+    def handle_tool_calls(self, tool_calls: List, functions: List, context_variables: dict, debug: bool) -> Response:
+        function_map = {f.__name__: f for f in functions}
+        if len(tool_calls) < 2:
+            return super().handle_tool_calls(tool_calls, functions, context_variables, debug)
+
+        # Tools that don't take the context can't touch shared state, so they
+        # all go to the pool at once; the rest run below, in call order
+        pending = {}
+        for i, tool_call in enumerate(tool_calls):
+            func = function_map.get(tool_call.function.name)
+            if func is not None and __CTX_VARS_NAME__ not in func.__code__.co_varnames:
+                pending[i] = _tool_pool.submit(func, **json.loads(tool_call.function.arguments))
+
+        # Tool messages must follow the order of the calls they answer
+        response = Response(messages=[], agent=None, context_variables={})
+        for i, tool_call in enumerate(tool_calls):
+            name = tool_call.function.name
+            if name not in function_map:
+                content = f"Error: Tool {name} not found."
+            else:
+                if i in pending:
+                    raw_result = pending[i].result()
+                else:
+                    # On the real context, with what each one returns folded
+                    # in before the next, so later tools see earlier changes
+                    args = json.loads(tool_call.function.arguments)
+                    args[__CTX_VARS_NAME__] = context_variables
+                    raw_result = function_map[name](**args)
+                result = self.handle_function_result(raw_result, debug)
+                if i not in pending:
+                    context_variables.update(result.context_variables)
+                content = result.value
+                response.context_variables.update(result.context_variables)
+                if result.agent:
+                    response.agent = result.agent
+            response.messages.append(
+                {"role": "tool", "tool_call_id": tool_call.id, "tool_name": name, "content": content}
+            )
+        return response
+
+@lru_cache(maxsize=1)
+def get_client() -> ParallelSwarm:
+    """Return the shared Swarm client, creating it on first use
+
+    Requests go over one pooled HTTP/2 connection, so later turns skip the
+    TCP and TLS setup and a turn's parallel requests share the connection.
+    """
+    http_client = httpx.Client(
+        http2=True,
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY
+        ),
+        timeout=httpx.Timeout(60, connect=5)
+    )
+    return ParallelSwarm(client=OpenAI(http_client=http_client))
+
+def warm_up(client: ParallelSwarm, agents: Sequence):
+    """Pay the one-time costs of the first turn before the user types
+
+    Loads the tokenizer and builds every agent's tool list now, and opens
+    the pooled connection in the background with a request that costs no
+    tokens, so the first reply doesn't wait on TLS setup either.
+    """
+    _encoding()
+    for agent in agents:
+        agent_tools(tuple(agent.functions))
+
+    def connect():
+        try:
+            client.client.models.list()
+        except Exception:
+            pass  # The first real request will connect instead
+    threading.Thread(target=connect, daemon=True).start()
+
+def read_input_ahead() -> asyncio.Queue:
+    """Read user lines in a background thread and queue them as they come
+
+    Reading goes on while a reply is being worked out, so the next message
+    can be typed or piped in before the current one is answered. End of
+    input is queued as 'exit'. The thread is a daemon, so Ctrl+C never
+    waits on a pending read. The caller prints the prompt.
+    """
+    loop = asyncio.get_running_loop()
+    inbox = asyncio.Queue()
+
+    def read():
+        while True:
+            try:
+                line = input()
+            except EOFError:
+                line = "exit"
+            try:
+                loop.call_soon_threadsafe(inbox.put_nowait, line)
+            except RuntimeError:
+                return  # The event loop has already closed
+            if line.lower() == "exit":
+                return
+
+    threading.Thread(target=read, name="input-reader", daemon=True).start()
+    return inbox
+
+async def iterate_in_thread(make_stream):
+    """Drain a blocking generator in a worker thread, yielding its items here"""
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+
+    def pump():
+        try:
+            for item in make_stream():
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        loop.call_soon_threadsafe(queue.put_nowait, _STREAM_END)
+
+    producer = asyncio.create_task(asyncio.to_thread(pump))
+    while (item := await queue.get()) is not _STREAM_END:
+        if isinstance(item, Exception):
+            raise item
+        yield item
+    await producer
+
+def print_stream(stream, label: Optional[str] = None) -> Response:
+    """Print a streamed run's replies as they arrive and return its final Response
+
+    Each assistant reply starts on a new line after label, or after the name
+    of the agent that sent it when label is None, and the text is written
+    chunk by chunk, so the first words show up as soon as the model
+    produces them.
+    """
+    response = None
+    started = False
+    sender = "Agent"
+    for chunk in stream:
+        # Swarm names the sender only on a reply's first chunk
+        sender = chunk.get("sender") or sender
+        content = chunk.get("content")
+        if content:
+            if not started:
+                sys.stdout.write(f"{GREEN}\n{label if label is not None else sender + ': '}")
+                started = True
+            sys.stdout.write(content)
+            sys.stdout.flush()
+        elif chunk.get("delim") == "end" and started:
+            sys.stdout.write(f"{RESET}\n")
+            sys.stdout.flush()
+            started = False
+        elif "response" in chunk:
+            response = chunk["response"]
+    return response